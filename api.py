@@ -12,22 +12,46 @@ api.py — Agent Memory 测试接口服务
 
 接口概览：
     POST /chat              对话接口，含记忆提取与检索
+    POST /chat/stream       流式对话接口（SSE），逐 token 推送回复
+    POST /chat/batch        批量对话：多用户并发、同一用户按顺序，返回逐条结果与耗时
+    POST /consolidation/flush  等待指定用户的后台整理队列排空（async 整理模式的读己之写屏障）
     GET  /memory/{user_id}  白盒读取完整记忆库（测试专用）
+    GET  /memory/{user_id}/version  各层变更版本号（支持长轮询等待变化）
+    GET  /conflicts/{user_id}  列出待确认的记忆冲突
+    POST /conflicts/resolve    批量确认 / 拒绝记忆冲突
     POST /reset             清空用户状态，确保测试隔离
-    GET  /health            健康检查
+    GET  /health            存活检查（进程可响应即返回，不等待模型加载）
+    GET  /ready             就绪检查（启动预热完成前返回 503，含各预热步骤耗时）
+    GET  /metrics           进程内指标（各层检索耗时分位数等）
 """
 
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, List, Optional
-
-from fastapi import FastAPI, Path
-from fastapi.responses import JSONResponse
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Any, Dict, List, Literal, Optional
+
+from fastapi import FastAPI, Path, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from openai import OpenAI
+from starlette.background import BackgroundTask
 
+from src.knowledge.store import KnowledgeStore
+from src.memory.durable_queue import get_durable_queue
 from src.memory.manager import AgentMemory
+from src.memory.scheduler import get_scheduler
+from src.utils.embedding import get_embedding
+from src.utils.llm import complete_chat, stream_chat
+from src.utils.metrics import metrics
+from src.utils.warmup import (
+    RecentUsers, Warmup, configured_steps, warm_collections, warm_embedding, warm_llm,
+)
 from config import cfg
 
 
@@ -38,6 +62,10 @@ from config import cfg
 class ChatRequest(BaseModel):
     user_id: str = Field(..., description="用户唯一标识符", examples=["user_001"])
     message: str = Field(..., description="用户输入的文本消息", examples=["我对海鲜严重过敏。"])
+    consolidate: Optional[Literal["sync", "async"]] = Field(
+        default=None,
+        description="本轮记忆整理方式，缺省读取 API_CONSOLIDATE_MODE",
+    )
 
 
 class ChatResponse(BaseModel):
@@ -46,10 +74,90 @@ class ChatResponse(BaseModel):
         default=None,
         description="本次检索到的相关记忆片段列表（可选）",
     )
+    consolidation_ticket: Optional[int] = Field(
+        default=None,
+        description="async 整理模式下的整理票据（同一用户内单调递增），sync 模式为 null",
+    )
+
+
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest] = Field(
+        ...,
+        min_length=1,
+        description="(user_id, message) 列表；同一 user_id 的消息按出现顺序依次执行",
+    )
+
+
+class BatchChatItem(BaseModel):
+    user_id: str
+    response: Optional[str] = Field(default=None, description="Agent 回复，失败时为 null")
+    retrieved_memories: Optional[List[str]] = None
+    consolidation_ticket: Optional[int] = None
+    error: Optional[str] = Field(default=None, description="该条失败时的错误信息")
+    timings_ms: Dict[str, float] = Field(
+        default_factory=dict,
+        description="各阶段耗时：retrieve / llm / finish / total（毫秒）",
+    )
+
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItem] = Field(..., description="与请求 items 一一对应、顺序一致")
+    timings_ms: Dict[str, float] = Field(..., description="整批耗时：embed（批量查询向量）/ total")
+
+
+class FlushRequest(BaseModel):
+    user_id: str = Field(..., description="需要等待整理完成的用户标识符")
+    ticket: Optional[int] = Field(default=None, description="等待到该票据为止，缺省为该用户全部提交")
+    timeout: float = Field(default=60.0, ge=0.0, le=600.0, description="最长等待秒数")
+
+
+class FlushResponse(BaseModel):
+    status: str = Field(..., description="'ok' 表示队列已排空，'timeout' 表示超时")
+    pending: int = Field(..., description="返回时该用户仍未完成的整理提交数")
 
 
 class MemoryResponse(BaseModel):
     memories: Any = Field(..., description="当前用户的完整记忆库内容")
+    next_offset: Optional[int] = Field(
+        default=None,
+        description="分页模式下一页的 offset，没有更多时为 null",
+    )
+
+
+class VersionResponse(BaseModel):
+    versions: Dict[str, int] = Field(
+        ...,
+        description="各层变更版本号（short_term / static / dynamic / conflicts / knowledge / total）",
+    )
+    changed: bool = Field(..., description="total 是否大于请求中的 since")
+
+
+class ConflictModel(BaseModel):
+    cid: str = Field(..., description="冲突标识符（确认 / 拒绝时使用）")
+    memory_type: str = Field(..., description="'static' 或 'dynamic'")
+    new_content: str = Field(..., description="新提取的记忆")
+    old_content: str = Field(..., description="已有的冲突记忆内容")
+    old_id: str = Field(..., description="已有记忆的 ID")
+    reason: str = Field(..., description="冲突原因")
+
+
+class ConflictListResponse(BaseModel):
+    conflicts: List[ConflictModel] = Field(..., description="待确认冲突，按创建时间排序")
+
+
+class ConflictDecision(BaseModel):
+    cid: str = Field(..., description="冲突标识符")
+    accepted: bool = Field(..., description="true 以新记忆覆盖已有记忆，false 保留原记忆")
+
+
+class ResolveConflictsRequest(BaseModel):
+    user_id: str = Field(..., description="冲突所属的用户标识符")
+    decisions: List[ConflictDecision] = Field(..., min_length=1, description="逐条确认 / 拒绝")
+
+
+class ResolveConflictsResponse(BaseModel):
+    resolved: List[str] = Field(..., description="已处理的 cid")
+    missing: List[str] = Field(..., description="不存在或已被处理的 cid（未做任何写入）")
 
 
 class ResetRequest(BaseModel):
@@ -61,6 +169,59 @@ class ResetResponse(BaseModel):
     message: Optional[str] = Field(default=None, description="可选附加说明")
 
 
+# ---------------------------------------------------------------------------
+# 启动预热：重量级依赖与模型均延迟加载，进程启动后 /health 立即可用；
+# WARMUP_STEPS 在后台线程执行（见 src/utils/warmup.py），完成后 /ready 才返回 200
+# ---------------------------------------------------------------------------
+
+def _prefetch_users() -> None:
+    # 从最久的开始构建，RecentUsers 中的先后顺序保持不变
+    for user_id in reversed(_recent_users.recent(cfg.WARMUP_PREFETCH_USERS)):
+        _get_memory(user_id)
+
+
+_WARMUP_STEPS = {
+    "embedding": warm_embedding,
+    "collections": lambda: warm_collections(_knowledge_store()),
+    "llm": warm_llm,
+    "prefetch": _prefetch_users,
+}
+
+
+def _build_warmup() -> Warmup:
+    names = configured_steps()
+    unknown = [n for n in names if n not in _WARMUP_STEPS]
+    if unknown:
+        raise ValueError(
+            f"不支持的 WARMUP_STEPS 步骤 {unknown}，可选：{' / '.join(_WARMUP_STEPS)}"
+        )
+    return Warmup({name: _WARMUP_STEPS[name] for name in names})
+
+
+_warmup = _build_warmup()
+
+
+def _resume_consolidation() -> None:
+    """为持久化整理日志中有积压的用户创建记忆实例（实例创建时自动认领并重新入队）。"""
+    journal = get_durable_queue()
+    users = [u for u in journal.pending_users() if u]   # 空键属于未指定 user_id 的 Streamlit 会话
+    for user_id in users:
+        try:
+            _get_memory(user_id)
+        except Exception as exc:
+            print(f"[api] 恢复 {user_id} 的整理积压失败：{exc}")
+    if users:
+        print(f"[api] 已恢复 {len(users)} 个用户的整理积压：{journal.stats()}")
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    _warmup.start()
+    if get_durable_queue() is not None:
+        threading.Thread(target=_resume_consolidation, name="ConsolidationResume", daemon=True).start()
+    yield
+
+
 # ---------------------------------------------------------------------------
 # FastAPI 应用
 # ---------------------------------------------------------------------------
@@ -76,19 +237,50 @@ app = FastAPI(
         "| `/reset` | POST | 清空用户状态，确保测试隔离 |"
     ),
     version="1.0.0",
+    lifespan=_lifespan,
 )
 
+# 只读知识库在所有用户间共享（BM25 索引与向量集合只加载一次）
+_shared_kb: Optional[KnowledgeStore] = None
+_shared_kb_lock = threading.Lock()
+
+# /chat/batch 专用线程池：不同用户的检索与 complete_chat 在此并行，并发上限即 BATCH_CONCURRENCY
+# （asyncio 默认线程池只有 min(32, CPU 数 + 4) 个线程，会把并发压到低于配置值）
+_batch_pool = ThreadPoolExecutor(max_workers=max(1, cfg.BATCH_CONCURRENCY), thread_name_prefix="chat-batch")
+
+# 最近新建过记忆实例的用户，供预热的 prefetch 步骤使用
+_recent_users = RecentUsers("./data/recent_users.json")
+
 # 每个 user_id 对应独立的 AgentMemory 实例
 _user_memories: Dict[str, AgentMemory] = {}
+# 全局锁只保护每用户锁的创建；各用户的实例化在自己的锁内进行，互不串行
+_registry_lock = threading.Lock()
+_user_locks: Dict[str, threading.Lock] = {}
+
+
+def _knowledge_store() -> KnowledgeStore:
+    global _shared_kb
+    with _shared_kb_lock:
+        if _shared_kb is None:
+            _shared_kb = KnowledgeStore()
+        return _shared_kb
 
 
 def _get_memory(user_id: str) -> AgentMemory:
-    """获取或创建指定用户的独立记忆实例。"""
-    if user_id not in _user_memories:
-        _user_memories[user_id] = AgentMemory(
-            short_term_limit=cfg.SHORT_TERM_LIMIT,
-            user_id=user_id,
-        )
+    """获取或创建指定用户的独立记忆实例（线程安全）。"""
+    memory = _user_memories.get(user_id)
+    if memory is not None:
+        return memory
+    with _registry_lock:
+        user_lock = _user_locks.setdefault(user_id, threading.Lock())
+    with user_lock:
+        if user_id not in _user_memories:
+            _user_memories[user_id] = AgentMemory(
+                short_term_limit=cfg.SHORT_TERM_LIMIT,
+                user_id=user_id,
+                knowledge_store=_knowledge_store(),
+            )
+            _recent_users.touch(user_id)
     return _user_memories[user_id]
 
 
@@ -105,7 +297,9 @@ async def chat(req: ChatRequest) -> ChatResponse:
     1. 构建携带历史记忆的 messages（system + 短期历史 + 当前问题）
     2. 调用 LLM 生成回复
     3. 将本轮对话写入短期记忆
-    4. 同步执行记忆整理（提取并持久化关键事实）
+    4. 记忆整理（提取并持久化关键事实）：
+       - sync：响应前同步整理完毕
+       - async：入队后立即返回，响应携带 consolidation_ticket
     """
     if not cfg.CHAT_API_KEY:
         return JSONResponse(status_code=503, content={"detail": "CHAT_API_KEY 未配置"})
@@ -114,37 +308,213 @@ async def chat(req: ChatRequest) -> ChatResponse:
     message = req.message
     memory = _get_memory(user_id)
 
+    # 检索与组装 messages 均为同步 I/O，放到线程池执行，避免阻塞事件循环
+    retrieved_texts, messages = await asyncio.to_thread(_prepare_turn, memory, message)
+
+    # 调用 LLM
+    reply = await asyncio.to_thread(complete_chat, messages)
+
+    # 写入短期记忆 + 记忆整理：在独立线程池中执行，避免阻塞 asyncio 事件循环
+    # （consolidate_now 内含多次同步 LLM 调用，直接 await 会拖死所有并发请求）
+    ticket = await asyncio.to_thread(_finish_turn, memory, message, reply, req.consolidate)
+
+    return ChatResponse(
+        response=reply,
+        retrieved_memories=retrieved_texts or None,
+        consolidation_ticket=ticket,
+    )
+
+
+@app.post("/chat/stream", tags=["Core API"], summary="流式对话接口（SSE）")
+async def chat_stream(req: ChatRequest):
+    """
+    与 /chat 相同的记忆检索流程，但以 Server-Sent Events 逐段推送回复：
+
+    - `data: {"delta": "..."}`：回复增量
+    - `data: {"done": true, "response": "...", "retrieved_memories": [...], "ttft_ms": ...}`：结束事件
+    - `data: {"error": "..."}`：生成失败
+
+    流结束、响应发送完毕后，才在后台写入短期记忆并执行记忆整理，
+    因此用户感知的延迟是首 token 延迟（TTFT），而非完整生成耗时。
+    """
+    # 计时从收到请求起算：ttft_ms / chat.ttft 包含记忆检索与 prompt 组装，即用户实际等待的时间
+    t0 = time.perf_counter()
+    if not cfg.CHAT_API_KEY:
+        return JSONResponse(status_code=503, content={"detail": "CHAT_API_KEY 未配置"})
+
+    memory = _get_memory(req.user_id)
+    retrieved_texts, messages = await asyncio.to_thread(_prepare_turn, memory, req.message)
+    state: Dict[str, Any] = {"reply": "", "done": False}
+
+    def events():
+        ttft_ms = None
+        parts: List[str] = []
+        try:
+            for delta in stream_chat(messages, started_at=t0):
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - t0) * 1000, 2)
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except Exception as exc:
+            yield _sse({"error": str(exc)})
+            return
+        state["reply"] = "".join(parts)
+        state["done"] = True
+        yield _sse({
+            "done": True,
+            "response": state["reply"],
+            "retrieved_memories": retrieved_texts or None,
+            "ttft_ms": ttft_ms,
+        })
+
+    def after_stream():
+        # 仅在完整生成后写入；客户端中途断开或生成失败时不写入半截回复
+        if state["done"]:
+            _finish_turn(memory, req.message, state["reply"], req.consolidate)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(after_stream),
+    )
+
+
+def _prepare_turn(
+    memory: AgentMemory, message: str, query_embedding=None
+) -> tuple[List[str], List[dict]]:
+    """
+    检索相关记忆并组装 messages（同步，需在线程池中调用）。
+    query_embedding 为预先批量计算的查询向量，None 时由 build_messages 自行计算。
+    """
+    if query_embedding is None:
+        query_embedding = memory.long_term_memory.embed_query(message)
     # 检索相关记忆（用于响应中的 retrieved_memories 字段）
-    retrieved = memory.retrieve(message)
+    retrieved = memory.retrieve(message, query_embedding=query_embedding)
     retrieved_texts = [m["fact"] for m in retrieved] if retrieved else []
-
     # 组装 messages（注入静态记忆 + 动态记忆 + 知识库）
-    messages = memory.build_messages(query=message, system_prompt=cfg.SYSTEM_PROMPT)
-
-    # 调用 LLM
-    client = OpenAI(api_key=cfg.CHAT_API_KEY, base_url=cfg.CHAT_BASE_URL)
-    response = client.chat.completions.create(
-        model=cfg.CHATMODEL,
-        messages=messages,
+    messages = memory.build_messages(
+        query=message, system_prompt=cfg.SYSTEM_PROMPT, query_embedding=query_embedding
     )
-    reply = response.choices[0].message.content
+    return retrieved_texts, messages
+
 
-    # 写入短期记忆
+def _finish_turn(
+    memory: AgentMemory, message: str, reply: str, mode: Optional[str] = None
+) -> Optional[int]:
+    """
+    写入短期记忆并执行记忆整理（同步，需在线程池中调用）。
+    async 模式返回整理票据，sync 模式整理完毕后返回 None。
+    """
     memory.add_message("user", message)
     memory.add_message("assistant", reply)
+    turn = [
+        {"role": "user",      "content": message},
+        {"role": "assistant", "content": reply},
+    ]
+    if (mode or cfg.API_CONSOLIDATE_MODE).lower() == "async":
+        return memory.submit_for_consolidation(turn)
+    memory.consolidate_now(turn)
+    return None
 
-    # 同步记忆整理：在独立线程池中执行，避免阻塞 asyncio 事件循环
-    # （consolidate_now 内含多次同步 LLM 调用，直接 await 会拖死所有并发请求）
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(
-        None,
-        lambda: memory.consolidate_now([
-            {"role": "user",      "content": message},
-            {"role": "assistant", "content": reply},
-        ]),
+
+def _sse(payload: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/batch", response_model=BatchChatResponse, tags=["Core API"], summary="批量对话接口")
+async def chat_batch(req: BatchChatRequest) -> BatchChatResponse:
+    """
+    一次提交多个 (user_id, message)，用于大规模多用户、多轮测试。
+
+    - 所有消息的查询向量一次性批量计算（BATCH_EMBED_SIZE 条一批），不再逐条 embedding；
+      批量只覆盖这一步，记忆 / 知识库检索仍按条目各自执行
+    - 不同用户的检索与 complete_chat 在专用线程池中并行（上限 BATCH_CONCURRENCY）；
+      同一用户的消息严格按请求中的顺序串行执行（下一轮依赖上一轮写入的短期记忆），
+      因此只含单个用户的批次没有 LLM 调用层面的并行
+    - 每条消息的整理方式同 /chat（item.consolidate 或 API_CONSOLIDATE_MODE）；
+      async 模式下同一用户排队中的多轮会被后台整理器合并为一次提取调用
+    - 单条失败不影响其他条目，错误写入对应结果的 error 字段
+    """
+    if not cfg.CHAT_API_KEY:
+        return JSONResponse(status_code=503, content={"detail": "CHAT_API_KEY 未配置"})
+
+    t_start = time.perf_counter()
+    items = req.items
+    embeddings = await asyncio.to_thread(_embed_batch, [item.message for item in items])
+    embed_ms = (time.perf_counter() - t_start) * 1000
+
+    # 按用户分组，保持组内原始顺序
+    by_user: "OrderedDict[str, List[int]]" = OrderedDict()
+    for idx, item in enumerate(items):
+        by_user.setdefault(item.user_id, []).append(idx)
+
+    results: List[Optional[BatchChatItem]] = [None] * len(items)
+    semaphore = asyncio.Semaphore(cfg.BATCH_CONCURRENCY)
+
+    loop = asyncio.get_running_loop()
+
+    async def run_user(user_id: str, indices: List[int]) -> None:
+        async with semaphore:
+            memory = await loop.run_in_executor(_batch_pool, _get_memory, user_id)
+            for idx in indices:
+                results[idx] = await loop.run_in_executor(
+                    _batch_pool, _run_batch_turn, memory, items[idx], embeddings[idx]
+                )
+
+    await asyncio.gather(*(run_user(u, idx) for u, idx in by_user.items()))
+
+    total_ms = (time.perf_counter() - t_start) * 1000
+    metrics.observe("chat.batch_total", total_ms)
+    return BatchChatResponse(
+        results=results,
+        timings_ms={"embed": round(embed_ms, 2), "total": round(total_ms, 2)},
     )
 
-    return ChatResponse(response=reply, retrieved_memories=retrieved_texts or None)
+
+def _embed_batch(texts: List[str]) -> List[Any]:
+    """按 BATCH_EMBED_SIZE 分批计算查询向量；失败时返回 None，由各条目自行计算。"""
+    embedding_fn = get_embedding()
+    vectors: List[Any] = []
+    try:
+        for start in range(0, len(texts), cfg.BATCH_EMBED_SIZE):
+            vectors.extend(embedding_fn(texts[start : start + cfg.BATCH_EMBED_SIZE]))
+    except Exception as exc:
+        print(f"[api] 批量 embedding 失败，退回逐条计算：{exc}")
+        return [None] * len(texts)
+    return vectors
+
+
+def _run_batch_turn(memory: AgentMemory, item: ChatRequest, query_embedding) -> BatchChatItem:
+    """执行单条批量对话（同步，需在线程池中调用），记录各阶段耗时。"""
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    try:
+        retrieved_texts, messages = _prepare_turn(memory, item.message, query_embedding)
+        t1 = time.perf_counter()
+        reply = complete_chat(messages)
+        t2 = time.perf_counter()
+        ticket = _finish_turn(memory, item.message, reply, item.consolidate)
+        t3 = time.perf_counter()
+        timings = {
+            "retrieve": (t1 - t0) * 1000,
+            "llm":      (t2 - t1) * 1000,
+            "finish":   (t3 - t2) * 1000,
+            "total":    (t3 - t0) * 1000,
+        }
+        return BatchChatItem(
+            user_id=item.user_id,
+            response=reply,
+            retrieved_memories=retrieved_texts or None,
+            consolidation_ticket=ticket,
+            timings_ms={k: round(v, 2) for k, v in timings.items()},
+        )
+    except Exception as exc:
+        return BatchChatItem(
+            user_id=item.user_id,
+            error=f"{type(exc).__name__}: {exc}",
+            timings_ms={"total": round((time.perf_counter() - t0) * 1000, 2)},
+        )
 
 
 @app.get(
@@ -155,7 +525,14 @@ async def chat(req: ChatRequest) -> ChatResponse:
 )
 async def get_memory(
     user_id: str = Path(..., description="需要查询记忆的用户标识符"),
-) -> MemoryResponse:
+    layer: Optional[Literal["static", "dynamic", "short_term"]] = Query(
+        None, description="分页模式：只读取某一层"
+    ),
+    wait: bool = Query(False, description="为 true 时先等待该用户的后台整理队列排空再读取"),
+    wait_timeout: float = Query(60.0, ge=0.0, le=600.0, description="wait=true 时的最长等待秒数"),
+    offset: int = Query(0, ge=0, description="分页起点（需配合 layer）"),
+    limit: int = Query(100, ge=1, le=1000, description="每页条数（需配合 layer）"),
+):
     """
     返回指定用户当前所有生效的记忆内容，供测试框架进行白盒验证。
 
@@ -163,21 +540,141 @@ async def get_memory(
     - 静态记忆（固定属性：姓名、职业等）
     - 动态记忆（ChromaDB 中所有已提取的事实）
     - 短期记忆（当前对话窗口，尚未整理的消息）
+
+    不指定 layer 时以流式 JSON 返回全部内容（逐页读取存储、逐条序列化，
+    服务端内存占用与记忆总量无关）；指定 layer 时返回该层的一页，
+    并在 next_offset 中给出下一页起点。
+
+    wait=true 时先等待该用户已提交的整理全部完成（async 整理模式下的读己之写屏障）。
     """
     memory = _get_memory(user_id)
+    if wait:
+        await asyncio.to_thread(memory.wait_for_consolidation, None, wait_timeout)
+
+    if layer is None:
+        return StreamingResponse(_stream_memories(memory), media_type="application/json")
+
+    if layer == "static":
+        page = memory.static_memory.list_page(offset, limit, fields=("fact",))
+    elif layer == "dynamic":
+        page = memory.long_term_memory.list_page(offset, limit, fields=("fact",))
+    else:
+        history = memory.short_term_memory.history
+        items = [{"fact": f"{m['role']}: {m['content']}"} for m in history[offset : offset + limit]]
+        page = {
+            "items": items,
+            "next_offset": offset + limit if offset + limit < len(history) else None,
+        }
+    return MemoryResponse(
+        memories=[item["fact"] for item in page["items"]],
+        next_offset=page["next_offset"],
+    )
 
-    static_items   = [item["fact"] for item in memory.static_memory.get_all()]
-    dynamic_items  = [item["fact"] for item in memory.long_term_memory.get_all()]
-    short_term_items = [
-        f"{m['role']}: {m['content']}"
-        for m in memory.short_term_memory.history
-    ]
 
-    return MemoryResponse(memories={
-        "static":     static_items,
-        "dynamic":    dynamic_items,
-        "short_term": short_term_items,
-    })
+def _stream_memories(memory: AgentMemory):
+    """
+    逐条生成 {"memories": {"static": [...], "dynamic": [...], "short_term": [...]}}。
+    同步生成器，由 StreamingResponse 放到线程池中迭代，不阻塞事件循环。
+    """
+    layers = {
+        "static":     (item["fact"] for item in memory.static_memory.iter_all(fields=("fact",))),
+        "dynamic":    (item["fact"] for item in memory.long_term_memory.iter_all(fields=("fact",))),
+        "short_term": (f"{m['role']}: {m['content']}" for m in list(memory.short_term_memory.history)),
+    }
+    yield '{"memories": {'
+    for i, (name, items) in enumerate(layers.items()):
+        yield ("," if i else "") + json.dumps(name) + ": ["
+        for j, text in enumerate(items):
+            yield ("," if j else "") + json.dumps(text, ensure_ascii=False)
+        yield "]"
+    yield "}}"
+
+
+@app.get(
+    "/memory/{user_id}/version",
+    response_model=VersionResponse,
+    tags=["Core API"],
+    summary="记忆变更版本号",
+)
+async def get_memory_version(
+    user_id: str = Path(..., description="需要查询的用户标识符"),
+    since: Optional[int] = Query(None, description="上次拿到的 total；配合 timeout 长轮询"),
+    timeout: float = Query(0.0, ge=0.0, le=60.0, description="最长等待秒数，0 表示立即返回"),
+) -> VersionResponse:
+    """
+    O(1) 返回各层版本号。客户端仅在版本变化时才需要重新拉取 /memory/{user_id}。
+    传入 since 与 timeout 时阻塞等待，直到 total > since 或超时。
+    局限：版本号只记录经由本 API 进程的写入，Streamlit 页面 / CLI 等其他进程的写入不会使其递增；
+    需要感知这类写入的客户端应再以较慢的间隔拉取一次 /memory/{user_id}。
+    """
+    memory = _get_memory(user_id)
+    if since is not None and timeout > 0:
+        versions = await asyncio.to_thread(memory.wait_for_change, since, timeout)
+    else:
+        versions = memory.versions()
+    return VersionResponse(
+        versions=versions,
+        changed=since is None or versions["total"] > since,
+    )
+
+
+@app.post(
+    "/consolidation/flush",
+    response_model=FlushResponse,
+    tags=["Core API"],
+    summary="等待后台整理排空",
+)
+async def flush_consolidation(req: FlushRequest) -> FlushResponse:
+    """
+    阻塞直到指定用户在 ticket（缺省为全部）之前提交的记忆整理处理完毕，
+    供测试框架在 async 整理模式下获得确定性的读取结果。
+    """
+    memory = _get_memory(req.user_id)
+    drained = await asyncio.to_thread(memory.wait_for_consolidation, req.ticket, req.timeout)
+    return FlushResponse(
+        status="ok" if drained else "timeout",
+        pending=memory.pending_consolidations(),
+    )
+
+
+@app.get(
+    "/conflicts/{user_id}",
+    response_model=ConflictListResponse,
+    tags=["Core API"],
+    summary="列出待确认的记忆冲突",
+)
+async def list_conflicts(
+    user_id: str = Path(..., description="需要查询的用户标识符"),
+) -> ConflictListResponse:
+    """
+    返回整理器判定为冲突、尚未确认的记忆（重启后仍在）。
+    同一条已有记忆只保留一条待确认冲突，重复提取时以最新内容覆盖。
+    """
+    memory = _get_memory(user_id)
+    return ConflictListResponse(
+        conflicts=[ConflictModel(**asdict(c)) for c in memory.peek_conflicts()]
+    )
+
+
+@app.post(
+    "/conflicts/resolve",
+    response_model=ResolveConflictsResponse,
+    tags=["Core API"],
+    summary="批量确认 / 拒绝记忆冲突",
+)
+async def resolve_conflicts(req: ResolveConflictsRequest) -> ResolveConflictsResponse:
+    """
+    按 cid 逐条确认（新记忆覆盖已有记忆）或拒绝（保留原记忆）。
+    每条冲突只会被处理一次：并发请求或重复提交时，已处理的 cid 出现在 missing 中。
+    """
+    memory = _get_memory(req.user_id)
+    decisions = {d.cid: d.accepted for d in req.decisions}
+    resolved = await asyncio.to_thread(memory.resolve_conflicts, decisions)
+    done = set(resolved)
+    return ResolveConflictsResponse(
+        resolved=resolved,
+        missing=[cid for cid in decisions if cid not in done],
+    )
 
 
 @app.post("/reset", response_model=ResetResponse, tags=["Core API"], summary="环境重置接口")
@@ -201,12 +698,41 @@ async def reset(req: ResetRequest) -> ResetResponse:
     )
 
 
-@app.get("/health", tags=["Utility"], summary="健康检查")
+@app.get("/health", tags=["Utility"], summary="存活检查")
 async def health_check():
-    """返回服务运行状态，测试框架启动前可调用此接口确认 Agent 已就绪。"""
+    """进程可响应即返回 ok，不代表模型已加载；测试框架开始压测前应轮询 /ready。"""
     return JSONResponse({"status": "ok", "service": "Agent Memory API"})
 
 
+@app.get("/ready", tags=["Utility"], summary="就绪检查")
+async def ready_check():
+    """
+    启动预热（WARMUP_STEPS）完成后返回 200 与各步骤耗时；
+    预热中返回 503（status=warming_up），有步骤失败返回 503（status=error，请求仍可处理，
+    失败的部分会在首次使用时重试加载）。
+    """
+    state = _warmup.status()
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
+
+
+@app.get("/metrics", tags=["Utility"], summary="进程内指标")
+async def get_metrics():
+    """
+    返回进程内指标快照：
+    - latency_ms：各阶段耗时分位数（retrieve.static / retrieve.dynamic / retrieve.knowledge / retrieve.embed，
+      chat.total / chat.ttft / chat.stream_total，consolidate.batch / consolidate.llm_wait）
+    - counters：超时 / 异常等计数
+    - consolidation：整理调度器状态（工作线程数 / 批窗口中、排队与处理中用户数 / 队列深度 /
+      最旧提交等待秒数 / 每次提交平均提取调用数 extract_per_submit），
+      启用持久化队列时含 durable（日志中未完成 / 已放弃的批次数）
+    """
+    consolidation = get_scheduler().stats()
+    journal = get_durable_queue()
+    if journal is not None:
+        consolidation["durable"] = journal.stats()
+    return JSONResponse({**metrics.snapshot(), "consolidation": consolidation})
+
+
 # ---------------------------------------------------------------------------
 # 启动入口
 # ---------------------------------------------------------------------------
@@ -219,6 +745,7 @@ if __name__ == "__main__":
     print("=" * 55)
     print("  Swagger UI  : http://127.0.0.1:8000/docs")
     print("  健康检查    : http://127.0.0.1:8000/health")
+    print("  就绪检查    : http://127.0.0.1:8000/ready")
     print("  按 Ctrl+C 停止服务")
     print("=" * 55)
 
@@ -4,11 +4,13 @@ streamlit run app.py
 """
 
 import streamlit as st
-from openai import OpenAI
 from src.memory.manager import AgentMemory
 from src.knowledge.loader import KnowledgeLoader
+from src.knowledge.store import KnowledgeStore
+from src.utils.embedding import get_embedding
+from src.utils.llm import stream_chat
 from config import cfg
-import tempfile, os
+import tempfile, os, time, uuid
 
 from PIL import Image
 
@@ -24,9 +26,27 @@ st.markdown(
 
 st.markdown('<h1><i class="fa fa-database"></i> Agent Memory</h1>', unsafe_allow_html=True)
 
+# == 进程级共享资源（所有会话 / 标签页共用，只在首个会话构建一次）==
+# Embedding 模型、ChromaDB / MongoDB 客户端与知识库都是重量级对象；
+# session_state 中只保留轻量的每会话状态（AgentMemory 外壳、聊天记录等）。
+@st.cache_resource(show_spinner="正在加载 Embedding 模型与知识库…")
+def _shared_knowledge_store() -> KnowledgeStore:
+    get_embedding().load()   # 预加载共享的 Embedding 模型（get_embedding() 本身不加载）
+    return KnowledgeStore()
+
+
 # == 状态初始化（使用 config 参数）==
+# 每个标签页一个会话 ID，用作短期记忆缓存的文件键；写入 URL 参数，刷新页面后仍能恢复本标签页的上下文
+if "session_id" not in st.session_state:
+    sid = st.query_params.get("sid", "")
+    st.session_state.session_id = sid if sid.isascii() and sid.isalnum() and len(sid) <= 32 else uuid.uuid4().hex[:12]
+    st.query_params["sid"] = st.session_state.session_id
 if "memory" not in st.session_state:
-    st.session_state.memory = AgentMemory(short_term_limit=cfg.SHORT_TERM_LIMIT)
+    st.session_state.memory = AgentMemory(
+        short_term_limit=cfg.SHORT_TERM_LIMIT,
+        knowledge_store=_shared_knowledge_store(),
+        session_id=st.session_state.session_id,
+    )
 if "chat_log" not in st.session_state:
     st.session_state.chat_log = []
 if "auto_extract" not in st.session_state:
@@ -40,20 +60,31 @@ memory: AgentMemory = st.session_state.memory
 # == 记忆显示：普通函数，由侧边栏上下文调用 ==
 # 侧边栏的刷新由下方的 _memory_watcher fragment 检测到变化后触发 st.rerun() 完成
 
+# 侧边栏 / 调试面板每层最多展示的条数（超出部分分页读取，不整库拉取）
+_DISPLAY_LIMIT = 50
+
+# 对照存储指纹发现其他进程写入的间隔（秒）；每次需对各层做一次计数查询，故远慢于 3 秒的版本号轮询
+_EXTERNAL_SYNC_SECONDS = 15
+
+
 def render_memory_sidebar(mem: AgentMemory):
     st.markdown("**🔒 静态记忆**（MongoDB）")
-    static_items = mem.static_memory.get_all()
-    if static_items:
-        for item in static_items:
+    static_page = mem.static_memory.list_page(limit=_DISPLAY_LIMIT, fields=("fact",))
+    if static_page["items"]:
+        for item in static_page["items"]:
             st.markdown(f"• {item['fact']}")
+        if static_page["next_offset"] is not None:
+            st.caption(f"仅显示前 {_DISPLAY_LIMIT} 条，共 {len(mem.static_memory)} 条。")
     else:
         st.caption("无静态记忆。")
 
     st.markdown("**🌀 动态记忆**（ChromaDB）")
-    dynamic_items = mem.long_term_memory.get_all()
-    if dynamic_items:
-        for i, item in enumerate(dynamic_items):
+    dynamic_page = mem.long_term_memory.list_page(limit=_DISPLAY_LIMIT, fields=("fact",))
+    if dynamic_page["items"]:
+        for i, item in enumerate(dynamic_page["items"]):
             st.markdown(f"`[{i}]` {item['fact']}")
+        if dynamic_page["next_offset"] is not None:
+            st.caption(f"仅显示前 {_DISPLAY_LIMIT} 条，共 {len(mem.long_term_memory)} 条。")
     else:
         st.caption("No Dynamic Memories Yet.")
 
@@ -67,40 +98,71 @@ def render_memory_sidebar(mem: AgentMemory):
         st.caption("知识库为空，请运行 demo/load_knowledge.py 导入文档。")
 
 
+def _snapshot(mem: AgentMemory, layer: str, fetch):
+    """
+    按版本号缓存各层数据：版本未变化时直接复用 session_state 中的上次结果，
+    避免每 4 秒全量拉取一次存储。
+    """
+    key = f"_debug_{layer}"
+    version = mem.versions()[layer]
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] != version:
+        cached = (version, fetch())
+        st.session_state[key] = cached
+    return cached[1]
+
+
 @st.fragment(run_every="4s")
 def render_memory_debug(mem: AgentMemory):
     with st.expander("Current Memory State (Debug)"):
         col1, col2, col3, col4 = st.columns(4)
+        if mem.last_retrieval_timings:
+            st.caption(
+                "上次检索耗时："
+                + " | ".join(
+                    f"{layer} {ms:.0f}ms" if ms is not None else f"{layer} 超时"
+                    for layer, ms in mem.last_retrieval_timings.items()
+                )
+            )
         with col1:
             st.subheader("Short-Term")
             st.json(mem.short_term)
         with col2:
             st.subheader("🔒 Static (MongoDB)")
             st.caption(f"backend: {mem.static_memory.backend}")
-            st.json(mem.static_memory.get_all())
+            st.json(_snapshot(mem, "static", lambda: mem.static_memory.list_page(limit=_DISPLAY_LIMIT)["items"]))
         with col3:
             st.subheader("🌀 Dynamic (ChromaDB)")
-            st.json(mem.long_term_memory.get_all())
+            st.json(_snapshot(
+                mem, "dynamic",
+                lambda: mem.long_term_memory.list_page(limit=_DISPLAY_LIMIT, fields=("id", "fact", "metadata"))["items"],
+            ))
         with col4:
             st.subheader("📖 Knowledge Base")
             st.caption(f"{len(mem.knowledge_store)} 块 | {mem.knowledge_store.list_sources()}")
-            st.json(mem.knowledge_store.get_all())
+            st.json(_snapshot(mem, "knowledge", lambda: mem.knowledge_store.list_page(limit=_DISPLAY_LIMIT)["items"]))
+        st.caption(f"每层最多显示前 {_DISPLAY_LIMIT} 条。")
 
 
 @st.fragment(run_every="3s")
 def _memory_watcher(mem: AgentMemory):
     """
     静默监听 fragment（主内容区，3 秒轮询）。
-    检测到动态/静态记忆数量变化时调用 st.rerun()，触发整页刷新，
+    比较 AgentMemory 的变更版本号（O(1)，不访问存储），
+    检测到动态/静态记忆或冲突变化时调用 st.rerun()，触发整页刷新，
     从而同步更新侧边栏（fragment 内无法直接写入侧边栏）。
+    版本号只记录本进程内的写入：每 _EXTERNAL_SYNC_SECONDS 秒再对照一次存储指纹，
+    发现其他标签页 / REST API / CLI 的写入（同时使 _snapshot 的缓存失效）。
     """
-    dyn = len(mem.long_term_memory)
-    sta = len(mem.static_memory.get_all())
-    prev_dyn = st.session_state.get("_watcher_dyn")
-    prev_sta = st.session_state.get("_watcher_sta")
-    st.session_state._watcher_dyn = dyn
-    st.session_state._watcher_sta = sta
-    if prev_dyn is not None and (dyn != prev_dyn or sta != prev_sta):
+    now = time.monotonic()
+    if now - st.session_state.get("_watcher_synced_at", 0.0) >= _EXTERNAL_SYNC_SECONDS:
+        st.session_state._watcher_synced_at = now
+        mem.sync_external_changes()
+    ver = mem.versions()
+    current = (ver["dynamic"], ver["static"], ver["conflicts"])
+    prev = st.session_state.get("_watcher_versions")
+    st.session_state._watcher_versions = current
+    if prev is not None and current != prev:
         st.rerun()
 
 # == 侧边栏 ==
@@ -166,15 +228,8 @@ with st.sidebar:
                     tmp_path = tmp.name
                 try:
                     loader = KnowledgeLoader(memory.knowledge_store)
-                    n = loader.load_file(tmp_path, reload=True)
-                    # 将来源名改回原始文件名
-                    # load_file 以 tmp 文件名写入，需修正 source
-                    result = memory.knowledge_store._collection.get(where={"source": os.path.basename(tmp_path)})
-                    if result["ids"]:
-                        memory.knowledge_store._collection.update(
-                            ids=result["ids"],
-                            metadatas=[{"source": uploaded.name, "chunk_index": i} for i, _ in enumerate(result["ids"])],
-                        )
+                    # 以原始文件名作为来源写入（而非 tmp 文件名），保证关键词索引与 metadata 一致
+                    n = loader.load_file(tmp_path, reload=True, source=uploaded.name)
                     st.toast(f"✔ 已导入 {uploaded.name}，共 {n} 个块。")
                     st.rerun()
                 except Exception as e:
@@ -245,22 +300,17 @@ if user_input:
     with st.chat_message("user"):
         st.write(user_input)
 
-    # 组装消息（短期 + 长期记忆 -> Prompt）
+    # 组装消息（短期 + 长期记忆 -> Prompt）；首 token 延迟从此处起算，包含检索耗时
+    t0 = time.perf_counter()
     messages = memory.build_messages(
         query=user_input,
         system_prompt=cfg.SYSTEM_PROMPT,
     )
 
-    # BASE_URL 支持任意兼容 OpenAI 接口的服务
-    client = OpenAI(api_key=cfg.CHAT_API_KEY, base_url=cfg.CHAT_BASE_URL)
+    # 流式输出：首 token 到达即开始渲染（BASE_URL 支持任意兼容 OpenAI 接口的服务）
+    # 短期记忆写入与后台整理在流结束、拿到完整回复后才触发
     with st.chat_message("assistant"):
-        with st.spinner("Thinking…"):
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-            )
-        reply = response.choices[0].message.content
-        st.write(reply)
+        reply = st.write_stream(stream_chat(messages, model=model, started_at=t0))
 
     memory.add_message("user", user_input)
     memory.add_message("assistant", reply)
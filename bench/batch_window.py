@@ -0,0 +1,100 @@
+"""
+bench/batch_window.py — 自适应整理批窗口：每轮对话的 LLM 提取调用数
+=====================================================================
+模拟 auto_extract=ON 的流量：--users 个用户并发对话，每人 --turns 轮，轮间停顿服从均值为
+--think 秒的指数分布，每轮提交当前短期记忆快照（最近 --window 条消息）。
+整理本身用固定耗时（--llm-ms）代替，不访问真实 LLM 与存储。
+
+分别在批窗口关闭（CONSOLIDATE_BATCH_MAX_DELAY=0，入队即整理）与当前配置下运行，报告：
+  提取调用数 / 每轮调用数、每次提取的平均消息数（去重后）、排空耗时，以及窗口触发原因（idle / max / size / wait）
+
+用法：
+  python bench/batch_window.py
+  python bench/batch_window.py --users 50 --turns 20 --think 0.5 --llm-ms 300
+"""
+
+import sys
+import os
+import argparse
+import random
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config import Config, cfg
+from src.memory import consolidator as consolidator_mod
+from src.utils.metrics import metrics
+
+
+class _User:
+    """只提供 user_id 的占位 AgentMemory（整理被替换为固定耗时，不触及存储）。"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+
+
+def run(args, label: str) -> None:
+    metrics.reset()
+    sizes: list[int] = []
+    sizes_lock = threading.Lock()
+
+    def fake_process(self, messages, epoch=None, batch_ids=None):
+        time.sleep(args.llm_ms / 1000)
+        with sizes_lock:
+            sizes.append(len({(m["role"], m["content"]) for m in messages}))   # 去重后（与 _process 一致）
+
+    consolidator_mod.MemoryConsolidator._process = fake_process
+    consolidators = [consolidator_mod.MemoryConsolidator(_User(f"u{i}")) for i in range(args.users)]
+
+    def converse(idx: int) -> None:
+        rng = random.Random(idx)
+        history: list[dict] = []
+        for turn in range(args.turns):
+            history.append({"role": "user", "content": f"用户 {idx} 第 {turn} 轮：最近在准备马拉松比赛。"})
+            history.append({"role": "assistant", "content": f"好的，第 {turn} 轮的训练计划如下……"})
+            consolidators[idx].submit(history[-args.window:])
+            time.sleep(rng.expovariate(1 / args.think))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=converse, args=(i,)) for i in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 轮询排空而不调用 wait()：wait() 会提前结束批窗口
+    while any(c.pending() for c in consolidators):
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - t0
+
+    counters = metrics.snapshot()["counters"]
+    turns = args.users * args.turns
+    calls = counters.get("consolidate.extract_calls", 0)
+    reasons = {
+        k.rsplit(".", 1)[1]: v for k, v in counters.items() if k.startswith("consolidate.window.")
+    }
+    print(f"{label:<8} 提取 {calls:>5} 次（{turns} 轮，{calls / turns:.3f} 次/轮），"
+          f"每次平均 {sum(sizes) / max(1, len(sizes)):.1f} 条消息，排空 {elapsed:.1f}s，触发原因 {reasons}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自适应整理批窗口：每轮 LLM 提取调用数")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--think", type=float, default=0.3, help="轮间停顿均值（秒）")
+    parser.add_argument("--window", type=int, default=10, help="每轮提交的短期记忆条数")
+    parser.add_argument("--llm-ms", type=float, default=100.0, help="模拟的单次整理耗时")
+    args = parser.parse_args()
+
+    print(f"批窗口：idle {cfg.CONSOLIDATE_BATCH_IDLE}s，min {cfg.CONSOLIDATE_BATCH_MIN_DELAY}s，"
+          f"max {cfg.CONSOLIDATE_BATCH_MAX_DELAY}s，target {cfg.CONSOLIDATE_BATCH_TARGET_TOKENS} tokens，"
+          f"{cfg.CONSOLIDATE_WORKERS} 个工作线程\n")
+    max_delay = Config.CONSOLIDATE_BATCH_MAX_DELAY
+    Config.CONSOLIDATE_BATCH_MAX_DELAY = 0.0   # 类属性：整理器创建时读取 Config
+    run(args, "关闭")
+    Config.CONSOLIDATE_BATCH_MAX_DELAY = max_delay
+    run(args, "自适应")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+bench/bulk_facts.py — 动态记忆批量写入吞吐
+============================================
+对比三种写入方式的吞吐（facts/sec）：
+  · single：逐条 collection.add + 随机 uuid（旧版 add_memory 的行为），每条一次 embedding
+  · bulk  ：LongTermMemory.add_memories，按 --batch 分批 embedding + upsert
+  · reimport：对同一批事实再执行一次 add_memories，验证内容哈希 ID 幂等（条数不变）
+
+使用当前 .env 中的 EMBED_TYPE（embedding 是主要开销），数据写入临时 Chroma 目录，结束后删除。
+
+用法：
+  python bench/bulk_facts.py
+  python bench/bulk_facts.py --n 2000 --batch 256
+"""
+
+import sys
+import os
+import argparse
+import shutil
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config import Config, cfg
+
+
+def make_facts(n: int) -> list[str]:
+    topics = ["喜欢", "最近在学习", "计划去", "正在读", "经常使用", "不喜欢"]
+    objects = ["机器学习", "日本旅行", "《三体》", "Python", "咖啡", "跑步", "摄影", "烹饪"]
+    return [
+        f"用户{topics[i % len(topics)]}{objects[(i // len(topics)) % len(objects)]}（条目 {i}）"
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="save_facts / add_memories 批量写入吞吐基准")
+    parser.add_argument("--n", type=int, default=1000, help="写入事实条数")
+    parser.add_argument("--batch", type=int, default=cfg.MEMORY_WRITE_BATCH)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bulk_facts_bench_")
+    # 库代码读取的是 Config 类属性（cfg 实例上赋值只会遮蔽，不生效）。
+    # 顺序约束：必须在本进程第一次调用 get_chroma_client() / 创建任何 LongTermMemory 之前设置——
+    # 无参的 get_chroma_client() 在调用时读取 Config.VECTOR_DB_PATH，此前已创建的实例仍指向原目录
+    Config.VECTOR_DB_PATH = root
+    from src.memory.long_term import LongTermMemory
+
+    facts = make_facts(args.n)
+    try:
+        single = LongTermMemory("bench_single")
+        t0 = time.perf_counter()
+        for fact in facts:
+            single.collection.add(
+                ids=[str(uuid.uuid4())], documents=[fact], metadatas=[{"source": "bench"}]
+            )
+        single_s = time.perf_counter() - t0
+
+        bulk = LongTermMemory("bench_bulk")
+        metas = [{"source": "bench"}] * len(facts)
+        t0 = time.perf_counter()
+        bulk.add_memories(facts, metas, batch_size=args.batch)
+        bulk_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        bulk.add_memories(facts, metas, batch_size=args.batch)
+        reimport_s = time.perf_counter() - t0
+
+        print(f"事实条数 {args.n}，EMBED_TYPE={cfg.EMBED_TYPE}，batch={args.batch}\n")
+        print(f"{'方式':<10}{'耗时(s)':>10}{'facts/sec':>12}{'集合条数':>10}")
+        print(f"{'single':<10}{single_s:>10.2f}{args.n / single_s:>12.1f}{len(single):>10}")
+        print(f"{'bulk':<10}{bulk_s:>10.2f}{args.n / bulk_s:>12.1f}{len(bulk):>10}")
+        print(f"{'reimport':<10}{reimport_s:>10.2f}{args.n / reimport_s:>12.1f}{len(bulk):>10}")
+        print(f"\n加速比（bulk / single）：{single_s / bulk_s:.1f}x")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
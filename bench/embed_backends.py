@@ -0,0 +1,110 @@
+"""
+bench/embed_backends.py — 本地 embedding：PyTorch vs ONNX Runtime
+==================================================================
+对同一 EMBED_LOCAL_MODEL 比较三条 CPU 推理路径：
+  · torch     — EMBED_TYPE=local（SentenceTransformerEmbeddingFunction）
+  · onnx      — EMBED_TYPE=onnx，fp32
+  · onnx-int8 — EMBED_TYPE=onnx + EMBED_ONNX_QUANTIZE（--quantize 指定指令集）
+
+指标：
+  · 单条查询延迟 p50 / p95（batch=1，对应在线检索路径）
+  · 批量吞吐 texts/sec（--batch，对应知识库导入）
+  · 与 torch 输出的平均余弦相似度（量化误差）
+
+首次运行会导出 ONNX 模型到 EMBED_ONNX_DIR，导出耗时不计入结果。
+
+用法：
+  python bench/embed_backends.py
+  python bench/embed_backends.py --quantize avx512_vnni --threads 4 --batch 64
+"""
+
+import sys
+import os
+import argparse
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from chromadb.utils import embedding_functions
+
+from src.utils.embedders import OnnxEmbeddingFunction
+from config import cfg
+
+
+def make_texts(n: int) -> list[str]:
+    base = [
+        "用户最近在学习机器学习，尤其关注 Transformer 架构。",
+        "我对海鲜严重过敏，请在推荐餐厅时注意。",
+        "The quarterly report is due next Friday; please review section three.",
+        "知识库导入大文件时，分块与向量化是主要耗时阶段。",
+    ]
+    return [f"{base[i % len(base)]}（{i}）" for i in range(n)]
+
+
+def measure(fn, texts: list[str], queries: int, batch: int) -> dict:
+    fn(texts[:batch])   # 预热
+    latencies = []
+    for text in texts[:queries]:
+        t0 = time.perf_counter()
+        fn([text])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), batch):
+        vectors.extend(fn(texts[start : start + batch]))
+    elapsed = time.perf_counter() - t0
+    return {
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "throughput": len(texts) / elapsed,
+        "vectors": np.asarray(vectors, dtype=np.float32),
+    }
+
+
+def _mean_cosine(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 embedding：torch vs ONNX Runtime")
+    parser.add_argument("--n", type=int, default=512, help="吞吐测试文本条数")
+    parser.add_argument("--queries", type=int, default=100, help="单条延迟测试次数")
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=cfg.EMBED_ONNX_THREADS)
+    parser.add_argument("--quantize", default=cfg.EMBED_ONNX_QUANTIZE or "avx2",
+                        help="int8 量化指令集（avx2 / avx512 / avx512_vnni / arm64），none 跳过")
+    args = parser.parse_args()
+
+    texts = make_texts(args.n)
+    backends = {
+        "torch": lambda: embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=cfg.EMBED_LOCAL_MODEL, device="cpu"
+        ),
+        "onnx": lambda: OnnxEmbeddingFunction(
+            cfg.EMBED_LOCAL_MODEL, cfg.EMBED_ONNX_DIR, "", args.threads
+        ),
+    }
+    if args.quantize != "none":
+        backends["onnx-int8"] = lambda: OnnxEmbeddingFunction(
+            cfg.EMBED_LOCAL_MODEL, cfg.EMBED_ONNX_DIR, args.quantize, args.threads
+        )
+
+    print(f"模型 {cfg.EMBED_LOCAL_MODEL}，intra-op 线程 {args.threads or '默认'}，batch={args.batch}\n")
+    print(f"{'后端':<11}{'p50(ms)':>10}{'p95(ms)':>10}{'texts/sec':>12}{'cos vs torch':>14}")
+    reference = None
+    for name, factory in backends.items():
+        result = measure(factory(), texts, args.queries, args.batch)
+        if reference is None:
+            reference = result["vectors"]
+        cosine = _mean_cosine(reference, result["vectors"])
+        print(
+            f"{name:<11}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+            f"{result['throughput']:>12.1f}{cosine:>14.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+bench/embed_compress.py — 向量压缩的召回率 / 体积报告
+======================================================
+在固定语料（默认 docs/ 目录）上对比 Matryoshka 截断维度 × 存储精度 × 是否精确重排 的组合：
+  · neighbor recall@k：与 float32 全维度暴力检索的 top-k 结果的重合率
+  · hit@k：探针查询的来源块出现在 top-k 中的比例
+  · 每条向量字节数与相对 float32 全维度的压缩比
+
+语料只做一次 embedding（当前 .env 的 EMBED_TYPE，不截断），各组合在此基础上截断 / 量化，
+检索走 NumpyBackend（与线上实现一致），数据写入临时目录，结束后删除。
+截断仅对 Matryoshka 训练的模型有意义；其他模型截断后的召回率会明显下降。
+
+用法：
+  python bench/embed_compress.py
+  python bench/embed_compress.py --dir docs/ --k 5 --dims 256 512 --samples 300
+"""
+
+import sys
+import os
+import argparse
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from src.knowledge.loader import KnowledgeLoader
+from src.utils.embedding import build_embedding
+from src.utils.quantize import bytes_per_vector, truncate
+from src.utils.vector_backend import NumpyBackend
+from config import cfg
+
+
+def load_chunks(directory: str) -> list[str]:
+    chunks = []
+    for path in sorted(Path(directory).rglob("*")):
+        if path.suffix.lower() in (".txt", ".md"):
+            text = path.read_text(encoding="utf-8", errors="ignore")
+            chunks.extend(KnowledgeLoader._chunk_text(text, cfg.KB_CHUNK_SIZE, cfg.KB_CHUNK_OVERLAP))
+    return [c for c in chunks if c.strip()]
+
+
+def build_probes(chunks: list[str], span: int, samples: int, seed: int) -> list[tuple[str, int]]:
+    """从随机块中截取原文片段作为查询，返回 (查询, 来源块下标)。"""
+    rng = random.Random(seed)
+    candidates = [i for i, c in enumerate(chunks) if len(c) > span]
+    probes = []
+    for _ in range(samples):
+        i = rng.choice(candidates)
+        start = rng.randrange(0, len(chunks[i]) - span)
+        probes.append((chunks[i][start : start + span], i))
+    return probes
+
+
+def evaluate(backend: NumpyBackend, queries: np.ndarray, truth: list[set], answers: list[int], k: int):
+    overlap = hits = 0.0
+    for q, expected, answer in zip(queries, truth, answers):
+        got = {int(i) for i in backend.query(query_embeddings=[q], n_results=k)["ids"][0]}
+        overlap += len(got & expected) / len(expected)
+        hits += answer in got
+    return overlap / len(queries), hits / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matryoshka 截断 / 量化的召回率与体积报告")
+    parser.add_argument("--dir", default="docs/", help="语料目录（txt / md）")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dims", type=int, nargs="+", default=[512, 256])
+    parser.add_argument("--rescore", type=int, default=4, help="重排候选倍数")
+    parser.add_argument("--span", type=int, default=24)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.dir)
+    if len(chunks) <= args.k:
+        sys.exit(f"语料块数（{len(chunks)}）过少，请用 --dir 指定更大的语料")
+    probes = build_probes(chunks, args.span, args.samples, args.seed)
+    print(f"语料 {len(chunks)} 块，探针查询 {len(probes)} 条，EMBED_TYPE={cfg.EMBED_TYPE}\n")
+
+    embed = build_embedding()
+    doc_vecs = np.asarray(embed(chunks), dtype=np.float32)
+    query_vecs = np.asarray(embed([q for q, _ in probes]), dtype=np.float32)
+    answers = [i for _, i in probes]
+    full_dim = doc_vecs.shape[1]
+
+    # 基准真值：float32 全维度精确 top-k
+    ref = truncate(doc_vecs, full_dim) @ truncate(query_vecs, full_dim).T
+    truth = [set(np.argsort(-ref[:, j])[: args.k].tolist()) for j in range(len(probes))]
+
+    dims = [full_dim] + sorted({d for d in args.dims if 0 < d < full_dim}, reverse=True)
+    configs = [(d, dtype, 0) for d in dims for dtype in ("float32", "float16", "int8")]
+    configs += [(d, dtype, args.rescore) for d in dims for dtype in ("float16", "int8")]
+    configs.sort(key=lambda c: (-c[0], c[1], c[2]))
+
+    root = tempfile.mkdtemp(prefix="embed_compress_bench_")
+    base_bytes = bytes_per_vector(full_dim, "float32")
+    print(f"{'维度':>6}{'精度':>9}{'重排':>6}{'字节/条':>9}{'压缩比':>8}{'recall@k':>10}{'hit@k':>8}")
+    try:
+        ids = [str(i) for i in range(len(chunks))]
+        for dim, dtype, factor in configs:
+            backend = NumpyBackend(root, f"{dim}_{dtype}_{factor}", None, dtype, factor)
+            backend.upsert(ids, chunks, None, truncate(doc_vecs, dim))
+            recall, hit = evaluate(backend, truncate(query_vecs, dim), truth, answers, args.k)
+            size = bytes_per_vector(dim, dtype)
+            print(
+                f"{dim:>6}{dtype:>9}{(f'×{factor}' if factor else '-'):>6}{size:>9}"
+                f"{base_bytes / size:>7.1f}x{recall:>10.3f}{hit:>8.3f}"
+            )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print("\n注：开启重排时磁盘上另存一份 float32 副本（只以 mmap 读取候选行），节省的是内存而非磁盘。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+bench/encode_pool.py — 多进程编码池的扩展性
+============================================
+把语料目录（默认 docs/）按 KB_CHUNK_SIZE 切块后，分别用单进程（build_embedding）
+和 1..N 个工作进程的 EncodePool 编码全部文本块，报告 chunks/sec 与相对单进程的加速比。
+
+进程池的启动与模型加载不计入耗时（先编码一小批预热）；各进程的推理线程数为
+CPU 核数 / 进程数，总线程数与单进程基线相同，加速来自绕开 GIL 与 Python 开销。
+语料过小时用 --repeat 复制若干份。
+
+用法：
+  python bench/encode_pool.py
+  python bench/encode_pool.py --dir docs/ --workers 1 2 4 8 --repeat 4
+"""
+
+import sys
+import os
+import argparse
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from src.knowledge.loader import KnowledgeLoader
+from src.utils.embedding import build_embedding
+from src.utils.encode_pool import EncodePool
+from config import cfg
+
+
+def load_chunks(directory: str) -> list[str]:
+    chunks = []
+    for path in sorted(Path(directory).rglob("*")):
+        if path.suffix.lower() in (".txt", ".md"):
+            text = path.read_text(encoding="utf-8", errors="ignore")
+            chunks.extend(KnowledgeLoader._chunk_text(text, cfg.KB_CHUNK_SIZE, cfg.KB_CHUNK_OVERLAP))
+    return [c for c in chunks if c.strip()]
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="多进程编码池：进程数 × 吞吐")
+    parser.add_argument("--dir", default="docs/", help="语料目录（txt / md）")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({w for w in (1, 2, 4, 8, cores) if w <= cores}))
+    parser.add_argument("--repeat", type=int, default=1, help="语料复制份数")
+    parser.add_argument("--batch", type=int, default=32, help="单进程基线每批条数")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.dir) * args.repeat
+    if not chunks:
+        sys.exit(f"{args.dir} 下没有可用的 txt / md 语料")
+    print(f"语料 {len(chunks)} 块，CPU {cores} 核\n")
+
+    embed = build_embedding()
+    embed(chunks[: args.batch])   # 预热
+    t0 = time.perf_counter()
+    reference = []
+    for start in range(0, len(chunks), args.batch):
+        reference.extend(embed(chunks[start : start + args.batch]))
+    baseline = len(chunks) / (time.perf_counter() - t0)
+    reference = np.asarray(reference, dtype=np.float32)
+
+    print(f"{'模式':<12}{'chunks/sec':>12}{'加速比':>8}{'最大误差':>12}")
+    print(f"{'单进程':<12}{baseline:>12.1f}{1.0:>8.2f}{'-':>12}")
+    for workers in args.workers:
+        pool = EncodePool(workers)
+        try:
+            pool.encode(chunks[: workers * 4])   # 启动进程并加载模型
+            t0 = time.perf_counter()
+            vectors = pool.encode(chunks)
+            rate = len(chunks) / (time.perf_counter() - t0)
+        finally:
+            pool.close()
+        error = float(np.abs(vectors - reference).max())
+        print(f"{f'{workers} 进程':<12}{rate:>12.1f}{rate / baseline:>8.2f}{error:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
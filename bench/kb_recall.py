@@ -0,0 +1,116 @@
+"""
+bench/kb_recall.py — 知识库检索召回率评测
+==========================================
+对比 vector（纯向量）与 hybrid（向量 + BM25 / RRF）两种检索模式的 recall@k；
+加 --rerank 时额外评测 hybrid + Cross-Encoder 重排。
+
+评测方式：
+  · 将文档导入一个临时 collection（默认 docs/ 目录）
+  · 默认自动构造探针查询：从随机块中截取一段原文（模拟标识符 / 关键词查询），
+    返回结果中任一块包含该原文即视为命中
+  · 也可用 --queries 指定人工标注集（jsonl，每行 {"query": ..., "answer": ...}，
+    answer 为应出现在命中块中的原文片段）
+
+用法：
+  python bench/kb_recall.py
+  python bench/kb_recall.py --dir docs/ --k 1 3 5 --span 12 --samples 200
+  python bench/kb_recall.py --queries my_queries.jsonl
+  python bench/kb_recall.py --k 2 --rerank
+"""
+
+import sys
+import os
+import argparse
+import json
+import random
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.knowledge.store import KnowledgeStore
+from src.knowledge.loader import KnowledgeLoader
+from src.utils.rerank import CrossEncoderReranker
+from config import cfg
+
+
+def build_probes(store: KnowledgeStore, span: int, samples: int, seed: int) -> list[dict]:
+    """从已导入的块中截取原文片段作为探针查询。"""
+    rng = random.Random(seed)
+    chunks = [c["text"] for c in store.get_all() if len(c["text"].strip()) > span]
+    rng.shuffle(chunks)
+    probes = []
+    for text in chunks[:samples]:
+        start = rng.randrange(0, len(text) - span)
+        snippet = text[start : start + span].strip()
+        if snippet:
+            probes.append({"query": snippet, "answer": snippet})
+    return probes
+
+
+def recall_at_k(
+    store: KnowledgeStore,
+    probes: list[dict],
+    k: int,
+    mode: str,
+    reranker: CrossEncoderReranker | None = None,
+) -> float:
+    hits = 0
+    for p in probes:
+        if reranker is None:
+            results = store.retrieve(p["query"], top_k=k, mode=mode)
+        else:
+            candidates = store.retrieve(p["query"], top_k=k * cfg.RERANK_CANDIDATES, mode=mode)
+            results = reranker.rerank(p["query"], candidates, "text", k)
+        if any(p["answer"] in r["text"] for r in results):
+            hits += 1
+    return hits / len(probes) if probes else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="知识库 recall@k 评测（vector vs hybrid）")
+    parser.add_argument("--dir", default="docs/", help="待导入的文档目录（默认 docs/）")
+    parser.add_argument("--queries", metavar="PATH", help="人工标注查询集（jsonl）")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="评测的 k 值")
+    parser.add_argument("--span", type=int, default=12, help="自动探针截取的字符数")
+    parser.add_argument("--samples", type=int, default=100, help="自动探针数量上限")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--collection", default="kb_recall_eval", help="临时 collection 名称")
+    parser.add_argument("--rerank", action="store_true", help="额外评测 hybrid + 重排（不受延迟预算限制）")
+    args = parser.parse_args()
+
+    reranker = None
+    if args.rerank:
+        # 评测关注排序质量，放宽延迟预算避免回退 ANN 顺序
+        reranker = CrossEncoderReranker(cfg.RERANK_MODEL, device=cfg.RERANK_DEVICE, budget_ms=600_000)
+
+    store = KnowledgeStore(collection_name=args.collection)
+    store._clear_all()
+    try:
+        results = KnowledgeLoader(store).load_directory(args.dir)
+        print(f"已导入 {sum(n for n in results.values() if n > 0)} 个块（{len(results)} 个文件）")
+
+        if args.queries:
+            with open(args.queries, "r", encoding="utf-8") as f:
+                probes = [json.loads(line) for line in f if line.strip()]
+        else:
+            probes = build_probes(store, args.span, args.samples, args.seed)
+        print(f"查询数：{len(probes)}\n")
+
+        header = f"{'k':>4} | {'vector':>8} | {'hybrid':>8}"
+        if reranker:
+            header += f" | {'hybrid+rerank':>13}"
+        print(header)
+        print("─" * len(header))
+        for k in args.k:
+            vec = recall_at_k(store, probes, k, "vector")
+            hyb = recall_at_k(store, probes, k, "hybrid")
+            row = f"{k:>4} | {vec:>8.3f} | {hyb:>8.3f}"
+            if reranker:
+                row += f" | {recall_at_k(store, probes, k, 'hybrid', reranker):>13.3f}"
+            print(row)
+    finally:
+        store._clear_all()
+        store._client.delete_collection(args.collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+bench/startup.py — 冷启动导入耗时（python -X importtime）
+==========================================================
+在全新子进程中以 -X importtime 导入各入口模块，报告：
+  · 导入总耗时（importtime 顶层模块累计值之和）与子进程墙钟时间
+  · 累计耗时最高的若干顶层模块
+  · 重量级依赖（chromadb / sentence_transformers / torch / pymongo / transformers）是否在导入阶段被加载
+
+导入阶段不应加载上述依赖：它们在首次构建 embedding / 数据库客户端时才导入。
+--instantiate 额外测量构造一个 AgentMemory 的耗时（不应触发模型加载）。
+
+用法：
+  python bench/startup.py
+  python bench/startup.py --modules api src.memory.manager --top 15 --instantiate
+"""
+
+import sys
+import os
+import argparse
+import subprocess
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HEAVY = ("chromadb", "sentence_transformers", "torch", "transformers", "pymongo")
+
+_INSTANTIATE = """
+import time
+t0 = time.perf_counter()
+from src.memory.manager import AgentMemory
+AgentMemory(user_id="startup_bench")
+print(f"__instantiate_ms__={(time.perf_counter() - t0) * 1000:.1f}")
+"""
+
+
+def import_profile(module: str, code: str | None = None) -> tuple[float, list[tuple[str, int]], set[str], str]:
+    """返回 (墙钟秒数, [(顶层模块, 累计微秒)], 全部已导入的顶级包名, 子进程 stdout)。"""
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code or f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        sys.exit(f"导入 {module} 失败：\n" + "\n".join(errors[-20:]))
+
+    # 行格式：import time: self [us] | cumulative | imported package（嵌套导入按层级缩进两格）
+    top_level, packages = [], set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        packages.add(name.split(".")[0])
+        if not raw_name.startswith("  "):
+            top_level.append((name, int(cumulative)))
+    return wall, top_level, packages, proc.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动导入耗时（-X importtime）")
+    parser.add_argument("--modules", nargs="+", default=["config", "src.memory.manager", "api"])
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--instantiate", action="store_true", help="额外测量构造 AgentMemory 的耗时")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        wall, top_level, packages, _ = import_profile(module)
+        total_ms = sum(us for _, us in top_level) / 1000
+        loaded = [name for name in HEAVY if name in packages]
+        print(f"== import {module}：导入 {total_ms:.0f} ms，子进程墙钟 {wall * 1000:.0f} ms")
+        for name, us in sorted(top_level, key=lambda x: -x[1])[: args.top]:
+            print(f"   {us / 1000:>9.1f} ms  {name}")
+        print(f"   重量级依赖：{', '.join(loaded) if loaded else '未加载'}\n")
+
+    if args.instantiate:
+        _, _, packages, stdout = import_profile("AgentMemory()", _INSTANTIATE)
+        ms = next(line.split("=")[1] for line in stdout.splitlines() if line.startswith("__instantiate_ms__"))
+        loaded = [name for name in HEAVY if name in packages]
+        print(f"== 导入并构造 AgentMemory：{ms} ms，加载的重量级依赖：{', '.join(loaded) or '无'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+bench/tenancy.py — 多用户存储布局对比
+======================================
+对比 MEMORY_TENANCY 两种布局下动态记忆（Chroma）的：
+  · 写入耗时
+  · 首次访问：打开某个用户的 collection 并完成首次查询的耗时
+    （同一进程内 Chroma 复用底层系统，真正的进程冷启动差距会更大）
+  · 热查询延迟 p50 / p95（随机用户，top_k 检索）
+  · 磁盘占用与目录项数
+
+为只衡量存储布局本身，使用随机单位向量（--dim 维）直接写入与查询，不加载 embedding 模型。
+每种布局写入独立的临时目录，结束后自动删除（--keep 保留）。
+
+用法：
+  python bench/tenancy.py
+  python bench/tenancy.py --users 2000 --facts 20 --queries 500
+"""
+
+import os
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+
+def _vectors(rng: np.random.Generator, n: int, dim: int) -> list[list[float]]:
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    v /= np.linalg.norm(v, axis=1, keepdims=True)
+    return v.tolist()
+
+
+def _disk_usage(path: str) -> tuple[int, int]:
+    """返回 (字节数, 文件数)。"""
+    size = files = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            size += os.path.getsize(os.path.join(root, name))
+            files += 1
+    return size, files
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * len(values))) - 1)]
+
+
+def _open(path: str, layout: str, uid: str):
+    client = chromadb.PersistentClient(path=path)
+    if layout == "shared":
+        return client.get_collection("agent_memories_shared"), {"user_id": uid}
+    return client.get_collection(f"agent_memories_{uid}"), None
+
+
+def run_layout(layout: str, args, root: str) -> dict:
+    path = os.path.join(root, layout)
+    rng = np.random.default_rng(args.seed)
+    users = [f"u{i:06d}" for i in range(args.users)]
+
+    client = chromadb.PersistentClient(path=path)
+    t0 = time.perf_counter()
+    if layout == "shared":
+        col = client.get_or_create_collection("agent_memories_shared")
+        for start in range(0, len(users), max(1, 2000 // args.facts)):
+            batch = users[start : start + max(1, 2000 // args.facts)]
+            ids, docs, metas = [], [], []
+            for uid in batch:
+                for j in range(args.facts):
+                    ids.append(f"{uid}-{j}")
+                    docs.append(f"{uid} fact {j}")
+                    metas.append({"source": "bench", "user_id": uid})
+            col.add(ids=ids, documents=docs, metadatas=metas, embeddings=_vectors(rng, len(ids), args.dim))
+    else:
+        for uid in users:
+            col = client.get_or_create_collection(f"agent_memories_{uid}")
+            col.add(
+                ids=[f"{uid}-{j}" for j in range(args.facts)],
+                documents=[f"{uid} fact {j}" for j in range(args.facts)],
+                metadatas=[{"source": "bench"}] * args.facts,
+                embeddings=_vectors(rng, args.facts, args.dim),
+            )
+    write_s = time.perf_counter() - t0
+    del client
+
+    py_rng = random.Random(args.seed)
+
+    # 首次访问：打开 collection + 首次查询
+    t0 = time.perf_counter()
+    col, where = _open(path, layout, py_rng.choice(users))
+    col.query(query_embeddings=_vectors(rng, 1, args.dim), n_results=args.top_k, where=where)
+    cold_ms = (time.perf_counter() - t0) * 1000
+
+    # 热查询：复用客户端，随机用户
+    client = chromadb.PersistentClient(path=path)
+    shared = client.get_collection("agent_memories_shared") if layout == "shared" else None
+    latencies = []
+    for q in _vectors(rng, args.queries, args.dim):
+        uid = py_rng.choice(users)
+        t0 = time.perf_counter()
+        if shared is not None:
+            res = shared.query(query_embeddings=[q], n_results=args.top_k, where={"user_id": uid})
+        else:
+            res = client.get_collection(f"agent_memories_{uid}").query(
+                query_embeddings=[q], n_results=args.top_k
+            )
+        latencies.append((time.perf_counter() - t0) * 1000)
+        assert all(i.startswith(uid) for i in res["ids"][0])
+
+    size, files = _disk_usage(path)
+    return {
+        "layout": layout,
+        "write_s": write_s,
+        "cold_ms": cold_ms,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "disk_mb": size / 1024 / 1024,
+        "files": files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="per_user vs shared 存储布局基准")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--facts", type=int, default=20, help="每用户动态记忆条数")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="保留临时数据目录")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="tenancy_bench_")
+    print(f"用户 {args.users} × 每用户 {args.facts} 条，dim={args.dim}，目录 {root}\n")
+    try:
+        rows = [run_layout(layout, args, root) for layout in ("per_user", "shared")]
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{'布局':<10}{'写入(s)':>10}{'首次(ms)':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'磁盘(MB)':>10}{'文件数':>8}")
+    for r in rows:
+        print(
+            f"{r['layout']:<10}{r['write_s']:>10.2f}{r['cold_ms']:>12.1f}{r['p50_ms']:>10.2f}"
+            f"{r['p95_ms']:>10.2f}{r['disk_mb']:>10.1f}{r['files']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+bench/vector_backend.py — numpy vs Chroma 向量后端交叉点
+=========================================================
+在不同集合规模下对比 NumpyBackend（暴力检索）与 ChromaBackend（HNSW）的
+单次 top-k 查询延迟，找出 Chroma 开始更快的规模，作为 VECTOR_BACKEND_THRESHOLD 的参考。
+
+为只衡量后端本身，使用随机单位向量（--dim 维）直接写入与查询，不加载 embedding 模型；
+数据写入临时目录，结束后删除。
+
+用法：
+  python bench/vector_backend.py
+  python bench/vector_backend.py --sizes 100 1000 10000 50000 --dim 768 --queries 200
+"""
+
+import sys
+import os
+import argparse
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import chromadb
+import numpy as np
+
+from src.utils.vector_backend import ChromaBackend, NumpyBackend
+
+
+def _vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _fill(backend, vectors: np.ndarray, batch: int = 5000) -> float:
+    t0 = time.perf_counter()
+    for start in range(0, len(vectors), batch):
+        chunk = vectors[start : start + batch]
+        ids = [f"m{start + i}" for i in range(len(chunk))]
+        backend.upsert(ids, [f"fact {i}" for i in ids], [{"source": "bench"}] * len(ids), chunk.tolist())
+    return time.perf_counter() - t0
+
+
+def _p50_ms(backend, queries: np.ndarray, top_k: int) -> float:
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        backend.query(query_embeddings=[q.tolist()], n_results=top_k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="numpy vs Chroma 后端查询延迟随规模变化")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000, 3000, 10000, 30000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    queries = _vectors(rng, args.queries, args.dim)
+    root = tempfile.mkdtemp(prefix="vector_backend_bench_")
+    client = chromadb.PersistentClient(path=os.path.join(root, "chroma"))
+
+    print(f"dim={args.dim}，top_k={args.top_k}，每个规模 {args.queries} 次查询（p50）\n")
+    print(f"{'条数':>8}{'numpy 写入(s)':>15}{'chroma 写入(s)':>16}{'numpy(ms)':>12}{'chroma(ms)':>12}")
+    crossover = None
+    try:
+        for size in args.sizes:
+            vectors = _vectors(rng, size, args.dim)
+            small = NumpyBackend(os.path.join(root, "numpy"), f"bench_{size}", None)
+            chroma = ChromaBackend(client, f"bench_{size}", None)
+            np_write = _fill(small, vectors)
+            ch_write = _fill(chroma, vectors)
+            np_ms = _p50_ms(small, queries, args.top_k)
+            ch_ms = _p50_ms(chroma, queries, args.top_k)
+            print(f"{size:>8}{np_write:>15.2f}{ch_write:>16.2f}{np_ms:>12.3f}{ch_ms:>12.3f}")
+            if crossover is None and ch_ms < np_ms:
+                crossover = size
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if crossover is None:
+        print(f"\n所测规模内 numpy 始终更快（最大 {max(args.sizes)} 条）")
+    else:
+        print(f"\n约 {crossover} 条起 Chroma 更快，可据此设置 VECTOR_BACKEND_THRESHOLD")
+    print("注：numpy 后端每次写入整体重写文件，阈值还应兼顾写入频率与内存占用。")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,13 +21,29 @@ class Config:
     CHATMODEL:    str = os.getenv("CHATMODEL", "gpt-4o-mini")
 
     # ── Embedding 模式（LongTermMemory 使用）────────────────────────────
-    # EMBED_TYPE 可选值: local | ollama | api
+    # EMBED_TYPE 可选值: local | onnx | ollama | api
     EMBED_TYPE: str = os.getenv("EMBED_TYPE", "local")
 
     # local 模式：纯本地，通过 sentence-transformers 加载 HuggingFace 模型
     EMBED_LOCAL_MODEL:  str = os.getenv("EMBED_LOCAL_MODEL",  "Qwen/Qwen3-Embedding-0.6B")
     EMBED_LOCAL_DEVICE: str = os.getenv("EMBED_LOCAL_DEVICE", "cpu")   # cpu / cuda / mps
 
+    # onnx 模式：同一 EMBED_LOCAL_MODEL 导出为 ONNX，由 ONNX Runtime 在 CPU 上推理
+    # 首次使用时导出并缓存到 EMBED_ONNX_DIR；EMBED_ONNX_QUANTIZE 非空时再做 int8 动态量化
+    # （可选值 avx2 / avx512 / avx512_vnni / arm64，按部署机器的指令集选择）
+    # EMBED_ONNX_THREADS：intra-op 线程数，0 表示由 ONNX Runtime 自行决定
+    EMBED_ONNX_DIR:      str = os.getenv("EMBED_ONNX_DIR",      "./data/onnx")
+    EMBED_ONNX_QUANTIZE: str = os.getenv("EMBED_ONNX_QUANTIZE", "")
+    EMBED_ONNX_THREADS:  int = int(os.getenv("EMBED_ONNX_THREADS", "0"))
+
+    # 批量导入的多进程编码池（见 src/utils/encode_pool.py，扩展性见 bench/encode_pool.py）
+    # ENCODE_WORKERS：工作进程数，0 / 1 表示不启用（在本进程内 embedding）
+    # ENCODE_THREADS：每个进程的推理线程数，0 表示 CPU 核数 / 进程数
+    # ENCODE_POOL_MIN_BATCH：单次导入的文本条数达到该值才走进程池
+    ENCODE_WORKERS:        int = int(os.getenv("ENCODE_WORKERS",        "0"))
+    ENCODE_THREADS:        int = int(os.getenv("ENCODE_THREADS",        "0"))
+    ENCODE_POOL_MIN_BATCH: int = int(os.getenv("ENCODE_POOL_MIN_BATCH", "256"))
+
     # ollama 模式：本地 Ollama 服务
     EMBED_OLLAMA_MODEL: str = os.getenv("EMBED_OLLAMA_MODEL", "qwen3-embedding")
     EMBED_OLLAMA_URL:   str = os.getenv("EMBED_OLLAMA_URL",   "http://localhost:11434")
@@ -40,6 +56,19 @@ class Config:
     # ChromaDB 持久化路径（三种模式共用）
     VECTOR_DB_PATH: str = os.getenv("VECTOR_DB_PATH", "./data/chroma")
 
+    # 向量存储后端 VECTOR_BACKEND 可选值: chroma（默认）| numpy | auto
+    # auto：集合条数不超过 VECTOR_BACKEND_THRESHOLD 时用进程内 numpy 暴力检索，超过后自动迁移到 Chroma
+    VECTOR_BACKEND:           str = os.getenv("VECTOR_BACKEND",           "chroma")
+    VECTOR_BACKEND_THRESHOLD: int = int(os.getenv("VECTOR_BACKEND_THRESHOLD", "5000"))
+
+    # 向量压缩（见 src/utils/quantize.py，召回率 / 体积权衡见 bench/embed_compress.py）
+    # EMBED_DIM：Matryoshka 截断维度，0 表示不截断（仅适用于 MRL 训练的模型；修改后需重新导入）
+    # VECTOR_STORAGE_DTYPE：numpy 后端存储精度 float32 | float16 | int8（Chroma 始终为 float32）
+    # VECTOR_RESCORE_FACTOR：量化存储时取 top_k × 因子 个候选用 float32 副本精确重排，0 关闭
+    EMBED_DIM:             int = int(os.getenv("EMBED_DIM",             "0"))
+    VECTOR_STORAGE_DTYPE:  str = os.getenv("VECTOR_STORAGE_DTYPE",      "float32")
+    VECTOR_RESCORE_FACTOR: int = int(os.getenv("VECTOR_RESCORE_FACTOR", "0"))
+
     # ── 系统提示词 ─────────────────────────────────────────────────
     SYSTEM_PROMPT: str = os.getenv(
         "SYSTEM_PROMPT",
@@ -50,6 +79,16 @@ class Config:
     MONGO_URI:               str = os.getenv("MONGO_URI",               "mongodb://localhost:27017")
     MONGO_DB:                str = os.getenv("MONGO_DB",                "agent_memory")
     MONGO_STATIC_COLLECTION: str = os.getenv("MONGO_STATIC_COLLECTION", "static_memories")
+    # 连通性测试失败后的冷却秒数：期间直接抛出上次的错误（降级到 JSON），不再每次等待 3 秒超时
+    MONGO_RETRY_SECONDS:   float = float(os.getenv("MONGO_RETRY_SECONDS", "30"))
+
+    # ── 多用户存储布局 ───────────────────────────────────────────────
+    # MEMORY_TENANCY 可选值: per_user（默认，每用户独立 collection）| shared
+    # shared：所有用户共用一个 Chroma collection / MongoDB 集合，按 user_id 字段过滤
+    # 两种布局之间用 demo/migrate_tenancy.py 迁移
+    MEMORY_TENANCY:           str = os.getenv("MEMORY_TENANCY",           "per_user")
+    SHARED_MEMORY_COLLECTION: str = os.getenv("SHARED_MEMORY_COLLECTION", "agent_memories_shared")
+    SHARED_STATIC_COLLECTION: str = os.getenv("SHARED_STATIC_COLLECTION", "static_memories_shared")
 
     # ── 记忆整理 LLM（Consolidator）─────────────────────────────────────
     # CONSOLIDATE_TYPE 可选值: api（默认）| ollama | local
@@ -69,6 +108,56 @@ class Config:
     CONSOLIDATE_LOCAL_MODEL:  str = os.getenv("CONSOLIDATE_LOCAL_MODEL",  "Qwen/Qwen2.5-1.5B-Instruct")
     CONSOLIDATE_LOCAL_DEVICE: str = os.getenv("CONSOLIDATE_LOCAL_DEVICE", "cpu")   # cpu / cuda / mps
 
+    # 整理调度（见 src/memory/scheduler.py）：所有用户共用 CONSOLIDATE_WORKERS 个工作线程，按用户轮转
+    # CONSOLIDATE_LLM_CONCURRENCY / CONSOLIDATE_LLM_RPM：整理 LLM 后端的全局并发与每分钟请求上限，0 不限制
+    CONSOLIDATE_WORKERS:         int = int(os.getenv("CONSOLIDATE_WORKERS",         "4"))
+    CONSOLIDATE_LLM_CONCURRENCY: int = int(os.getenv("CONSOLIDATE_LLM_CONCURRENCY", "4"))
+    CONSOLIDATE_LLM_RPM:         int = int(os.getenv("CONSOLIDATE_LLM_RPM",         "0"))
+
+    # 每用户整理队列上限与满载策略（见 src/memory/consolidator.py）
+    # CONSOLIDATE_QUEUE_MAX：待处理提交条数上限，0 不限制
+    # CONSOLIDATE_QUEUE_POLICY：coalesce（合并积压，默认）| drop_oldest | block（阻塞提交方，超时后合并）
+    # CONSOLIDATE_COALESCE_MAX_MESSAGES：合并后一批最多保留的消息数（超出丢弃最旧的）
+    CONSOLIDATE_QUEUE_MAX:             int   = int(os.getenv("CONSOLIDATE_QUEUE_MAX",             "32"))
+    CONSOLIDATE_QUEUE_POLICY:          str   = os.getenv("CONSOLIDATE_QUEUE_POLICY",              "coalesce")
+    CONSOLIDATE_QUEUE_BLOCK_TIMEOUT:   float = float(os.getenv("CONSOLIDATE_QUEUE_BLOCK_TIMEOUT", "30"))
+    CONSOLIDATE_COALESCE_MAX_MESSAGES: int   = int(os.getenv("CONSOLIDATE_COALESCE_MAX_MESSAGES", "200"))
+
+    # 自适应整理批窗口（见 src/memory/consolidator.py）：同一用户窗口内的提交合并为一次 LLM 提取
+    # CONSOLIDATE_BATCH_IDLE：用户停顿超过该秒数即整理（防抖，每次新提交重新计时）
+    # CONSOLIDATE_BATCH_MIN_DELAY / MAX_DELAY：首条提交后最少 / 最多等待的秒数，MAX_DELAY=0 关闭批窗口
+    # CONSOLIDATE_BATCH_TARGET_TOKENS：积压消息估算 token 数达到该值立即整理，0 不按批大小触发
+    CONSOLIDATE_BATCH_IDLE:          float = float(os.getenv("CONSOLIDATE_BATCH_IDLE",          "2.0"))
+    CONSOLIDATE_BATCH_MIN_DELAY:     float = float(os.getenv("CONSOLIDATE_BATCH_MIN_DELAY",     "0.5"))
+    CONSOLIDATE_BATCH_MAX_DELAY:     float = float(os.getenv("CONSOLIDATE_BATCH_MAX_DELAY",     "10.0"))
+    CONSOLIDATE_BATCH_TARGET_TOKENS: int   = int(os.getenv("CONSOLIDATE_BATCH_TARGET_TOKENS",   "1500"))
+
+    # 待确认记忆冲突的存储路径（见 src/memory/conflict_store.py），":memory:" 表示不持久化
+    CONFLICT_DB_PATH: str = os.getenv("CONFLICT_DB_PATH", "./data/conflicts.db")
+
+    # 持久化整理队列（见 src/memory/durable_queue.py）：SQLite 日志路径，留空则只用内存队列（重启丢失积压）
+    # CONSOLIDATE_MAX_ATTEMPTS：整理失败的批次最多在启动时重试的次数
+    CONSOLIDATE_DURABLE_PATH: str = os.getenv("CONSOLIDATE_DURABLE_PATH", "")
+    CONSOLIDATE_MAX_ATTEMPTS: int = int(os.getenv("CONSOLIDATE_MAX_ATTEMPTS", "5"))
+
+    # api.py 中 /chat 的整理方式：sync（默认，响应前同步整理完毕）| async（入队后立即返回整理票据，
+    # 需要确定性时通过 /memory/{user_id}?wait=true 或 /consolidation/flush 等待排空）
+    API_CONSOLIDATE_MODE: str = os.getenv("API_CONSOLIDATE_MODE", "sync")
+
+    # api.py 启动预热（见 src/utils/warmup.py），/ready 在预热完成前返回 503
+    # WARMUP_STEPS：逗号分隔，按顺序执行，可选 embedding / collections / llm / prefetch；留空则不预热，/ready 立即就绪
+    # WARMUP_PREFETCH_USERS：prefetch 步骤预先构建最近活跃的 N 个用户的 AgentMemory，0 关闭；
+    #                        大于 0 且 WARMUP_STEPS 未列出 prefetch 时自动追加到末尾
+    WARMUP_STEPS:          str = os.getenv("WARMUP_STEPS",          "embedding,collections,llm")
+    WARMUP_PREFETCH_USERS: int = int(os.getenv("WARMUP_PREFETCH_USERS", "0"))
+
+    # 动态记忆批量写入（save_facts / add_memories）每批 embedding + upsert 的条数
+    MEMORY_WRITE_BATCH: int = int(os.getenv("MEMORY_WRITE_BATCH", "128"))
+
+    # /chat/batch：不同用户的最大并发数（即专用线程池大小）、批量计算查询向量时每批条数
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "16"))
+    BATCH_EMBED_SIZE:  int = int(os.getenv("BATCH_EMBED_SIZE",  "64"))
+
     # 动态记忆去重阈值：distance < 此值才触发 LLM 比对（ChromaDB cosine distance，越低越相似）
     MEMORY_DEDUP_THRESHOLD:  float = float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.4"))
 
@@ -80,6 +169,34 @@ class Config:
     KB_CHUNK_OVERLAP: int = int(os.getenv("KB_CHUNK_OVERLAP", "50"))   # 相邻块重叠量
     KB_TOP_K:         int = int(os.getenv("KB_TOP_K",         "3"))    # 检索返回条数
 
+    # KB_RETRIEVAL_MODE 可选值: vector（默认，纯向量）| hybrid（向量 + BM25 融合，多一次关键词检索）
+    KB_RETRIEVAL_MODE:    str = os.getenv("KB_RETRIEVAL_MODE",    "vector")
+    KB_HYBRID_CANDIDATES: int = int(os.getenv("KB_HYBRID_CANDIDATES", "4"))   # 每路候选数 = top_k × 此值
+    KB_RRF_K:             int = int(os.getenv("KB_RRF_K",             "60"))  # RRF 平滑常数
+
+    # 检索后处理：合并同一来源的相邻块并去除 overlap 重复；
+    # 前 KB_EXPAND_TOP 条强命中向两侧各扩展 KB_EXPAND_WINDOW 个相邻块（0 表示不扩展）
+    KB_MERGE_ADJACENT: bool = os.getenv("KB_MERGE_ADJACENT", "true").lower() in ("1", "true", "yes")
+    KB_EXPAND_TOP:     int  = int(os.getenv("KB_EXPAND_TOP",    "1"))
+    KB_EXPAND_WINDOW:  int  = int(os.getenv("KB_EXPAND_WINDOW", "1"))
+
+    # ── 并发检索（build_messages 三层扇出）────────────────────────────
+    # 各层超时（毫秒），从扇出开始计时；超时的层以空内容降级，不阻塞回复
+    RETRIEVE_WORKERS:              int = int(os.getenv("RETRIEVE_WORKERS",              "16"))
+    RETRIEVE_TIMEOUT_STATIC_MS:    int = int(os.getenv("RETRIEVE_TIMEOUT_STATIC_MS",    "1500"))
+    RETRIEVE_TIMEOUT_DYNAMIC_MS:   int = int(os.getenv("RETRIEVE_TIMEOUT_DYNAMIC_MS",   "3000"))
+    RETRIEVE_TIMEOUT_KNOWLEDGE_MS: int = int(os.getenv("RETRIEVE_TIMEOUT_KNOWLEDGE_MS", "3000"))
+
+    # ── 检索重排（Cross-Encoder Rerank，可选）────────────────────────
+    # 开启后 AgentMemory.retrieve / retrieve_knowledge 先多取 top_k × RERANK_CANDIDATES 个候选，
+    # 再由本地 Cross-Encoder 重排；超出 RERANK_BUDGET_MS 时回退 ANN 原顺序
+    RERANK_ENABLED:    bool = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+    RERANK_MODEL:      str  = os.getenv("RERANK_MODEL",  "BAAI/bge-reranker-base")
+    RERANK_DEVICE:     str  = os.getenv("RERANK_DEVICE", "cpu")
+    RERANK_CANDIDATES: int  = int(os.getenv("RERANK_CANDIDATES", "4"))
+    RERANK_BUDGET_MS:  int  = int(os.getenv("RERANK_BUDGET_MS",  "300"))
+    RERANK_CACHE_SIZE: int  = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+
     # ── Agent Memory 参数 ──────────────────────────────────────────
     SHORT_TERM_LIMIT: int = int(os.getenv("SHORT_TERM_LIMIT", "10"))
 
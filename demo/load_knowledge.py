@@ -36,19 +36,16 @@ from config import cfg
 def cmd_status(store: KnowledgeStore) -> None:
     """打印知识库状态。"""
     count = store.count()
-    sources = store.list_sources()
+    stats = store.source_stats()
     print(f"\n{'─'*50}")
     print(f"  知识库状态")
     print(f"{'─'*50}")
     print(f"  文档块总数 : {count}")
-    print(f"  来源文件数 : {len(sources)}")
-    if sources:
+    print(f"  来源文件数 : {len(stats)}")
+    if stats:
         print(f"  来源列表   :")
-        for src in sources:
-            # 统计该来源的块数
-            all_chunks = store.get_all()
-            n = sum(1 for c in all_chunks if c["source"] == src)
-            print(f"    • {src}  ({n} 块)")
+        for src, info in stats.items():
+            print(f"    • {src}  ({info['chunks']} 块, 导入于 {info['ingested_at'] or '未知'})")
     print(f"{'─'*50}\n")
 
 
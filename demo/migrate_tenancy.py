@@ -0,0 +1,208 @@
+"""
+demo/migrate_tenancy.py — 多用户存储布局迁移脚本
+==================================================
+在两种 MEMORY_TENANCY 布局之间迁移动态记忆（Chroma）与静态记忆（MongoDB）：
+
+  per_user：每个用户独立的 agent_memories_{uid} / static_memories_{uid}
+  shared  ：所有用户共用 SHARED_MEMORY_COLLECTION / SHARED_STATIC_COLLECTION，
+            每条记录带 user_id 字段（uid 即 collection 后缀）与代际号 gen
+            （见 src/memory/tenancy.py，reset 后旧代际的记录不可见，迁移时一并跳过）
+
+读写均经过 VectorBackend（VECTOR_BACKEND 为 numpy / auto 时同样适用）。
+迁移时直接复制已有向量，不重新 embedding；记录 ID 保持不变，重复执行是幂等的
+（Chroma 使用 upsert，MongoDB 按 _id upsert）。JSON 降级后端始终按用户分文件，无需迁移。
+迁移完成后把 .env 中的 MEMORY_TENANCY 改为目标布局并重启服务。
+
+用法：
+  # 每用户 collection → 共享 collection
+  python demo/migrate_tenancy.py --to shared
+
+  # 共享 collection → 每用户 collection，并删除迁移源
+  python demo/migrate_tenancy.py --to per_user --drop-source
+
+  # 只看会迁移哪些数据
+  python demo/migrate_tenancy.py --to shared --dry-run
+"""
+
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.memory.tenancy import get_generation_store
+from src.utils.clients import get_chroma_client, get_mongo_client
+from src.utils.vector_backend import list_vector_collections, open_vector_backend
+from config import cfg
+
+_CHROMA_PREFIX = "agent_memories_"
+_MONGO_PREFIX = "static_memories_"
+_BATCH = 500
+_META_KEYS = ("user_id", "gen")
+
+
+def _current(layer: str, uid: str, gen) -> bool:
+    """共享布局中的记录是否属于该用户当前代际（缺失 gen 视为 0）。"""
+    return (gen or 0) == get_generation_store().get(f"{layer}:{uid}")
+
+
+def _per_user_chroma(client) -> dict[str, str]:
+    """{uid: collection 名}，排除共享 collection 本身。"""
+    return {
+        name[len(_CHROMA_PREFIX):]: name
+        for name in list_vector_collections(client)
+        if name.startswith(_CHROMA_PREFIX) and name != cfg.SHARED_MEMORY_COLLECTION
+    }
+
+
+def _iter_chroma(collection, where: dict | None = None):
+    """按页读取 (ids, documents, metadatas, embeddings)。"""
+    offset = 0
+    while True:
+        page = collection.get(
+            where=where, limit=_BATCH, offset=offset,
+            include=["documents", "metadatas", "embeddings"],
+        )
+        if not len(page["ids"]):
+            return
+        yield page["ids"], page["documents"], page["metadatas"], page["embeddings"]
+        offset += len(page["ids"])
+
+
+def _open(client, name: str):
+    # 迁移时总是显式传入向量，无需 embedding 函数
+    return open_vector_backend(name, None, client=client)
+
+
+def migrate_chroma(to: str, dry_run: bool, drop_source: bool) -> None:
+    client = None if cfg.VECTOR_BACKEND == "numpy" else get_chroma_client()
+
+    if to == "shared":
+        sources = _per_user_chroma(client)
+        target = None if dry_run else _open(client, cfg.SHARED_MEMORY_COLLECTION)
+        total = 0
+        for uid, name in sources.items():
+            src = _open(client, name)
+            gen = get_generation_store().get(f"dynamic:{uid}")
+            moved = 0
+            for ids, docs, metas, embs in _iter_chroma(src):
+                moved += len(ids)
+                if dry_run:
+                    continue
+                metas = [{**(m or {}), "user_id": uid, "gen": gen} for m in metas]
+                target.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=embs)
+            total += moved
+            print(f"  [Chroma] {name} → {cfg.SHARED_MEMORY_COLLECTION}：{moved} 条")
+            if drop_source and not dry_run:
+                src.drop()
+        print(f"[Chroma] 共 {len(sources)} 个用户，{total} 条记忆")
+        return
+
+    # shared → per_user
+    if cfg.SHARED_MEMORY_COLLECTION not in list_vector_collections(client):
+        print(f"[Chroma] 未找到共享 collection {cfg.SHARED_MEMORY_COLLECTION}，跳过")
+        return
+    shared = _open(client, cfg.SHARED_MEMORY_COLLECTION)
+    targets: dict[str, object] = {}
+    counts: dict[str, int] = {}
+    for ids, docs, metas, embs in _iter_chroma(shared):
+        by_user: dict[str, list[int]] = {}
+        for i, meta in enumerate(metas):
+            uid = (meta or {}).get("user_id")
+            if uid and _current("dynamic", uid, meta.get("gen")):
+                by_user.setdefault(uid, []).append(i)
+        for uid, idx in by_user.items():
+            counts[uid] = counts.get(uid, 0) + len(idx)
+            if dry_run:
+                continue
+            if uid not in targets:
+                targets[uid] = _open(client, f"{_CHROMA_PREFIX}{uid}")
+            targets[uid].upsert(
+                ids=[ids[i] for i in idx],
+                documents=[docs[i] for i in idx],
+                metadatas=[{k: v for k, v in metas[i].items() if k not in _META_KEYS} for i in idx],
+                embeddings=[embs[i] for i in idx],
+            )
+    for uid, n in counts.items():
+        print(f"  [Chroma] {cfg.SHARED_MEMORY_COLLECTION} → {_CHROMA_PREFIX}{uid}：{n} 条")
+    if drop_source and not dry_run:
+        shared.drop()
+    print(f"[Chroma] 共 {len(counts)} 个用户，{sum(counts.values())} 条记忆")
+
+
+def migrate_mongo(to: str, dry_run: bool, drop_source: bool) -> None:
+    try:
+        db = get_mongo_client()[cfg.MONGO_DB]
+    except Exception as exc:
+        print(f"[MongoDB] 不可用，跳过静态记忆迁移：{exc}")
+        return
+    from pymongo import ReplaceOne
+
+    if to == "shared":
+        target = db[cfg.SHARED_STATIC_COLLECTION]
+        if not dry_run:
+            target.create_index([("user_id", 1), ("gen", 1), ("_id", 1)])
+        names = [
+            n for n in db.list_collection_names()
+            if n.startswith(_MONGO_PREFIX) and n != cfg.SHARED_STATIC_COLLECTION and "__gc_" not in n
+        ]
+        total = 0
+        for name in names:
+            uid = name[len(_MONGO_PREFIX):]
+            gen = get_generation_store().get(f"static:{uid}")
+            docs = list(db[name].find({}))
+            total += len(docs)
+            if docs and not dry_run:
+                target.bulk_write(
+                    [ReplaceOne({"_id": d["_id"]}, {**d, "user_id": uid, "gen": gen}, upsert=True)
+                     for d in docs],
+                    ordered=False,
+                )
+            print(f"  [MongoDB] {name} → {cfg.SHARED_STATIC_COLLECTION}：{len(docs)} 条")
+            if drop_source and not dry_run:
+                db.drop_collection(name)
+        print(f"[MongoDB] 共 {len(names)} 个用户，{total} 条静态记忆")
+        return
+
+    # shared → per_user
+    shared = db[cfg.SHARED_STATIC_COLLECTION]
+    counts: dict[str, int] = {}
+    for uid in shared.distinct("user_id"):
+        docs = [d for d in shared.find({"user_id": uid}) if _current("static", uid, d.get("gen"))]
+        counts[uid] = len(docs)
+        if docs and not dry_run:
+            db[f"{_MONGO_PREFIX}{uid}"].bulk_write(
+                [
+                    ReplaceOne(
+                        {"_id": d["_id"]},
+                        {k: v for k, v in d.items() if k not in _META_KEYS},
+                        upsert=True,
+                    )
+                    for d in docs
+                ],
+                ordered=False,
+            )
+        print(f"  [MongoDB] {cfg.SHARED_STATIC_COLLECTION} → {_MONGO_PREFIX}{uid}：{len(docs)} 条")
+    if drop_source and not dry_run:
+        db.drop_collection(cfg.SHARED_STATIC_COLLECTION)
+    print(f"[MongoDB] 共 {len(counts)} 个用户，{sum(counts.values())} 条静态记忆")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在 per_user / shared 存储布局之间迁移记忆数据")
+    parser.add_argument("--to", choices=["shared", "per_user"], required=True, help="目标布局")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    parser.add_argument("--drop-source", action="store_true", help="迁移后删除源 collection")
+    parser.add_argument("--skip-mongo", action="store_true", help="只迁移 Chroma 动态记忆")
+    args = parser.parse_args()
+
+    print(f"迁移目标布局：{args.to}{'（dry-run）' if args.dry_run else ''}")
+    migrate_chroma(args.to, args.dry_run, args.drop_source)
+    if not args.skip_mongo:
+        migrate_mongo(args.to, args.dry_run, args.drop_source)
+    if not args.dry_run:
+        print(f"\n完成。请在 .env 中设置 MEMORY_TENANCY={args.to} 后重启服务。")
+
+
+if __name__ == "__main__":
+    main()
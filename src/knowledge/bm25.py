@@ -0,0 +1,263 @@
+"""
+knowledge/bm25.py — 知识库本地倒排索引（BM25）
+================================================
+与 ChromaDB collection 并行维护的关键词索引，用于弥补纯向量检索
+对精确标识符、产品编号、中文关键词匹配不敏感的问题。
+
+分词策略（CJK 感知）：
+  · 英文 / 数字 / 标识符：按 [A-Za-z0-9_.-] 连续串切分并转小写，
+    同时保留拆开后的子词（如 "gpt-4o-mini" → gpt-4o-mini / gpt / 4o / mini）
+  · 中日韩字符：相邻二元组（bigram），无需额外分词依赖；只有孤立的单个汉字才作为单字词项。
+    不为每个汉字建单字倒排：常用字几乎出现在所有块中，单字倒排会让每次检索都扫描全部文档
+
+索引以 JSON 持久化在向量库目录下，由 KnowledgeStore 的内部写入接口
+（即 KnowledgeLoader 的写入路径）增量维护。另在内存中维护
+(source, chunk_index) → doc_id 的位置索引，供相邻块扩展与按来源删除使用。
+
+多进程：应用进程与导入脚本共用同一索引文件。检索前若文件已被其他进程替换则重新加载；
+写入须在 transaction() 内进行（跨进程文件锁 → 重新加载 → 修改 → 写回），见 utils/filesync.py。
+同一线程内嵌套的 transaction() 并入最外层事务，整批导入只在最外层结束时写回一次。
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from src.utils.filesync import file_lock, file_stamp
+
+# 连续的 ASCII 词 / 标识符
+_WORD_RE = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.\-]*[A-Za-z0-9_]|[A-Za-z0-9_]")
+# 中日韩统一表意文字 + 日文假名 + 韩文音节
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+")
+_SUBWORD_SPLIT_RE = re.compile(r"[_.\-]+")
+# 分词规则版本：与索引文件中记录的不一致时按空索引加载，由 KnowledgeStore 从 collection 重建
+_TOKENIZER_VERSION = 2
+
+
+def tokenize(text: str) -> list[str]:
+    """CJK 感知的轻量分词：ASCII 词 + 子词，CJK 二元组（孤立单字保留为单字词项）。"""
+    tokens: list[str] = []
+    for word in _WORD_RE.findall(text):
+        word = word.lower()
+        tokens.append(word)
+        parts = [p for p in _SUBWORD_SPLIT_RE.split(word) if p]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    增量维护的 BM25 倒排索引。
+
+    数据结构：
+      postings : {term: {doc_id: tf}}
+      doc_len  : {doc_id: 文档 token 数}
+      doc_terms: {doc_id: [term, ...]}（正排，删除时无需扫描全部词项）
+      doc_meta : {doc_id: {"source": ..., "chunk_index": ...}}
+      positions: {source: {chunk_index: doc_id}}（由 doc_meta 派生，不落盘）
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self._path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_len: dict[str, int] = {}
+        self._doc_terms: dict[str, list[str]] = {}
+        self._doc_meta: dict[str, dict] = {}
+        self._positions: dict[str, dict[int, str]] = {}
+        self._total_len = 0
+        self._stamp: tuple | None = None   # 已加载文件的 file_stamp，用于发现其他进程的写入
+        self._txn_owner: int | None = None  # 持有写事务的线程，嵌套的 transaction() 不再加锁 / 写回
+        self._load()
+
+    # ================================================================
+    # 写入（由 KnowledgeStore 内部写入接口调用）
+    # ================================================================
+
+    def add(self, doc_id: str, text: str, metadata: dict | None = None) -> None:
+        """加入一个文档；若 doc_id 已存在则先移除旧内容。"""
+        with self._lock:
+            if doc_id in self._doc_len:
+                self._remove(doc_id)
+            tf = Counter(tokenize(text))
+            for term, n in tf.items():
+                self._postings.setdefault(term, {})[doc_id] = n
+            length = sum(tf.values())
+            self._doc_len[doc_id] = length
+            self._doc_terms[doc_id] = list(tf)
+            self._doc_meta[doc_id] = dict(metadata or {})
+            self._index_position(doc_id, self._doc_meta[doc_id])
+            self._total_len += length
+
+    def remove(self, doc_ids: list[str]) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id in self._doc_len:
+                    self._remove(doc_id)
+
+    def ids_for_source(self, source: str) -> list[str]:
+        self.refresh()
+        with self._lock:
+            return list(self._positions.get(source, {}).values())
+
+    def ids_at(self, source: str, chunk_indices: list[int]) -> dict[int, str]:
+        """按 (source, chunk_index) 位置索引查找文档 ID，返回 {chunk_index: doc_id}。"""
+        self.refresh()
+        with self._lock:
+            by_index = self._positions.get(source, {})
+            return {i: by_index[i] for i in chunk_indices if i in by_index}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_len.clear()
+            self._doc_terms.clear()
+            self._doc_meta.clear()
+            self._positions.clear()
+            self._total_len = 0
+
+    def save(self) -> None:
+        """原子写入 JSON（先写临时文件再替换）。"""
+        with self._lock:
+            data = {
+                "tokenizer": _TOKENIZER_VERSION,
+                "postings": self._postings,
+                "doc_len": self._doc_len,
+                "doc_terms": self._doc_terms,
+                "doc_meta": self._doc_meta,
+            }
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            tmp_path = self._path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+            self._stamp = file_stamp(self._path)
+
+    def refresh(self) -> bool:
+        """索引文件被其他进程替换过时重新加载，返回是否重新加载。"""
+        if file_stamp(self._path) == self._stamp:
+            return False
+        with self._lock:
+            self.clear()
+            self._load()
+        return True
+
+    @contextmanager
+    def transaction(self):
+        """
+        跨进程写事务：持有索引文件锁，先合并其他进程已写入的内容，with 块内修改，结束时写回。
+        with 块抛出异常时不写回（内存中的修改在下次 refresh 时被磁盘版本覆盖）。
+        同一线程内嵌套调用直接并入外层事务，由最外层统一写回（批量导入只写一次文件）。
+        """
+        if self._txn_owner == threading.get_ident():
+            yield self
+            return
+        with file_lock(self._path + ".lock"), self._lock:
+            self.refresh()
+            self._txn_owner = threading.get_ident()
+            try:
+                yield self
+            finally:
+                self._txn_owner = None
+            self.save()
+
+    # ================================================================
+    # 检索
+    # ================================================================
+
+    def search(self, query: str, top_k: int) -> list[tuple[str, float]]:
+        """返回 [(doc_id, bm25_score), ...]，按得分降序。"""
+        terms = set(tokenize(query))
+        self.refresh()
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not terms or n_docs == 0:
+                return []
+            avg_len = self._total_len / n_docs or 1.0
+            scores: dict[str, float] = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        return ranked[:top_k]
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._doc_len)
+
+    # ================================================================
+    # 内部方法
+    # ================================================================
+
+    def _remove(self, doc_id: str) -> None:
+        for term in self._doc_terms.pop(doc_id, []):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        meta = self._doc_meta.pop(doc_id, None) or {}
+        by_index = self._positions.get(meta.get("source"))
+        if by_index is not None and by_index.get(meta.get("chunk_index")) == doc_id:
+            del by_index[meta["chunk_index"]]
+            if not by_index:
+                del self._positions[meta["source"]]
+
+    def _index_position(self, doc_id: str, meta: dict) -> None:
+        source, chunk_index = meta.get("source"), meta.get("chunk_index")
+        if source and isinstance(chunk_index, int):
+            self._positions.setdefault(source, {})[chunk_index] = doc_id
+
+    def _load(self) -> None:
+        self._stamp = None
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                self._stamp = file_stamp(f.fileno())   # 与读到的内容对应（读取期间被替换也不会错配）
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as exc:
+            print(f"[BM25Index] 索引文件损坏，将从空索引开始：{exc}")
+            self.clear()
+            return
+        if data.get("tokenizer") != _TOKENIZER_VERSION:
+            print("[BM25Index] 索引文件由旧版分词规则生成，将从 collection 重建")
+            return
+        self._postings = data.get("postings", {})
+        self._doc_len = data.get("doc_len", {})
+        self._doc_terms = data.get("doc_terms", {})
+        self._doc_meta = data.get("doc_meta", {})
+        self._total_len = sum(self._doc_len.values())
+        for doc_id, meta in self._doc_meta.items():
+            self._index_position(doc_id, meta)
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """
+    倒数排名融合（RRF）：score(d) = Σ 1 / (k + rank_i(d))，rank 从 1 开始。
+    返回 [(doc_id, score), ...]，按融合得分降序。
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
@@ -14,17 +14,19 @@ knowledge/loader.py — 知识库文档加载器
     loader.load_directory("docs/", extensions=[".txt", ".md"])
 """
 
+import hashlib
 import os
 from pathlib import Path
 from config import Config
 from src.knowledge.store import KnowledgeStore
+from src.utils.encode_pool import encode_bulk
 
 
 class KnowledgeLoader:
     """
     文档加载器。
 
-    职责：读取文件 → 文本切块 → 写入 KnowledgeStore._add_chunk()。
+    职责：读取文件 → 文本切块 → 写入 KnowledgeStore._add_chunks()。
     只有显式构造 KnowledgeLoader 才能触发写入，AgentMemory 不会创建它。
     """
 
@@ -51,22 +53,17 @@ class KnowledgeLoader:
             source:     来源标识（例如文件名），写入 metadata。
             chunk_size: 每块字符数，None 时读取配置。
             overlap:    相邻块重叠字符数，None 时读取配置。
-            reload:     为 True 时先删除同名来源的旧数据再写入。
+            reload:     为 True 时先删除同名来源的旧数据再写入；
+                        若来源清单中的内容哈希与本次一致则跳过重新导入。
         Returns:
-            写入的块数。
+            写入的块数（内容未变化而跳过时返回已有块数）。
         """
-        chunk_size = chunk_size or Config.KB_CHUNK_SIZE
-        overlap = overlap or Config.KB_CHUNK_OVERLAP
-
-        if reload:
-            self._store._delete_source(source)
-
-        chunks = self._chunk_text(text, chunk_size, overlap)
-        for idx, chunk in enumerate(chunks):
-            self._store._add_chunk(
-                text=chunk,
-                metadata={"source": source, "chunk_index": idx},
-            )
+        prepared = self._prepare(text, source, chunk_size, overlap, reload)
+        if isinstance(prepared, int):
+            return prepared
+        chunks, content_hash = prepared
+        # 整个来源一次性批量写入：一次 embedding 批处理 + 一次索引 / 清单落盘
+        self._write(source, chunks, content_hash, replace=reload)
         return len(chunks)
 
     def load_file(
@@ -75,6 +72,7 @@ class KnowledgeLoader:
         chunk_size: int | None = None,
         overlap: int | None = None,
         reload: bool = True,
+        source: str | None = None,
     ) -> int:
         """
         加载单个文件（.txt / .md / .pdf）。
@@ -84,27 +82,14 @@ class KnowledgeLoader:
             chunk_size: 每块字符数，None 时读取配置。
             overlap:   相邻块重叠字符数，None 时读取配置。
             reload:    默认 True：若该文件已导入则先清除旧数据。
+            source:    来源标识，None 时使用文件名（上传临时文件时传入原始文件名）。
         Returns:
             写入的块数。
         """
         path = Path(file_path)
-        if not path.exists():
-            raise FileNotFoundError(f"文件不存在：{file_path}")
-
-        ext = path.suffix.lower()
-        if ext == ".pdf":
-            text = self._read_pdf(path)
-        elif ext in (".txt", ".md", ".markdown"):
-            text = path.read_text(encoding="utf-8")
-        else:
-            raise ValueError(
-                f"不支持的文件类型 '{ext}'，仅支持 .txt / .md / .pdf"
-            )
-
-        source = path.name
         return self.load_text(
-            text=text,
-            source=source,
+            text=self._read_file(path),
+            source=source or path.name,
             chunk_size=chunk_size,
             overlap=overlap,
             reload=reload,
@@ -121,6 +106,11 @@ class KnowledgeLoader:
         """
         批量加载目录中的所有文档。
 
+        先读取并切块全部文件，再对所有新块做一次 embedding（启用 ENCODE_WORKERS 时
+        由多进程编码池并行完成），最后在同一个写事务内逐个来源写入（索引 / 清单只落盘一次）。
+        旧数据在各来源写入前一刻才删除，
+        整体 embedding 失败时退回逐个来源 embedding，单个来源失败只跳过该来源。
+
         Args:
             dir_path:   目录路径。
             extensions: 要处理的扩展名列表，默认 [".txt", ".md", ".pdf"]。
@@ -136,22 +126,106 @@ class KnowledgeLoader:
             raise NotADirectoryError(f"目录不存在：{dir_path}")
 
         results: dict[str, int] = {}
+        pending: list[tuple[str, list[str], str]] = []   # (来源, 块, 内容哈希)
         for file in sorted(dir_path.rglob("*")):
             if file.suffix.lower() in extensions and file.is_file():
                 try:
-                    n = self.load_file(
-                        str(file), chunk_size=chunk_size, overlap=overlap, reload=reload
+                    prepared = self._prepare(
+                        self._read_file(file), file.name, chunk_size, overlap, reload
                     )
-                    results[file.name] = n
                 except Exception as exc:
                     results[file.name] = -1
                     print(f"[KnowledgeLoader] 跳过 {file.name}：{exc}")
+                    continue
+                if isinstance(prepared, int):
+                    results[file.name] = prepared
+                else:
+                    pending.append((file.name, *prepared))
+
+        try:
+            vectors = encode_bulk([chunk for _, chunks, _ in pending for chunk in chunks])
+        except Exception as exc:
+            # 编码池崩溃 / 内存不足 / 个别文件内容异常：退回逐个来源 embedding，失败只影响该来源
+            print(f"[KnowledgeLoader] 批量 embedding 失败，改为逐个文件处理：{exc}")
+            vectors = None
+        offset = 0
+        # 整个目录共用一个写事务：关键词索引与来源清单在全部来源写完后只落盘一次
+        with self._store._batch():
+            for source, chunks, content_hash in pending:
+                embeddings = vectors[offset : offset + len(chunks)] if vectors is not None else None
+                offset += len(chunks)
+                try:
+                    self._write(source, chunks, content_hash, embeddings, replace=reload)
+                    results[source] = len(chunks)
+                except Exception as exc:
+                    results[source] = -1
+                    print(f"[KnowledgeLoader] 跳过 {source}：{exc}")
         return results
 
     # ================================================================
     # 内部工具
     # ================================================================
 
+    def _prepare(
+        self,
+        text: str,
+        source: str,
+        chunk_size: int | None,
+        overlap: int | None,
+        reload: bool,
+    ) -> tuple[list[str], str] | int:
+        """
+        计算内容哈希并切块，返回 (块列表, 内容哈希)。
+        reload 且内容未变化时不切块，直接返回已有块数。不删除旧数据（由 _write 在写入前删除）。
+        """
+        chunk_size = chunk_size or Config.KB_CHUNK_SIZE
+        overlap = overlap or Config.KB_CHUNK_OVERLAP
+        # 切块参数参与哈希：参数变化时即使文本相同也需要重新切块
+        content_hash = hashlib.sha256(
+            f"{chunk_size}:{overlap}:{text}".encode("utf-8")
+        ).hexdigest()
+
+        if reload:
+            existing = self._store.source_info(source)
+            if existing and existing.get("hash") == content_hash:
+                return existing["chunks"]
+
+        return self._chunk_text(text, chunk_size, overlap), content_hash
+
+    def _write(
+        self,
+        source: str,
+        chunks: list[str],
+        content_hash: str,
+        embeddings: list | None = None,
+        replace: bool = False,
+    ) -> None:
+        """写入一个来源的全部块；replace 时紧接着写入之前删除该来源的旧数据。"""
+        if embeddings is None:
+            # 先完成 embedding 再删除旧数据：embedding 失败时旧数据保持不变
+            embeddings = self._store._embed_chunks(chunks)
+        if replace:
+            self._store._delete_source(source)
+        # 追加到已有来源时不传内容哈希：哈希只描述本次文本，不代表来源的全部块（清单会将其清空）
+        self._store._add_chunks(
+            chunks,
+            [{"source": source, "chunk_index": idx} for idx in range(len(chunks))],
+            content_hash=content_hash if replace or self._store.source_info(source) is None else None,
+            embeddings=embeddings,
+        )
+
+    def _read_file(self, path: Path) -> str:
+        if not path.exists():
+            raise FileNotFoundError(f"文件不存在：{path}")
+        ext = path.suffix.lower()
+        if ext == ".pdf":
+            return self._read_pdf(path)
+        if ext in (".txt", ".md", ".markdown"):
+            return path.read_text(encoding="utf-8")
+        raise ValueError(
+            f"不支持的文件类型 '{ext}'，仅支持 .txt / .md / .pdf"
+        )
+
     @staticmethod
     def _chunk_text(text: str, chunk_size: int, overlap: int) -> list[str]:
         """
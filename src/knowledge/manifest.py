@@ -0,0 +1,128 @@
+"""
+knowledge/manifest.py — 知识库来源清单
+========================================
+持久化记录每个来源的摘要信息：
+
+    {source: {"chunks": 块数, "ingested_at": 导入时间, "hash": 内容哈希}}
+
+由 KnowledgeStore 的内部写入接口（_add_chunks / _delete_source / _clear_all）维护，
+使 list_sources / count / __repr__ 的开销只与来源数量相关，
+无需对 collection 做全量 metadata 扫描。
+
+多进程：与 BM25 索引相同，读取前发现清单文件被其他进程替换即重新加载，
+写入在 transaction() 内合并磁盘上的最新版本后写回（见 utils/filesync.py）；
+同一线程内嵌套的 transaction() 并入最外层事务，只在最外层结束时写回一次。
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.utils.filesync import file_lock, file_stamp
+
+
+class SourceManifest:
+    """来源清单（JSON 持久化，线程安全）。"""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.RLock()
+        self._sources: dict[str, dict] = {}
+        self._stamp: tuple | None = None   # 已加载文件的 file_stamp，用于发现其他进程的写入
+        self._txn_owner: int | None = None  # 持有写事务的线程，嵌套的 transaction() 不再加锁 / 写回
+        self.exists = False
+        self._load()
+
+    def add_chunks(self, source: str, n: int, content_hash: str | None = None) -> None:
+        """
+        登记某来源新增的块数。内容哈希只在本次写入构成该来源的全部内容时记录；
+        向已有来源追加时清空哈希（原哈希只描述旧内容），下次 reload 不会被误判为未变化而跳过。
+        """
+        with self._lock:
+            entry = self._sources.setdefault(
+                source, {"chunks": 0, "ingested_at": "", "hash": ""}
+            )
+            entry["chunks"] += n
+            entry["ingested_at"] = datetime.utcnow().isoformat(timespec="seconds")
+            entry["hash"] = content_hash if content_hash is not None and entry["chunks"] == n else ""
+
+    def remove(self, source: str) -> None:
+        with self._lock:
+            self._sources.pop(source, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sources.clear()
+
+    def get(self, source: str) -> dict | None:
+        self.refresh()
+        with self._lock:
+            entry = self._sources.get(source)
+            return dict(entry) if entry else None
+
+    def sources(self) -> list[str]:
+        self.refresh()
+        with self._lock:
+            return sorted(self._sources)
+
+    def stats(self) -> dict[str, dict]:
+        self.refresh()
+        with self._lock:
+            return {s: dict(e) for s, e in sorted(self._sources.items())}
+
+    def total_chunks(self) -> int:
+        self.refresh()
+        with self._lock:
+            return sum(e["chunks"] for e in self._sources.values())
+
+    def save(self) -> None:
+        """原子写入 JSON（先写临时文件再替换）。"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            tmp_path = self._path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._sources, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self._path)
+            self._stamp = file_stamp(self._path)
+            self.exists = True
+
+    def refresh(self) -> bool:
+        """清单文件被其他进程替换过时重新加载，返回是否重新加载。"""
+        if file_stamp(self._path) == self._stamp:
+            return False
+        with self._lock:
+            self._load()
+        return True
+
+    @contextmanager
+    def transaction(self):
+        """
+        跨进程写事务：持有清单文件锁，先合并其他进程已写入的内容，with 块内修改，结束时写回。
+        同一线程内嵌套调用直接并入外层事务，由最外层统一写回。
+        """
+        if self._txn_owner == threading.get_ident():
+            yield self
+            return
+        with file_lock(self._path + ".lock"), self._lock:
+            self.refresh()
+            self._txn_owner = threading.get_ident()
+            try:
+                yield self
+            finally:
+                self._txn_owner = None
+            self.save()
+
+    def _load(self) -> None:
+        self._sources, self._stamp, self.exists = {}, None, False
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                self._stamp = file_stamp(f.fileno())
+                self._sources = json.load(f)
+            self.exists = True
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            print(f"[SourceManifest] 清单文件损坏，将从 collection 重建：{exc}")
+            self._sources = {}
@@ -0,0 +1,117 @@
+"""
+knowledge/postprocess.py — 知识库检索结果后处理
+=================================================
+KnowledgeLoader._chunk_text 产生的相邻块带有 overlap 重叠，
+直接拼入 Prompt 会重复同一段文字，也可能截断在句子中间。
+
+merge_adjacent_hits() 在检索之后：
+  1. 将排名靠前的强命中向两侧扩展 window 个相邻块（补全被切断的上下文）
+  2. 同一来源中 chunk_index 连续的块合并为一段
+  3. 合并时剥离相邻块之间重复的 overlap 文本
+
+相邻块通过 KnowledgeStore.get_chunks 的 (source, chunk_index) 位置索引取回，
+不做 collection 全量扫描。
+"""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.knowledge.store import KnowledgeStore
+
+# 判定为 overlap 的最短公共长度，避免把偶然相同的一两个字符当作重叠
+_MIN_OVERLAP = 8
+
+
+def merge_adjacent_hits(
+    hits: list[dict],
+    store: "KnowledgeStore",
+    expand_top: int = 1,
+    window: int = 1,
+    max_overlap: int = 100,
+) -> list[dict]:
+    """
+    合并同一来源的相邻命中并去除重叠，可选扩展强命中的邻居块。
+
+    Args:
+        hits:        retrieve 的结果（按相关度排序）。
+        store:       用于取回邻居块的 KnowledgeStore。
+        expand_top:  前多少条命中视为强命中并扩展邻居（0 表示不扩展）。
+        window:      每个强命中向两侧各扩展的块数。
+        max_overlap: 检测重叠时比较的最大字符数（应 ≥ 入库时的 overlap）。
+    Returns:
+        合并后的片段列表，按其中最佳命中的原始排名排序。每项在原字段基础上
+        增加 "chunk_indices"（合并了哪些块）；distance 取组内最小值。
+    """
+    if not hits:
+        return []
+
+    # source → {chunk_index: (rank, hit)}；没有合法位置信息的命中原样保留
+    by_source: dict[str, dict[int, tuple[float, dict]]] = {}
+    passthrough: list[tuple[float, dict]] = []
+    for rank, hit in enumerate(hits):
+        idx = hit.get("chunk_index")
+        if not hit.get("source") or not isinstance(idx, int):
+            passthrough.append((rank, hit))
+            continue
+        slot = by_source.setdefault(hit["source"], {})
+        if idx not in slot:
+            slot[idx] = (rank, hit)
+
+    # 强命中扩展邻居：邻居排名取触发扩展的命中排名 + 0.5（排在该命中之后、下一命中之前）
+    if window > 0 and expand_top > 0:
+        for rank, hit in enumerate(hits[:expand_top]):
+            idx = hit.get("chunk_index")
+            if not hit.get("source") or not isinstance(idx, int):
+                continue
+            slot = by_source[hit["source"]]
+            wanted = [
+                i for i in range(idx - window, idx + window + 1)
+                if i >= 0 and i not in slot
+            ]
+            for neighbor in store.get_chunks(hit["source"], wanted):
+                slot.setdefault(neighbor["chunk_index"], (rank + 0.5, neighbor))
+
+    merged: list[tuple[float, dict]] = list(passthrough)
+    for slot in by_source.values():
+        run: list[tuple[float, dict]] = []
+        prev_idx: int | None = None
+        for idx in sorted(slot):
+            if prev_idx is not None and idx != prev_idx + 1:
+                merged.append(_merge_run(run, max_overlap))
+                run = []
+            run.append(slot[idx])
+            prev_idx = idx
+        if run:
+            merged.append(_merge_run(run, max_overlap))
+
+    merged.sort(key=lambda rh: rh[0])
+    return [hit for _, hit in merged]
+
+
+def _merge_run(run: list[tuple[float, dict]], max_overlap: int) -> tuple[float, dict]:
+    """将一段 chunk_index 连续的块拼接为一个命中。"""
+    best_rank = min(rank for rank, _ in run)
+    first = run[0][1]
+    text = first["text"]
+    for _, hit in run[1:]:
+        text = _join_without_overlap(text, hit["text"], max_overlap)
+
+    distances = [h["distance"] for _, h in run if h.get("distance") is not None]
+    best_hit = next(h for r, h in run if r == best_rank)
+    merged = {
+        **best_hit,
+        "text": text,
+        "chunk_index": first["chunk_index"],
+        "chunk_indices": [h["chunk_index"] for _, h in run],
+        "distance": min(distances) if distances else None,
+    }
+    return best_rank, merged
+
+
+def _join_without_overlap(left: str, right: str, max_overlap: int) -> str:
+    """找出 left 末尾与 right 开头的最长公共部分，拼接时只保留一份。"""
+    limit = min(len(left), len(right), max_overlap)
+    for n in range(limit, _MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:n]):
+            return left + right[n:]
+    return left + "\n" + right
@@ -5,14 +5,27 @@ KnowledgeStore 对外只暴露检索接口（retrieve / search），
 写入方法以单下划线标注，仅供 KnowledgeLoader 在初始化阶段调用。
 RAG 流程中 AgentMemory 只持有 KnowledgeStore，从根本上
 确保运行期间无法向知识库写入任何内容。
+
+来源清单（SourceManifest）与 BM25 索引一起存放在 VECTOR_DB_PATH/kb_index/ 下，
+list_sources / count / __repr__ 读取清单，不扫描 collection。
+两者都可能被其他进程（如导入脚本）同时写入：读取前发现文件变化即重新加载，
+写入在跨进程写事务内完成（见 utils/filesync.py），批量导入经 _batch() 合并为一次写回。
+
+检索模式（KB_RETRIEVAL_MODE）：
+  vector — 纯向量检索（默认）
+  hybrid — 向量检索 + 本地 BM25 关键词检索，按倒数排名融合（RRF）
 """
 
 import os
 import uuid
-import chromadb
+from contextlib import contextmanager
 
 from config import Config
-from src.utils.embedding import build_embedding
+from src.knowledge.bm25 import BM25Index, reciprocal_rank_fusion
+from src.knowledge.manifest import SourceManifest
+from src.utils.embedding import get_embedding
+from src.utils.encode_pool import encode_bulk
+from src.utils.vector_backend import open_vector_backend
 
 
 class KnowledgeStore:
@@ -27,69 +40,187 @@ class KnowledgeStore:
     def __init__(self, collection_name: str | None = None):
         collection_name = collection_name or Config.KB_COLLECTION
         db_path = os.path.abspath(Config.VECTOR_DB_PATH)
-        os.makedirs(db_path, exist_ok=True)
 
-        self._client = chromadb.PersistentClient(path=db_path)
-        self._embedding_fn = build_embedding()
-        self._collection = self._client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self._embedding_fn,
-        )
+        self._embedding_fn = get_embedding()
+        # 向量存储后端（VECTOR_BACKEND：chroma / numpy / auto），接口与 Chroma collection 一致
+        self._collection = open_vector_backend(collection_name, self._embedding_fn, db_path=db_path)
+
+        # 与 collection 并行维护的 BM25 关键词索引与来源清单（存放在向量库目录的 kb_index/ 下）
+        index_dir = os.path.join(db_path, "kb_index")
+        self._keyword_index = BM25Index(os.path.join(index_dir, f"{collection_name}.bm25.json"))
+        self._manifest = SourceManifest(os.path.join(index_dir, f"{collection_name}.manifest.json"))
+        # 变更版本号：每次内部写入递增，AgentMemory.versions() 读取
+        self.version = 0
+        if self._needs_rebuild():
+            self._rebuild_indexes()
 
     # ================================================================
     # 公开只读接口
     # ================================================================
 
-    def retrieve(self, query: str, top_k: int | None = None) -> list[dict]:
+    def retrieve(
+        self,
+        query: str,
+        top_k: int | None = None,
+        mode: str | None = None,
+        query_embedding=None,
+    ) -> list[dict]:
         """
-        语义检索与 query 最相关的知识片段。
+        检索与 query 最相关的知识片段。
 
+        Args:
+            query: 查询文本。
+            top_k: 返回条数，None 时读取 KB_TOP_K。
+            mode:  "vector" | "hybrid"，None 时读取 KB_RETRIEVAL_MODE。
+            query_embedding: 预先计算好的查询向量（与动态记忆检索共享），None 时现算。
         返回列表，每项格式：
-          {"text": str, "source": str, "distance": float}
+          {"id": str, "text": str, "source": str, "chunk_index": int | str,
+           "distance": float | None}
+        hybrid 模式下仅由关键词命中的片段 distance 为 None，并额外带有 RRF 得分 "score"。
         """
         top_k = top_k or Config.KB_TOP_K
+        mode = (mode or Config.KB_RETRIEVAL_MODE).lower()
+        if mode == "hybrid":
+            return self.retrieve_hybrid(query, top_k, query_embedding)
+        return self.retrieve_vector(query, top_k, query_embedding)
+
+    def retrieve_vector(self, query: str, top_k: int, query_embedding=None) -> list[dict]:
+        """纯向量语义检索。"""
         count = self._collection.count()
         if count == 0:
             return []
-        top_k = min(top_k, count)
 
-        results = self._collection.query(
-            query_texts=[query],
-            n_results=top_k,
-        )
+        if query_embedding is not None:
+            results = self._collection.query(
+                query_embeddings=[query_embedding],
+                n_results=min(top_k, count),
+            )
+        else:
+            results = self._collection.query(
+                query_texts=[query],
+                n_results=min(top_k, count),
+            )
         return [
-            {
-                "text": results["documents"][0][i],
-                "source": (results["metadatas"][0][i] or {}).get("source", ""),
-                "distance": results["distances"][0][i],
-            }
+            _format_hit(
+                results["ids"][0][i],
+                results["documents"][0][i],
+                results["metadatas"][0][i],
+                results["distances"][0][i],
+            )
             for i in range(len(results["documents"][0]))
         ]
 
-    def count(self) -> int:
-        """返回知识库中的文档块数量。"""
-        return self._collection.count()
+    def retrieve_hybrid(self, query: str, top_k: int, query_embedding=None) -> list[dict]:
+        """
+        混合检索：向量与 BM25 各取 top_k × KB_HYBRID_CANDIDATES 个候选，
+        以 RRF 融合两路排名后截取前 top_k 条。
+        """
+        n_candidates = top_k * max(1, Config.KB_HYBRID_CANDIDATES)
+        vector_hits = self.retrieve_vector(query, n_candidates, query_embedding)
+        keyword_hits = self._keyword_index.search(query, n_candidates)
+        if not keyword_hits:
+            return vector_hits[:top_k]
 
-    def get_all(self) -> list[dict]:
-        """返回所有文档块（仅用于展示 / 调试）。"""
-        result = self._collection.get()
+        fused = reciprocal_rank_fusion(
+            [[h["id"] for h in vector_hits], [doc_id for doc_id, _ in keyword_hits]],
+            k=Config.KB_RRF_K,
+        )[:top_k]
+
+        by_id = {h["id"]: h for h in vector_hits}
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if missing:
+            result = self._collection.get(ids=missing)
+            for doc_id, doc, meta in zip(result["ids"], result["documents"], result["metadatas"]):
+                by_id[doc_id] = _format_hit(doc_id, doc, meta, None)
+
+        hits: list[dict] = []
+        for doc_id, score in fused:
+            hit = by_id.get(doc_id)
+            if hit is not None:   # 索引与 collection 短暂不一致时跳过
+                hits.append({**hit, "score": score})
+        return hits
+
+    def get_chunks(self, source: str, chunk_indices: list[int]) -> list[dict]:
+        """
+        按 (source, chunk_index) 取回指定块（走位置索引 + 主键查询，不扫描 collection）。
+        返回格式同 retrieve，distance 为 None；不存在的位置被忽略。
+        """
+        ids = self._keyword_index.ids_at(source, chunk_indices)
+        if not ids:
+            return []
+        result = self._collection.get(ids=list(ids.values()))
         return [
-            {
-                "text": doc,
-                "source": (meta or {}).get("source", ""),
-                "chunk_index": (meta or {}).get("chunk_index", ""),
-            }
-            for doc, meta in zip(result["documents"], result["metadatas"])
+            _format_hit(doc_id, doc, meta, None)
+            for doc_id, doc, meta in zip(result["ids"], result["documents"], result["metadatas"])
         ]
 
+    def count(self) -> int:
+        """返回知识库中的文档块数量（读取来源清单）。"""
+        return self._manifest.total_chunks()
+
+    def get_all(self) -> list[dict]:
+        """返回所有文档块（仅用于展示 / 调试，内部按页拉取）。"""
+        return list(self.iter_all())
+
+    def list_page(
+        self,
+        offset: int = 0,
+        limit: int = 100,
+        fields: tuple[str, ...] = ("text", "source", "chunk_index"),
+    ) -> dict:
+        """
+        分页读取文档块，只取 fields 指定的字段（id / text / source / chunk_index），从不读取向量。
+        返回 {"items": [...], "next_offset": 下一页起点，没有更多时为 None}
+        """
+        include = []
+        if "text" in fields:
+            include.append("documents")
+        if "source" in fields or "chunk_index" in fields:
+            include.append("metadatas")
+        result = self._collection.get(limit=limit, offset=offset, include=include)
+
+        items = []
+        for i, doc_id in enumerate(result["ids"]):
+            meta = (result["metadatas"][i] or {}) if "metadatas" in include else {}
+            item = {}
+            if "id" in fields:
+                item["id"] = doc_id
+            if "text" in fields:
+                item["text"] = result["documents"][i]
+            if "source" in fields:
+                item["source"] = meta.get("source", "")
+            if "chunk_index" in fields:
+                item["chunk_index"] = meta.get("chunk_index", "")
+            items.append(item)
+        next_offset = offset + len(items) if len(items) == limit else None
+        return {"items": items, "next_offset": next_offset}
+
+    def iter_all(
+        self,
+        batch_size: int = 500,
+        fields: tuple[str, ...] = ("text", "source", "chunk_index"),
+    ):
+        """逐页迭代全部文档块，内存占用与 batch_size 成正比。"""
+        offset: int | None = 0
+        while offset is not None:
+            page = self.list_page(offset, batch_size, fields)
+            yield from page["items"]
+            offset = page["next_offset"]
+
     def list_sources(self) -> list[str]:
-        """返回已导入的来源文件名列表（去重）。"""
-        result = self._collection.get()
-        sources = {(meta or {}).get("source", "") for meta in result["metadatas"]}
-        return sorted(s for s in sources if s)
+        """返回已导入的来源文件名列表（去重，读取来源清单）。"""
+        return [s for s in self._manifest.sources() if s]
+
+    def source_stats(self) -> dict[str, dict]:
+        """返回 {来源: {"chunks": 块数, "ingested_at": 导入时间, "hash": 内容哈希}}。"""
+        return self._manifest.stats()
+
+    def source_info(self, source: str) -> dict | None:
+        """返回单个来源的清单条目，未导入时返回 None。"""
+        return self._manifest.get(source)
 
     def __len__(self) -> int:
-        return self._collection.count()
+        return self.count()
 
     def __repr__(self) -> str:
         return f"KnowledgeStore(chunks={self.count()}, sources={self.list_sources()})"
@@ -100,26 +231,110 @@ class KnowledgeStore:
 
     def _add_chunk(self, text: str, metadata: dict | None = None) -> None:
         """写入单个文本块。外部代码不应直接调用此方法。"""
-        self._collection.add(
-            documents=[text],
-            metadatas=[metadata or {}],
-            ids=[str(uuid.uuid4())],
-        )
+        self._add_chunks([text], [metadata or {}])
+
+    def _add_chunks(
+        self,
+        texts: list[str],
+        metadatas: list[dict],
+        content_hash: str | None = None,
+        embeddings: list | None = None,
+    ) -> list[str]:
+        """
+        批量写入文本块（一次 embedding + 一次写入），同步更新关键词索引与来源清单。
+        content_hash 为整个来源的内容哈希，由 KnowledgeLoader 传入，用于跳过未变化的重复导入。
+        embeddings 为调用方预先算好的向量（如多进程编码池的结果），None 时块数足够多则走
+        编码池，否则由向量后端在进程内 embedding。
+        """
+        if not texts:
+            return []
+        ids = [str(uuid.uuid4()) for _ in texts]
+        if embeddings is None:
+            embeddings = encode_bulk(texts)
+        per_source: dict[str, int] = {}
+        for meta in metadatas:
+            source = meta.get("source", "")
+            per_source[source] = per_source.get(source, 0) + 1
+
+        # collection、索引与清单在同一跨进程写事务内更新，其他进程的写入不会被覆盖
+        with self._keyword_index.transaction(), self._manifest.transaction():
+            self._collection.add(documents=texts, metadatas=metadatas, ids=ids, embeddings=embeddings)
+            for doc_id, text, meta in zip(ids, texts, metadatas):
+                self._keyword_index.add(doc_id, text, meta)
+            for source, n in per_source.items():
+                self._manifest.add_chunks(source, n, content_hash)
+        self.version += 1
+        return ids
+
+    @contextmanager
+    def _batch(self):
+        """
+        批量写入：块内多次 _add_chunks / _delete_source 共用一个跨进程写事务，
+        关键词索引与来源清单只在结束时各写回一次（导入 N 个来源不再整体重写 N 次 JSON）。
+        """
+        with self._keyword_index.transaction(), self._manifest.transaction():
+            yield
+
+    def _embed_chunks(self, texts: list[str]) -> list:
+        """计算文本块向量（块数足够多时走多进程编码池），供调用方在修改存储之前完成 embedding。"""
+        vectors = encode_bulk(texts)
+        return vectors if vectors is not None else self._embedding_fn(texts)
 
     def _delete_source(self, source: str) -> None:
         """删除指定来源的所有块（用于重新加载文件时清理旧数据）。"""
-        result = self._collection.get(where={"source": source})
-        if result["ids"]:
-            self._collection.delete(ids=result["ids"])
+        with self._keyword_index.transaction(), self._manifest.transaction():
+            result = self._collection.get(where={"source": source}, include=[])
+            if result["ids"]:
+                self._collection.delete(ids=result["ids"])
+                self._keyword_index.remove(result["ids"])
+            self._manifest.remove(source)
+        self.version += 1
 
     def _clear_all(self) -> int:
         """清空知识库中的全部文档块，返回被删除的块数。"""
+        with self._keyword_index.transaction(), self._manifest.transaction():
+            count = self._collection.count()
+            # 整体清空再重建，比逐 ID 删除更可靠（避免 ChromaDB 段缓存残留）；旧数据同步释放
+            self._collection.truncate()()
+            self._keyword_index.clear()
+            self._manifest.clear()
+        self.version += 1
+        return count
+
+    def _needs_rebuild(self) -> bool:
+        """
+        索引或清单缺失，或清单块数与 collection 不一致（如旧版本多进程写入互相覆盖）时需要重建。
+        collection.count() 不扫描数据，开销与清单读取相当。
+        """
         count = self._collection.count()
-        collection_name = self._collection.name
-        # 删除整个 collection 再重建，比逐 ID 删除更可靠（避免 ChromaDB 段缓存残留）
-        self._client.delete_collection(collection_name)
-        self._collection = self._client.create_collection(
-            name=collection_name,
-            embedding_function=self._embedding_fn,
+        if count == 0:
+            return False
+        return (
+            len(self._keyword_index) == 0
+            or not self._manifest.exists
+            or self._manifest.total_chunks() != count
         )
-        return count
+
+    def _rebuild_indexes(self) -> None:
+        """从 collection 全量重建关键词索引与来源清单（启动时发现缺失或不一致才执行）。"""
+        with self._keyword_index.transaction(), self._manifest.transaction():
+            if not self._needs_rebuild():   # 等锁期间已由其他进程重建
+                return
+            print("[KnowledgeStore] 关键词索引 / 来源清单缺失或与 collection 不一致，正在重建")
+            result = self._collection.get()
+            self._keyword_index.clear()
+            self._manifest.clear()
+            for doc_id, doc, meta in zip(result["ids"], result["documents"], result["metadatas"]):
+                self._keyword_index.add(doc_id, doc, meta or {})
+                self._manifest.add_chunks((meta or {}).get("source", ""), 1)
+
+
+def _format_hit(doc_id: str, text: str, meta: dict | None, distance: float | None) -> dict:
+    meta = meta or {}
+    return {
+        "id": doc_id,
+        "text": text,
+        "source": meta.get("source", ""),
+        "chunk_index": meta.get("chunk_index", ""),
+        "distance": distance,
+    }
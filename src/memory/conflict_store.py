@@ -0,0 +1,150 @@
+"""
+memory/conflict_store.py — 待确认记忆冲突的持久化存储（SQLite）
+==================================================================
+整理器判定为 CONFLICT 的记忆不直接写入，而是存入本存储，等待用户在前端（app.py）
+或通过 api.py 的 /conflicts 接口确认。取代 AgentMemory 中的内存列表：
+
+  · 持久化：冲突写入 CONFLICT_DB_PATH（WAL 模式），重启后仍在；Streamlit 与 API 进程可共用同一文件
+  · 索引：cid 为主键，确认 / 拒绝按主键 O(1) 取出；(user_key, created_at) 索引支持按用户列出
+  · 去重：同一用户、同一记忆层对同一条已有记忆（old_id）只保留一条待确认冲突，
+    重复提取时以最新的新内容 / 原因覆盖，cid 与创建时间不变（前端卡片不会重复堆积）
+  · 取出即删除：take / take_many 在一个事务内读取并删除，同一冲突被多个标签页或请求
+    同时确认时只有一方取到，不会重复写入
+
+CONFLICT_DB_PATH 为 ":memory:" 时只保存在进程内存中（不持久化）。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from config import Config
+from src.memory.consolidator import ConflictItem
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conflicts (
+    cid         TEXT PRIMARY KEY,
+    user_key    TEXT NOT NULL,
+    memory_type TEXT NOT NULL,
+    new_content TEXT NOT NULL,
+    old_content TEXT NOT NULL,
+    old_id      TEXT NOT NULL,
+    reason      TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conflicts_user ON conflicts (user_key, created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_conflicts_old_id
+    ON conflicts (user_key, memory_type, old_id) WHERE old_id != '';
+"""
+
+_COLUMNS = "cid, memory_type, new_content, old_content, old_id, reason"
+
+
+def _row_to_item(row: tuple) -> ConflictItem:
+    cid, memory_type, new_content, old_content, old_id, reason = row
+    return ConflictItem(
+        memory_type=memory_type,
+        new_content=new_content,
+        old_content=old_content,
+        old_id=old_id,
+        reason=reason,
+        cid=cid,
+    )
+
+
+class ConflictStore:
+    """按 cid 与用户索引的冲突存储（线程安全，单连接 + 进程内锁）。"""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            path = os.path.abspath(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(self, user_key: str, conflict: ConflictItem) -> ConflictItem:
+        """
+        加入一条待确认冲突，返回实际存储的冲突。
+        该用户对同一 old_id 已有待确认冲突时合并到已有记录（返回的 cid 为已有记录的 cid）。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"INSERT INTO conflicts ({_COLUMNS}, user_key, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_key, memory_type, old_id) WHERE old_id != '' DO UPDATE SET "
+                "new_content = excluded.new_content, old_content = excluded.old_content, "
+                "reason = excluded.reason "
+                "RETURNING cid",
+                (
+                    conflict.cid, conflict.memory_type, conflict.new_content,
+                    conflict.old_content, conflict.old_id, conflict.reason,
+                    user_key, time.time(),
+                ),
+            ).fetchone()
+        if row[0] == conflict.cid:
+            return conflict
+        return ConflictItem(
+            memory_type=conflict.memory_type,
+            new_content=conflict.new_content,
+            old_content=conflict.old_content,
+            old_id=conflict.old_id,
+            reason=conflict.reason,
+            cid=row[0],
+        )
+
+    def list_pending(self, user_key: str) -> list[ConflictItem]:
+        """该用户全部待确认冲突，按创建时间排序。"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM conflicts WHERE user_key = ? ORDER BY created_at",
+                (user_key,),
+            ).fetchall()
+        return [_row_to_item(r) for r in rows]
+
+    def count(self, user_key: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM conflicts WHERE user_key = ?", (user_key,)
+            ).fetchone()[0]
+
+    def take(self, user_key: str, cid: str) -> ConflictItem | None:
+        """按 cid 取出并删除一条冲突；不存在（或已被确认）时返回 None。"""
+        taken = self.take_many(user_key, [cid])
+        return taken[0] if taken else None
+
+    def take_many(self, user_key: str, cids: list[str]) -> list[ConflictItem]:
+        """在一个事务内按 cid 取出并删除多条冲突，返回取到的冲突（按 cids 顺序，缺失的跳过）。"""
+        taken: list[ConflictItem] = []
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")   # 自动提交模式下显式开启事务，退出 with 时提交
+            for cid in dict.fromkeys(cids):
+                row = self._conn.execute(
+                    f"DELETE FROM conflicts WHERE cid = ? AND user_key = ? RETURNING {_COLUMNS}",
+                    (cid, user_key),
+                ).fetchone()
+                if row is not None:
+                    taken.append(_row_to_item(row))
+        return taken
+
+    def clear_user(self, user_key: str) -> None:
+        """删除该用户全部待确认冲突（reset 使用）。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM conflicts WHERE user_key = ?", (user_key,))
+
+
+_store: ConflictStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_conflict_store() -> ConflictStore:
+    """返回进程内共享的冲突存储（首次调用时打开 CONFLICT_DB_PATH）。"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConflictStore(Config.CONFLICT_DB_PATH)
+        return _store
@@ -1,7 +1,9 @@
 """
 memory/consolidator.py — 后台记忆整理器
 ==========================================
-与前端（用户聊天路径）完全解耦的后台线程。
+与前端（用户聊天路径）完全解耦的后台整理。每个用户一个 MemoryConsolidator，
+只保存该用户的待处理队列与票据状态；实际执行由进程级 ConsolidationScheduler
+（memory/scheduler.py）的固定工作线程池按用户轮转调度。
 
 工作流程：
   1. 接收被 FIFO 弹出或 auto_extract 提交的对话片段
@@ -9,24 +11,64 @@ memory/consolidator.py — 后台记忆整理器
   3. 检索已有相似记忆
   4. LLM 比对 → ADD / UPDATE（无冲突融合）/ CONFLICT（阻塞写，推送前端）
   5. 执行写入或将冲突放入 AgentMemory._pending_conflicts 等待用户确认
+
+背压：每个用户的待处理队列最多 CONSOLIDATE_QUEUE_MAX 条提交，满载时按 CONSOLIDATE_QUEUE_POLICY：
+  coalesce    — 把积压提交（含本次）合并为一条：消息去重，超过 CONSOLIDATE_COALESCE_MAX_MESSAGES
+                时只保留最新的消息（默认策略，LLM 故障期间内存占用有上界）
+  drop_oldest — 丢弃最旧的一条提交
+  block       — 阻塞提交方直到队列有空位，超过 CONSOLIDATE_QUEUE_BLOCK_TIMEOUT 秒则退化为 coalesce
+计数记入 metrics（consolidate.queue.coalesced / dropped / trimmed / blocked），
+队列深度与最旧提交的等待时长见 ConsolidationScheduler.stats()。
+
+自适应批窗口：提交不会立即触发整理，同一用户在窗口内的提交合并为一次 LLM 提取：
+  · 防抖 / 空闲提交：用户停顿 CONSOLIDATE_BATCH_IDLE 秒后整理（每次新提交重新计时），
+    但不早于首条提交后 CONSOLIDATE_BATCH_MIN_DELAY 秒
+  · 上限：首条提交后最多等待 CONSOLIDATE_BATCH_MAX_DELAY 秒（0 关闭批窗口，入队即整理）
+  · 批大小：积压消息（去重后）估算 token 数达到 CONSOLIDATE_BATCH_TARGET_TOKENS 立即整理
+  · wait()（读己之写屏障）会提前结束窗口，等待方不承担攒批延迟
+低流量时按空闲及时整理，高流量时按批大小整理，每次提交平均的提取调用数见
+ConsolidationScheduler.stats()["extract_per_submit"]，触发原因计入 consolidate.window.*。
+
+持久化：CONSOLIDATE_DURABLE_PATH 非空时每次提交先写入 SQLite 日志（memory/durable_queue.py），
+整理完成后才删除；实例创建时认领本用户未完成的批次重新入队，写入按 (batch_id, 操作) 幂等。
+
+取消语义：每次 cancel_pending()（reset 使用）都会推进纪元（epoch）。
+所有写入都在 _apply_lock 内校验纪元，旧纪元的批次即使 LLM 调用已在进行，
+结果也不会再写入，保证 reset 之后不会有残留写入。
 """
 
+import hashlib
 import json
-import queue
 import re
 import threading
+import time
 import traceback
 import uuid
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Callable
 
 from config import Config
-from src.utils.llm import build_consolidate_llm
+from src.memory.durable_queue import get_durable_queue
+from src.memory.scheduler import get_scheduler
+from src.utils.llm import get_consolidate_llm
+from src.utils.metrics import metrics
 
 if TYPE_CHECKING:
     from src.memory.manager import AgentMemory
 
 
+# CJK 字符（按 1 字 1 token 估算），其余文本按 4 字符 1 token 估算
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]")
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算 token 数，只用于批窗口的批大小判断。"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk) // 4
+
+
 # ── Prompts ─────────────────────────────────────────────────────────
 
 _EXTRACT_PROMPT = """\
@@ -92,62 +134,257 @@ class ConflictItem:
     cid: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
 
 
+QUEUE_POLICIES = ("coalesce", "drop_oldest", "block")
+
+
 # ── 整理器 ───────────────────────────────────────────────────────────
 
 class MemoryConsolidator:
     """
     后台记忆整理器。
 
-    - 以 daemon 线程运行，进程退出时自动回收
-    - submit() 立即返回，不阻塞调用方
-    - 内部以 3 秒超时批量收集，再统一处理
+    - 不持有线程：submit() 入队后通知共享调度器，立即返回单调递增的整理票据（ticket）
+    - 调度器在批窗口结束后调用 run_once()，把此刻积压的全部提交合并为一批处理；
+      同一整理器不会被并发调度，保证同一用户按提交顺序整理
+    - wait(ticket) 作为读己之写屏障：阻塞到该票据（默认为最新票据）处理完成
     """
 
     def __init__(self, manager: "AgentMemory"):
         self._manager = manager
-        self._queue: queue.Queue[list[dict]] = queue.Queue()
+        # (ticket, epoch, messages, 入队时间, 持久化 batch_id 列表)，受 _ticket_cond 保护；条数上限见模块说明
+        self._pending: deque[tuple[int, int, list[dict], float, list[str]]] = deque()
+        self._queue_max = Config.CONSOLIDATE_QUEUE_MAX
+        self._policy = Config.CONSOLIDATE_QUEUE_POLICY.lower()
+        if self._policy not in QUEUE_POLICIES:
+            raise ValueError(
+                f"不支持的 CONSOLIDATE_QUEUE_POLICY='{Config.CONSOLIDATE_QUEUE_POLICY}'，"
+                f"可选：{' / '.join(QUEUE_POLICIES)}"
+            )
         self._llm: Callable[[list[dict], float], str] | None = None   # 懒加载，首次处理时初始化
-        self._thread = threading.Thread(
-            target=self._worker, daemon=True, name="MemoryConsolidator"
-        )
-        self._thread.start()
+
+        # 批窗口参数（见模块说明）；_flush_requested 由 wait() 置位，要求立即整理当前积压
+        self._min_delay = Config.CONSOLIDATE_BATCH_MIN_DELAY
+        self._idle = Config.CONSOLIDATE_BATCH_IDLE
+        self._max_delay = Config.CONSOLIDATE_BATCH_MAX_DELAY
+        self._target_tokens = Config.CONSOLIDATE_BATCH_TARGET_TOKENS
+        self._flush_requested = False
+
+        # 票据状态：_submitted 为最近发放的票据，_completed 为已处理（或已丢弃）的最大票据
+        self._ticket_cond = threading.Condition()
+        self._submitted = 0
+        self._completed = 0
+        self._in_flight: int | None = None     # 正在处理的批次中的最大票据
+        self._discarded_upto = 0               # cancel_pending 丢弃到的最大票据
+
+        # 取消纪元：cancel_pending 时递增；写入前在 _apply_lock 内校验，旧纪元的结果一律丢弃
+        self._epoch = 0
+        self._apply_lock = threading.RLock()
+        self._scheduler = get_scheduler()
+
+        # 持久化日志（未启用时为 None）：认领上次进程未完成的批次，按原顺序重新入队
+        self._journal = get_durable_queue()
+        self._user_key = getattr(manager, "user_id", None) or ""
+        if self._journal is not None:
+            for batch_id, messages in self._journal.claim_pending(self._user_key):
+                self._enqueue(messages, [batch_id])
 
     def _get_llm(self) -> Callable[[list[dict], float], str]:
-        """懒加载 LLM 调用函数，避免 local 模式在启动时阻塞主线程。"""
+        """懒加载 LLM 调用函数（进程共享，启动预热时可能已构建），避免 local 模式在启动时阻塞主线程。"""
         if self._llm is None:
-            self._llm = build_consolidate_llm()
+            self._llm = get_consolidate_llm()
         return self._llm
 
-    def submit(self, messages: list[dict]) -> None:
-        """提交一批对话消息做后台整理，立即返回。"""
-        if messages:
-            self._queue.put(list(messages))
-
-    # ── 工作线程 ────────────────────────────────────────────────────
-
-    def _worker(self) -> None:
-        while True:
+    def submit(self, messages: list[dict]) -> int | None:
+        """
+        提交一批对话消息做后台整理，返回整理票据（messages 为空时返回 None）。
+        队列满载时按 CONSOLIDATE_QUEUE_POLICY 处理，只有 block 策略会让调用方等待。
+        """
+        if not messages:
+            return None
+        messages = list(messages)
+        metrics.incr("consolidate.submits")
+        batch_ids = [self._journal.append(self._user_key, messages)] if self._journal else []
+        return self._enqueue(messages, batch_ids)
+
+    def _enqueue(self, messages: list[dict], batch_ids: list[str]) -> int:
+        dropped: list[str] = []
+        with self._ticket_cond:
+            full = self._queue_max > 0 and len(self._pending) >= self._queue_max
+            if full and self._policy == "block":
+                metrics.incr("consolidate.queue.blocked")
+                full = not self._ticket_cond.wait_for(
+                    lambda: len(self._pending) < self._queue_max,
+                    Config.CONSOLIDATE_QUEUE_BLOCK_TIMEOUT,
+                )
+            if full and self._policy == "drop_oldest":
+                dropped = self._pending.popleft()[4]
+                metrics.incr("consolidate.queue.dropped")
+            self._submitted += 1
+            ticket = self._submitted
+            self._pending.append((ticket, self._epoch, messages, time.monotonic(), batch_ids))
+            if full and self._policy != "drop_oldest":   # coalesce，或 block 等待超时
+                self._coalesce_locked()
+        if dropped:
+            self._journal.complete(dropped)
+        self._scheduler.schedule(self)
+        return ticket
+
+    def _coalesce_locked(self) -> None:
+        """把积压的提交合并为一条（调用方持有 _ticket_cond）：消息去重，超过上限时保留最新的。"""
+        merged: list[dict] = []
+        batch_ids: list[str] = []
+        seen: set[tuple] = set()
+        for _, _, messages, _, ids in self._pending:
+            batch_ids.extend(ids)
+            for m in messages:
+                key = (m.get("role", ""), m.get("content", ""))
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(m)
+        overflow = len(merged) - Config.CONSOLIDATE_COALESCE_MAX_MESSAGES
+        if overflow > 0:
+            merged = merged[overflow:]
+            metrics.incr("consolidate.queue.trimmed", overflow)
+        metrics.incr("consolidate.queue.coalesced", len(self._pending) - 1)
+        oldest_at = self._pending[0][3]
+        ticket, epoch = self._pending[-1][0], self._pending[-1][1]
+        self._pending.clear()
+        # 合并后的批次保留最早的入队时间，队龄指标反映真实积压时长
+        self._pending.append((ticket, epoch, merged, oldest_at, batch_ids))
+
+    def queue_stats(self) -> tuple[int, float | None]:
+        """(待处理提交数, 最旧提交的入队时间 monotonic)；队列为空时时间为 None。"""
+        with self._ticket_cond:
+            return len(self._pending), (self._pending[0][3] if self._pending else None)
+
+    def wait(self, ticket: int | None = None, timeout: float | None = None) -> bool:
+        """
+        阻塞直到 ticket（None 表示当前最新票据）之前提交的整理全部完成。
+        返回 True 表示已完成，False 表示超时。
+        """
+        with self._ticket_cond:
+            target = self._submitted if ticket is None else ticket
+            if self._completed >= target:
+                return True
+            expedite = bool(self._pending) and not self._flush_requested
+            if expedite:
+                self._flush_requested = True
+        if expedite:
+            self._scheduler.schedule(self)   # 结束批窗口，等待方不承担攒批延迟
+        with self._ticket_cond:
+            return self._ticket_cond.wait_for(lambda: self._completed >= target, timeout)
+
+    def pending(self) -> int:
+        """尚未处理完成的提交数（含正在处理的批次）。"""
+        with self._ticket_cond:
+            return self._submitted - self._completed
+
+    @contextmanager
+    def cancel_pending(self):
+        """
+        原子地取消全部未完成的整理（reset 使用）：
+          · 推进纪元：正在处理的批次此后的写入全部被丢弃
+          · 丢弃队列中尚未开始的提交，对应票据视为已完成
+          · with 块执行期间持有写入锁，调用方在块内清空存储，
+            整理器不会在清空过程中或清空之后写入旧数据
+        """
+        with self._apply_lock:
+            with self._ticket_cond:
+                self._epoch += 1
+                if self._journal is not None:
+                    self._journal.discard_user(self._user_key)
+                if self._pending:
+                    self._discarded_upto = max(self._discarded_upto, self._pending[-1][0])
+                    self._pending.clear()
+                self._flush_requested = False
+                if self._in_flight is None:
+                    self._completed = max(self._completed, self._discarded_upto)
+                self._ticket_cond.notify_all()
+            yield
+
+    # ── 调度入口（由 ConsolidationScheduler 的工作线程调用）──────────
+
+    def due_at(self) -> float | None:
+        """批窗口结束的时间（monotonic），调度器在此之后调用 run_once()；无积压时返回 None。"""
+        with self._ticket_cond:
+            return self._window_locked()[0] if self._pending else None
+
+    def _window_locked(self) -> tuple[float, str]:
+        """(窗口结束时间, 触发原因)，调用方持有 _ticket_cond 且队列非空。"""
+        first_at, last_at = self._pending[0][3], self._pending[-1][3]
+        if self._flush_requested:
+            return first_at, "wait"
+        if self._max_delay <= 0:
+            return first_at, "off"
+        if self._pending_tokens_locked() >= self._target_tokens > 0:
+            return first_at, "size"
+        idle_at = max(first_at + self._min_delay, last_at + self._idle)
+        max_at = first_at + self._max_delay
+        return (idle_at, "idle") if idle_at <= max_at else (max_at, "max")
+
+    def _pending_tokens_locked(self) -> int:
+        """积压消息去重后的估算 token 数（auto_extract 每轮提交整段短期记忆，重叠部分只计一次）。"""
+        seen: set[tuple] = set()
+        tokens = 0
+        for _, _, messages, _, _ in self._pending:
+            for m in messages:
+                key = (m.get("role", ""), m.get("content", ""))
+                if key not in seen:
+                    seen.add(key)
+                    tokens += _estimate_tokens(key[1])
+        return tokens
+
+    def run_once(self) -> None:
+        """取出此刻积压的全部提交合并为一批处理；取消前入队的旧纪元提交直接丢弃。"""
+        # 出队与登记 in-flight 在同一把锁内完成，保证 cancel_pending 看到的状态一致
+        with self._ticket_cond:
+            if not self._pending:
+                return
+            reason = self._window_locked()[1]
+            if reason != "off":
+                metrics.incr(f"consolidate.window.{reason}")
+            self._flush_requested = False
+            epoch = self._epoch
             batch: list[dict] = []
-            try:
-                # 最多等 3 秒收集第一条
-                first = self._queue.get(timeout=3.0)
-                batch.extend(first)
-                # 非阻塞地继续合并队列里的其余批次
-                while True:
-                    try:
-                        batch.extend(self._queue.get_nowait())
-                    except queue.Empty:
-                        break
-            except queue.Empty:
-                continue
+            batch_ids: list[str] = []
+            for _, item_epoch, messages, _, ids in self._pending:
+                batch_ids.extend(ids)
+                if item_epoch == epoch:
+                    batch.extend(messages)
+            last_ticket = self._pending[-1][0]
+            self._pending.clear()
+            self._in_flight = last_ticket
+            self._ticket_cond.notify_all()   # 唤醒 block 策略下等待空位的提交方
 
+        try:
             if batch:
-                try:
-                    self._process(batch)
-                except Exception:
-                    traceback.print_exc()
-
-    def _process(self, messages: list[dict]) -> None:
+                metrics.incr("consolidate.extract_calls")
+                self._process(batch, epoch, batch_ids)
+        except Exception:
+            if self._journal is not None:
+                self._journal.fail(batch_ids)   # 保留在日志中，下次启动重试
+            raise
+        else:
+            if self._journal is not None:
+                self._journal.complete(batch_ids)
+        finally:
+            with self._ticket_cond:
+                self._in_flight = None
+                self._completed = max(self._completed, last_ticket, self._discarded_upto)
+                self._ticket_cond.notify_all()
+
+    def _process(
+        self,
+        messages: list[dict],
+        epoch: int | None = None,
+        batch_ids: list[str] | None = None,
+    ) -> None:
+        """
+        整理一批对话；epoch 为批次所属纪元（None 表示当前纪元，consolidate_now 使用），
+        batch_ids 为持久化批次 ID（重放时据此跳过已执行的写入）。
+        """
+        if epoch is None:
+            epoch = self._epoch
         if Config.CONSOLIDATE_TYPE == "api" and not Config.CONSOLIDATE_API_KEY:
             return  # api 模式下 API Key 未配置，跳过
 
@@ -167,12 +404,22 @@ class MemoryConsolidator:
         if not extracted:
             return
 
-        # Step 2: 逐条检索 + 比对 + 写入
+        # Step 2: 逐条检索 + 比对 + 写入（单条失败不影响其余条目）
+        failed: list[Exception] = []
         for item in extracted:
+            if epoch != self._epoch:
+                return   # 已被 reset 取消，剩余条目不再检索 / 比对
             try:
-                self._process_one(item.get("type", "dynamic"), item.get("content", ""))
-            except Exception:
+                self._process_one(
+                    item.get("type", "dynamic"), item.get("content", ""), epoch, batch_ids
+                )
+            except Exception as exc:
                 traceback.print_exc()
+                failed.append(exc)
+        # 持久化批次有条目失败时整体抛出：run_once 据此调用 journal.fail 保留批次，
+        # 重放时已执行的条目由 is_applied 跳过，只重试失败的条目（至少一次）
+        if failed and batch_ids:
+            raise RuntimeError(f"{len(failed)}/{len(extracted)} 条记忆整理失败，批次保留待重试") from failed[0]
 
     # ── LLM 调用 ────────────────────────────────────────────────────
 
@@ -211,14 +458,23 @@ class MemoryConsolidator:
 
     # ── 单条记忆处理 ────────────────────────────────────────────────
 
-    def _process_one(self, mem_type: str, content: str) -> None:
+    def _process_one(
+        self, mem_type: str, content: str, epoch: int, batch_ids: list[str] | None = None
+    ) -> None:
         if not content.strip():
             return
+        # LLM 可能给出 static / dynamic 以外的类型，与写入路径一致按 dynamic 处理（冲突项、版本号都用归一后的层名）
+        mem_type = _layer(mem_type)
+        # 每条提取结果至多产生一次写入，幂等键为 (批次, 类型 + 内容)；LLM 重放时输出顺序可能变化，不用下标
+        op_key = hashlib.sha256(f"{mem_type}\n{content}".encode("utf-8")).hexdigest()[:32]
+        journal_key = (batch_ids, op_key) if batch_ids and self._journal is not None else None
+        if journal_key and self._journal.is_applied(*journal_key):
+            return   # 上次进程已执行过该写入，无需再检索 / 比对
 
         # 构建"已有相似记忆"列表文本
         existing_text = ""
         if mem_type == "static":
-            all_static = self._manager.static_memory.get_all()[:20]
+            all_static = self._manager.static_memory.list_page(limit=20, fields=("id", "fact"))["items"]
             existing_text = "\n".join(f"[id={e['id']}] {e['fact']}" for e in all_static)
         else:
             similar = self._manager.long_term_memory.retrieve(content, top_k=5)
@@ -227,39 +483,61 @@ class MemoryConsolidator:
 
         # 无相似记忆 → 直接 ADD，省去一次 LLM 调用
         if not existing_text.strip():
-            self._do_add(mem_type, content)
+            self._apply(epoch, self._do_add, mem_type, content, journal_key=journal_key)
             return
 
         op = self._compare(content, existing_text)
         operation = op.get("operation", "ADD")
 
         if operation == "ADD":
-            self._do_add(mem_type, content)
+            self._apply(epoch, self._do_add, mem_type, content, journal_key=journal_key)
         elif operation == "UPDATE":
-            self._do_update(
+            self._apply(
+                epoch,
+                self._do_update,
                 mem_type,
                 op.get("existing_id", ""),
                 op.get("merged_content", content),
+                journal_key=journal_key,
             )
         elif operation == "CONFLICT":
-            self._manager.add_conflict(
+            self._apply(
+                epoch,
+                self._manager.add_conflict,
                 ConflictItem(
                     memory_type=mem_type,
                     new_content=content,
                     old_content=op.get("existing_content", ""),
                     old_id=op.get("existing_id", ""),
                     reason=op.get("conflict_reason", op.get("reason", "")),
-                )
+                ),
+                journal_key=journal_key,
             )
 
     # ── 写入操作 ────────────────────────────────────────────────────
 
+    def _apply(
+        self, epoch: int, write: Callable, *args, journal_key: tuple | None = None
+    ) -> bool:
+        """
+        在写入锁内校验纪元后执行写入；批次已被取消时丢弃并返回 False。
+        journal_key=(batch_ids, op_key) 时写入后登记到持久化日志，重放时同一写入不再执行。
+        """
+        with self._apply_lock:
+            if epoch != self._epoch:
+                return False
+            write(*args)
+            if journal_key is not None:
+                self._journal.mark_applied(*journal_key)
+            return True
+
     def _do_add(self, mem_type: str, content: str) -> None:
         meta = {"source": "auto_extract"}
         if mem_type == "static":
             self._manager.static_memory.add(content, metadata=meta)
         else:
             self._manager.long_term_memory.add_memory(content, metadata=meta)
+        self._manager._bump_version(_layer(mem_type))
 
     def _do_update(self, mem_type: str, existing_id: str, merged_content: str) -> None:
         if not existing_id:
@@ -270,10 +548,16 @@ class MemoryConsolidator:
         else:
             self._manager.long_term_memory.delete_by_id(existing_id)
             self._manager.long_term_memory.add_memory(merged_content, metadata={"source": "auto_merge"})
+        self._manager._bump_version(_layer(mem_type))
 
 
 # ── 工具函数 ──────────────────────────────────────────────────────────
 
+def _layer(mem_type: str) -> str:
+    """把提取结果的类型映射到记忆层（与写入路径一致：非 static 一律写入动态记忆）。"""
+    return "static" if mem_type == "static" else "dynamic"
+
+
 def _strip_fence(text: str) -> str:
     """去除 LLM 输出中可能包裹的 markdown 代码块标记及 <think> 思考链标签。"""
     # 去掉 <think>...</think>（DeepSeek-R1 / Qwen3 thinking 模式）
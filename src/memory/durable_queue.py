@@ -0,0 +1,168 @@
+"""
+memory/durable_queue.py — 持久化整理队列（SQLite 日志）
+=========================================================
+CONSOLIDATE_DURABLE_PATH 非空时启用。内存中的整理队列只是工作副本，
+每次 submit 先把批次写入 SQLite（WAL 模式）再入队，重启 / 发布不再丢失待整理的对话：
+
+  · 至少一次：批次在整理完成后才从日志删除；进程在整理途中退出，下次启动会重放
+  · 幂等写入：每条写入（ADD / UPDATE / CONFLICT）执行后以 (batch_id, op_key) 记入 applied 表，
+    重放时已执行过的写入直接跳过；写入与登记之间崩溃时该条至多重复一次
+  · 恢复：MemoryConsolidator 创建时认领本用户未完成的批次重新入队；
+    api.py 启动时为所有有积压的用户创建实例，积压无需等待流量即可排空
+  · 失败：整理抛出异常（如 LLM 不可用，或其中任一条目写入失败）的批次保留在日志中，attempts 加一，下次启动重试；
+    超过 CONSOLIDATE_MAX_ATTEMPTS 次标记为 failed，不再重放
+
+同一日志文件只应由一个进程消费（进程内以 _claimed 防止同一批次被多个实例重复认领）。
+重放吞吐见 bench/durable_queue.py。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import Config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id   TEXT    NOT NULL UNIQUE,
+    user_key   TEXT    NOT NULL,
+    messages   TEXT    NOT NULL,
+    created_at REAL    NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    state      TEXT    NOT NULL DEFAULT 'pending'
+);
+CREATE INDEX IF NOT EXISTS idx_batches_pending ON batches (state, user_key, seq);
+CREATE TABLE IF NOT EXISTS applied (
+    batch_id TEXT NOT NULL,
+    op_key   TEXT NOT NULL,
+    PRIMARY KEY (batch_id, op_key)
+) WITHOUT ROWID;
+"""
+
+
+class DurableQueue:
+    """整理批次的 SQLite 日志（线程安全，单连接 + 进程内锁）。"""
+
+    def __init__(self, path: str, max_attempts: int = 5):
+        path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")   # WAL 下 NORMAL 在进程崩溃时不丢已提交事务
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._claimed: set[str] = set()
+
+    # ── 写入端 ──────────────────────────────────────────────────────
+
+    def append(self, user_key: str, messages: list[dict]) -> str:
+        """记录一个待整理批次，返回 batch_id。"""
+        batch_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO batches (batch_id, user_key, messages, created_at) VALUES (?, ?, ?, ?)",
+                (batch_id, user_key, json.dumps(messages, ensure_ascii=False), time.time()),
+            )
+            self._claimed.add(batch_id)
+        return batch_id
+
+    def complete(self, batch_ids: list[str]) -> None:
+        """批次整理完成（或按策略丢弃）：从日志删除，连同其幂等记录。"""
+        if not batch_ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM batches WHERE batch_id = ?", [(b,) for b in batch_ids])
+            self._conn.executemany("DELETE FROM applied WHERE batch_id = ?", [(b,) for b in batch_ids])
+            self._claimed.difference_update(batch_ids)
+
+    def fail(self, batch_ids: list[str]) -> None:
+        """整理失败：保留批次供下次启动重试，超过最大次数标记为 failed。"""
+        if not batch_ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE batches SET attempts = attempts + 1, "
+                "state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE state END "
+                "WHERE batch_id = ?",
+                [(self.max_attempts, b) for b in batch_ids],
+            )
+            self._claimed.difference_update(batch_ids)
+
+    def discard_user(self, user_key: str) -> None:
+        """删除该用户全部未完成批次（reset 使用）。"""
+        with self._lock, self._conn:
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT batch_id FROM batches WHERE user_key = ?", (user_key,)
+            )]
+            self._conn.executemany("DELETE FROM applied WHERE batch_id = ?", [(b,) for b in ids])
+            self._conn.execute("DELETE FROM batches WHERE user_key = ?", (user_key,))
+            self._claimed.difference_update(ids)
+
+    # ── 幂等写入 ────────────────────────────────────────────────────
+
+    def is_applied(self, batch_ids: list[str], op_key: str) -> bool:
+        marks = ",".join("?" * len(batch_ids))
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT 1 FROM applied WHERE op_key = ? AND batch_id IN ({marks}) LIMIT 1",
+                (op_key, *batch_ids),
+            ).fetchone()
+        return row is not None
+
+    def mark_applied(self, batch_ids: list[str], op_key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO applied (batch_id, op_key) VALUES (?, ?)",
+                [(b, op_key) for b in batch_ids],
+            )
+
+    # ── 恢复 ────────────────────────────────────────────────────────
+
+    def claim_pending(self, user_key: str) -> list[tuple[str, list[dict]]]:
+        """认领该用户尚未被本进程认领的未完成批次，按提交顺序返回 [(batch_id, messages)]。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT batch_id, messages FROM batches "
+                "WHERE state = 'pending' AND user_key = ? ORDER BY seq",
+                (user_key,),
+            ).fetchall()
+            claimed = [(b, json.loads(m)) for b, m in rows if b not in self._claimed]
+            self._claimed.update(b for b, _ in claimed)
+        return claimed
+
+    def pending_users(self) -> list[str]:
+        """有未完成批次的用户（按最早批次排序）。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_key FROM batches WHERE state = 'pending' "
+                "GROUP BY user_key ORDER BY MIN(seq)"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM batches GROUP BY state"
+            ).fetchall())
+        return {"pending": rows.get("pending", 0), "failed": rows.get("failed", 0)}
+
+
+_queue: DurableQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_durable_queue() -> DurableQueue | None:
+    """返回进程内共享的持久化队列；CONSOLIDATE_DURABLE_PATH 为空时返回 None（纯内存队列）。"""
+    global _queue
+    if not Config.CONSOLIDATE_DURABLE_PATH:
+        return None
+    with _queue_lock:
+        if _queue is None:
+            _queue = DurableQueue(Config.CONSOLIDATE_DURABLE_PATH, Config.CONSOLIDATE_MAX_ATTEMPTS)
+        return _queue
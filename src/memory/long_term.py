@@ -1,68 +1,197 @@
-import os
-import chromadb
+import hashlib
+import re
+import unicodedata
+
 from config import Config
-from src.utils.embedding import build_embedding
+from src.memory.tenancy import collect_in_background, get_generation_store
+from src.utils.embedding import get_embedding
+from src.utils.encode_pool import encode_bulk
+from src.utils.vector_backend import open_vector_backend
 
 
 class LongTermMemory:
-    def __init__(self, collection_name: str = "agent_memories"):
-        # 将相对路径转为绝对路径，避免 Windows 下 Streamlit 热重载时工作目录漂移
-        # 导致 ChromaDB Rust 后端触发 ERROR_ALREADY_EXISTS (os error 183)
-        db_path = os.path.abspath(Config.VECTOR_DB_PATH)
-        os.makedirs(db_path, exist_ok=True)
+    def __init__(self, collection_name: str = "agent_memories", tenant_id: str | None = None):
+        """
+        tenant_id 非空时为共享布局（MEMORY_TENANCY=shared）：多个用户共用同一 collection，
+        写入时在 metadata 中记录 user_id 与代际号 gen，所有读 / 删操作都按二者过滤。
+        """
+        self.collection_name = collection_name
+        self.tenant_id = tenant_id
 
-        # 持久化向量数据库
-        self.client = chromadb.PersistentClient(path=db_path)
+        # 根据配置选择 embedding 方案（进程内共享，模型只加载一次）
+        self.embedding_fn = get_embedding()
 
-        # 根据配置选择 embedding 方案
-        self.embedding_fn = build_embedding()
+        # 向量存储后端（VECTOR_BACKEND：chroma / numpy / auto），接口与 Chroma collection 一致
+        self.collection = open_vector_backend(collection_name, self.embedding_fn)
 
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.embedding_fn
-        )
+    @property
+    def _gen(self) -> int:
+        """当前代际号：每次读取都查代际表（一次 stat），其他实例 / 进程 reset 后立即切换到新代际。"""
+        return get_generation_store().get(f"dynamic:{self.tenant_id}") if self.tenant_id else 0
+
+    @property
+    def _where(self) -> dict | None:
+        return self._tenant_where()
 
     def get_all(self) -> list[dict]:
-        """返回集合中所有记忆，格式为 [{"id": ..., "fact": ...}, ...]"""
-        result = self.collection.get()
-        return [
-            {"id": mem_id, "fact": doc}
-            for mem_id, doc in zip(result["ids"], result["documents"])
-        ]
+        """返回集合中所有记忆，格式为 [{"id": ..., "fact": ...}, ...]（内部按页拉取）"""
+        return list(self.iter_all())
+
+    def list_page(
+        self,
+        offset: int = 0,
+        limit: int = 100,
+        fields: tuple[str, ...] = ("id", "fact"),
+    ) -> dict:
+        """
+        分页读取记忆，只取 fields 指定的字段（id / fact / metadata），从不读取向量。
+        返回 {"items": [...], "next_offset": 下一页起点，没有更多时为 None}
+        """
+        include = []
+        if "fact" in fields:
+            include.append("documents")
+        if "metadata" in fields:
+            include.append("metadatas")
+        result = self.collection.get(where=self._where, limit=limit, offset=offset, include=include)
+
+        items = []
+        for i, mem_id in enumerate(result["ids"]):
+            item = {}
+            if "id" in fields:
+                item["id"] = mem_id
+            if "fact" in fields:
+                item["fact"] = result["documents"][i]
+            if "metadata" in fields:
+                item["metadata"] = result["metadatas"][i]
+            items.append(item)
+        next_offset = offset + len(items) if len(items) == limit else None
+        return {"items": items, "next_offset": next_offset}
+
+    def iter_all(self, batch_size: int = 500, fields: tuple[str, ...] = ("id", "fact")):
+        """逐页迭代全部记忆，内存占用与 batch_size 成正比。"""
+        offset: int | None = 0
+        while offset is not None:
+            page = self.list_page(offset, batch_size, fields)
+            yield from page["items"]
+            offset = page["next_offset"]
 
     def __len__(self) -> int:
-        return self.collection.count()
+        if self._where is None:
+            return self.collection.count()
+        # collection.count() 不支持过滤：只取 id，不读文档与向量
+        return len(self.collection.get(where=self._where, include=[])["ids"])
 
-    def add_memory(self, fact: str, metadata: dict = None):
-        """将事实存入向量数据库"""
-        import uuid
-        mem_id = str(uuid.uuid4())
-        
-        self.collection.add(
-            documents=[fact],
-            metadatas=[metadata] if metadata else [{"source": "user_input"}],
-            ids=[mem_id]
-        )
+    def add_memory(self, fact: str, metadata: dict = None) -> str:
+        """将事实存入向量数据库，返回记忆 ID（内容相同的事实 ID 相同，重复写入不会产生副本）"""
+        return self.add_memories([fact], [metadata] if metadata else None)[0]
+
+    def add_memories(
+        self,
+        facts: list[str],
+        metadatas: list[dict] | None = None,
+        batch_size: int | None = None,
+    ) -> list[str]:
+        """
+        批量写入事实：每 batch_size 条做一次 embedding + 一次 upsert。
+        ID 由规范化后的内容哈希生成（见 content_id），重复导入 / 重试是幂等的，
+        无需事先查询是否已存在。返回与 facts 一一对应的 ID。
+        """
+        batch_size = batch_size or Config.MEMORY_WRITE_BATCH
+        gen = self._gen   # 同一批写入使用同一代际
+        namespace = f"{self.tenant_id}:{gen}" if self.tenant_id else ""
+        ids = [content_id(fact, namespace) for fact in facts]
+
+        # 同一批内的重复内容只写一次（upsert 不允许同批重复 ID）
+        seen: set[str] = set()
+        rows: list[tuple[str, str, dict]] = []
+        for i, (mem_id, fact) in enumerate(zip(ids, facts)):
+            if mem_id in seen:
+                continue
+            seen.add(mem_id)
+            meta = dict(metadatas[i]) if metadatas and metadatas[i] else {"source": "user_input"}
+            if self.tenant_id:
+                meta["user_id"] = self.tenant_id
+                meta["gen"] = gen
+            rows.append((mem_id, fact, meta))
+
+        # 大批量导入时整体交给多进程编码池（未启用或条数不足时为 None，逐批在进程内 embedding）
+        vectors = encode_bulk([fact for _, fact, _ in rows])
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            documents = [fact for _, fact, _ in batch]
+            self.collection.upsert(
+                ids=[mem_id for mem_id, _, _ in batch],
+                documents=documents,
+                metadatas=[meta for _, _, meta in batch],
+                embeddings=(
+                    vectors[start : start + batch_size]
+                    if vectors is not None
+                    else self.embedding_fn(documents)
+                ),
+            )
+        return ids
 
     def delete_by_id(self, mem_id: str) -> None:
-        """删除指定 ID 的动态记忆"""
-        self.collection.delete(ids=[mem_id])
+        """删除指定 ID 的动态记忆（共享布局下只能删除本用户的记录）"""
+        self.collection.delete(ids=[mem_id], where=self._where)
 
     def clear_all(self) -> None:
-        """删除集合中所有记忆（用于测试重置）"""
-        ids = self.collection.get()["ids"]
-        if ids:
-            self.collection.delete(ids=ids)
+        """
+        清空该用户的全部记忆（用于测试重置），耗时与数据量无关：
+          · 共享布局：递增代际号，旧记录立即不可见，后台按 user_id 分批删除
+          · 独立 collection：后端立即清空（Chroma 为改名 + 新建），旧数据后台删除
+        """
+        if self.tenant_id:
+            gen = get_generation_store().bump(f"dynamic:{self.tenant_id}")
+            collect_in_background(self._purge_old_generations, gen)
+            return
+        collect_in_background(self.collection.truncate())
+
+    def _tenant_where(self) -> dict | None:
+        """共享布局的过滤条件；代际 0 不加 gen 条件，兼容迁移进来、不带 gen 字段的旧记录。"""
+        if not self.tenant_id:
+            return None
+        gen = self._gen
+        if not gen:
+            return {"user_id": self.tenant_id}
+        return {"$and": [{"user_id": self.tenant_id}, {"gen": gen}]}
 
-    def retrieve(self, query: str, top_k: int = 3) -> list[dict]:
+    def _purge_old_generations(self, current_gen: int, batch_size: int = 500) -> None:
+        """后台回收：删除该用户所有代际号小于 current_gen（或缺失 gen 字段）的记录。"""
+        offset = 0
+        while True:
+            page = self.collection.get(
+                where={"user_id": self.tenant_id}, limit=batch_size, offset=offset,
+                include=["metadatas"],
+            )
+            if not page["ids"]:
+                return
+            stale = [
+                mem_id for mem_id, meta in zip(page["ids"], page["metadatas"])
+                if (meta or {}).get("gen", 0) < current_gen
+            ]
+            if stale:
+                self.collection.delete(ids=stale)
+            offset += len(page["ids"]) - len(stale)   # 删除后的记录不再占位
+
+    def embed_query(self, query: str):
+        """计算查询向量，供同一轮请求内多个检索共享（避免重复 embedding）。"""
+        return self.embedding_fn([query])[0]
+
+    def retrieve(self, query: str, top_k: int = 3, query_embedding=None) -> list[dict]:
         """
         使用语义检索最相关的记忆
         返回结果包含：事实内容、元数据、相似度得分
+        query_embedding 非空时直接使用该向量，跳过对 query 的 embedding
         """
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=min(top_k, self.collection.count() or 1)
-        )
+        # 共享布局下 count() 是全体用户的总数，不能据此截断；过滤后不足 top_k 时 Chroma 返回实际条数
+        n_results = top_k if self._where else min(top_k, self.collection.count() or 1)
+        if query_embedding is not None:
+            results = self.collection.query(
+                query_embeddings=[query_embedding], n_results=n_results, where=self._where
+            )
+        else:
+            results = self.collection.query(query_texts=[query], n_results=n_results, where=self._where)
         
         formatted_results = []
         for i in range(len(results['documents'][0])):
@@ -73,4 +202,19 @@ class LongTermMemory:
                 "distance": results['distances'][0][i],
             })
             
-        return formatted_results
\ No newline at end of file
+        return formatted_results
+
+
+def _normalize(text: str) -> str:
+    """内容规范化：NFKC（全角 / 半角统一）+ 折叠空白 + 忽略大小写。"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+
+def content_id(text: str, namespace: str = "") -> str:
+    """
+    由规范化内容生成确定性记忆 ID。
+    共享布局下 namespace 为 "{user_id}:{gen}"：不同用户的相同事实互不覆盖，
+    reset 后重新写入的事实也不会与待回收的旧代际记录同 ID。
+    """
+    digest = hashlib.sha256(f"{namespace}\x1f{_normalize(text)}".encode("utf-8")).hexdigest()
+    return digest[:32]
@@ -7,46 +7,101 @@ manager.py — Agent Memory 管理器
   · LongTermMemory   — ChromaDB 动态事实（长期·动态）
   · KnowledgeStore   — 只读知识库（RAG）
 
-后台整理线程（MemoryConsolidator）负责：
+后台整理（MemoryConsolidator，由进程级 ConsolidationScheduler 线程池调度）负责：
   FIFO 弹出 / auto_extract 提交 → LLM 提取 → 去重比对 → ADD/UPDATE/CONFLICT
-前端路径（build_messages）只做只读检索，不等待整理完成。
+前端路径（build_messages）只做只读检索，不等待整理完成；
+三层检索（静态 / 动态 / 知识库）共享同一个查询向量并发执行，
+每层独立超时，超时或出错时该层以空内容降级。
 """
 
 import json
 import os
 import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
+from config import Config
 from src.memory.short_term import ShortTermMemory
 from src.memory.long_term import LongTermMemory
 from src.memory.static_memory import StaticMemory
+from src.memory.conflict_store import get_conflict_store
 from src.memory.consolidator import MemoryConsolidator, ConflictItem
 from src.knowledge.store import KnowledgeStore
+from src.knowledge.postprocess import merge_adjacent_hits
+from src.utils.metrics import metrics
+from src.utils.rerank import get_reranker
+
+# 三层检索共用的进程级线程池（所有 AgentMemory 实例共享）
+_RETRIEVE_POOL = ThreadPoolExecutor(
+    max_workers=Config.RETRIEVE_WORKERS, thread_name_prefix="MemoryRetrieve"
+)
 
 
 class AgentMemory:
     """Agent 记忆管理器：统一管理短期、静态长期、动态长期记忆与只读知识库。"""
 
-    def __init__(self, short_term_limit: int = 10, user_id: str | None = None):
+    def __init__(
+        self,
+        short_term_limit: int = 10,
+        user_id: str | None = None,
+        knowledge_store: KnowledgeStore | None = None,
+        session_id: str | None = None,
+    ):
+        """
+        Args:
+            short_term_limit: 短期记忆窗口大小。
+            user_id:          指定时使用隔离的存储空间（多用户 / 测试场景）。
+            knowledge_store:  共享的只读知识库实例；None 时自行创建。
+                              Embedding 模型与数据库客户端本身已在进程内共享，
+                              此处允许 Streamlit 等调用方把整个知识库对象也复用起来。
+            session_id:       会话标识，只用于隔离短期记忆缓存文件（长期记忆仍按 user_id 共享）；
+                              Streamlit 每个浏览器标签页传入各自的值，互不覆盖对话上下文。
+        """
         # 若指定 user_id，使用隔离的存储空间（用于多用户/测试场景）
         _safe_id = user_id.replace("-", "_").replace(".", "_") if user_id else None
         collection_name = f"agent_memories_{_safe_id}" if _safe_id else "agent_memories"
         json_path = f"./data/static_memory_{_safe_id}.json" if _safe_id else None
         mongo_collection = f"static_memories_{_safe_id}" if _safe_id else None
+        st_cache_name = "short_term_cache" + "".join(f"_{k}" for k in (_safe_id, session_id) if k) + ".json"
+
+        # 共享布局：所有用户共用一个 collection，按 user_id 元数据 / 字段过滤。
+        # 过滤键使用 _safe_id，与独立布局的 collection 后缀一致，迁移时可互相还原
+        tenant_id = None
+        if _safe_id and Config.MEMORY_TENANCY == "shared":
+            tenant_id = _safe_id
+            collection_name = Config.SHARED_MEMORY_COLLECTION
+            mongo_collection = Config.SHARED_STATIC_COLLECTION
+        self.user_id = user_id
 
         self.short_term_memory = ShortTermMemory(limit=short_term_limit)
-        self.long_term_memory  = LongTermMemory(collection_name=collection_name)
-        self.static_memory     = StaticMemory(json_path=json_path, collection_name=mongo_collection)
-        self.knowledge_store   = KnowledgeStore()    # 只读知识库
+        self.long_term_memory  = LongTermMemory(collection_name=collection_name, tenant_id=tenant_id)
+        self.static_memory     = StaticMemory(
+            json_path=json_path, collection_name=mongo_collection, tenant_id=tenant_id
+        )
+        self.knowledge_store   = knowledge_store or KnowledgeStore()    # 只读知识库
+        self._reranker         = get_reranker()      # 可选重排阶段（未开启时为 None）
+
+        # 最近一次 build_messages 各层检索耗时（毫秒），超时层记为 None
+        self.last_retrieval_timings: dict[str, float | None] = {}
 
-        # 短期记忆持久化路径（页面刷新后自动恢复）
-        self._st_cache_path = os.path.abspath("./data/short_term_cache.json")
+        # 短期记忆持久化路径（页面刷新后自动恢复；按用户隔离）
+        self._st_cache_path = os.path.abspath(os.path.join("./data", st_cache_name))
         self._load_short_term_cache()
 
-        # 待确认冲突队列（线程安全）
-        self._pending_conflicts: list[ConflictItem] = []
-        self._conflict_lock = threading.Lock()
+        # 待确认冲突（持久化，按 cid 与用户索引，见 memory/conflict_store.py）
+        self._conflicts = get_conflict_store()
+        self._conflict_key = user_id or ""
 
-        # 后台整理线程（持有 self 引用，通过 add_conflict 回写冲突）
+        # 各记忆层的变更版本号（单调递增），UI / API 据此 O(1) 判断是否需要重新拉取
+        self._versions: dict[str, int] = {
+            "short_term": 0, "static": 0, "dynamic": 0, "conflicts": 0,
+        }
+        self._version_cond = threading.Condition()
+        # sync_external_changes 上次看到的 (存储指纹, 版本号)，用于发现其他进程的写入
+        self._synced: tuple[dict, dict] | None = None
+
+        # 后台整理队列（持有 self 引用，通过 add_conflict 回写冲突；由共享调度器执行）
         self._consolidator = MemoryConsolidator(manager=self)
 
     # ── 让 app.py 的 st.json(memory.short_term) 仍能直接访问列表 ──
@@ -71,11 +126,17 @@ class AgentMemory:
             pass  # 缓存损坏时静默忽略，从空白开始
 
     def _save_short_term_cache(self) -> None:
-        """将当前短期记忆快照写入本地 JSON。"""
+        """
+        将当前短期记忆快照写入本地 JSON。
+        先写临时文件再原子替换：多个标签页 / 线程同时写同一用户的缓存时，
+        读方只会看到某一次完整的快照，而不会读到写了一半的文件。
+        """
         try:
             os.makedirs(os.path.dirname(self._st_cache_path), exist_ok=True)
-            with open(self._st_cache_path, "w", encoding="utf-8") as f:
+            tmp_path = f"{self._st_cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
                 json.dump(self.short_term_memory.history, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self._st_cache_path)
         except Exception:
             pass
 
@@ -101,23 +162,47 @@ class AgentMemory:
         if evicted is not None:
             self._consolidator.submit([evicted])
         self._save_short_term_cache()
+        self._bump_version("short_term")
 
     def save_fact(self, fact: str) -> None:
-        """手动向动态长期记忆写入一条事实（不经过去重流程）。"""
-        self.long_term_memory.add_memory(fact)
+        """手动向动态长期记忆写入一条事实（不经过 LLM 去重流程，内容完全相同的事实只保留一条）。"""
+        self.save_facts([fact])
+
+    def save_facts(self, facts: list[str], metadata: dict | None = None) -> list[str]:
+        """
+        批量写入动态长期记忆（导入场景），按 MEMORY_WRITE_BATCH 分批 embedding + upsert。
+        ID 为内容哈希，重复导入幂等；返回与 facts 一一对应的 ID。
+        """
+        if not facts:
+            return []
+        ids = self.long_term_memory.add_memories(
+            facts, [metadata] * len(facts) if metadata else None
+        )
+        self._bump_version("dynamic")
+        return ids
 
     # ================================================================
     # 后台整理（async）
     # ================================================================
 
-    def submit_for_consolidation(self) -> None:
+    def submit_for_consolidation(self, messages: list[dict] | None = None) -> int | None:
+        """
+        将对话片段提交给后台整理器（立即返回），返回整理票据。
+        messages 为 None 时提交当前短期记忆快照（auto_extract=ON 时在每轮 assistant 回复后调用）。
+        """
+        history = list(messages if messages is not None else self.short_term_memory.history)
+        return self._consolidator.submit(history)
+
+    def wait_for_consolidation(self, ticket: int | None = None, timeout: float | None = None) -> bool:
         """
-        将当前短期记忆快照提交给后台整理器（立即返回）。
-        auto_extract=ON 时在每轮 assistant 回复后调用。
+        读己之写屏障：阻塞到 ticket（None 表示该用户当前全部提交）整理完成。
+        返回 True 表示队列已排空到该票据，False 表示超时。
         """
-        history = list(self.short_term_memory.history)
-        if history:
-            self._consolidator.submit(history)
+        return self._consolidator.wait(ticket, timeout)
+
+    def pending_consolidations(self) -> int:
+        """该用户尚未整理完成的提交数。"""
+        return self._consolidator.pending()
 
     def consolidate_now(self, messages: list[dict]) -> None:
         """同步执行记忆整理（阻塞，确保整理完成后才返回，适合 API 场景）。"""
@@ -125,45 +210,57 @@ class AgentMemory:
             self._consolidator._process(messages)
 
     def reset(self) -> None:
-        """清空该用户所有记忆状态（测试重置专用）。"""
-        self.short_term_memory.clear()
-        self.long_term_memory.clear_all()
-        self.static_memory.clear_all()
-        with self._conflict_lock:
-            self._pending_conflicts.clear()
-        # 排空后台整理队列，防止残留任务污染下一轮测试
-        q = self._consolidator._queue
-        while not q.empty():
-            try:
-                q.get_nowait()
-            except Exception:
-                break
+        """
+        清空该用户所有记忆状态（测试重置专用），耗时与历史数据量无关：
+        存储层改名 / 递增代际后立即返回，旧数据由后台回收（见 memory/tenancy.py）。
+        整个过程持有整理器的写入锁，已排队或正在处理的整理结果都不会在 reset 之后写入。
+        """
+        with self._consolidator.cancel_pending():
+            self.short_term_memory.clear()
+            self.long_term_memory.clear_all()
+            self.static_memory.clear_all()
+            self._conflicts.clear_user(self._conflict_key)
+        self._bump_version("short_term", "static", "dynamic", "conflicts")
 
     # ================================================================
     # 冲突管理（Conflict Management）
     # ================================================================
 
-    def add_conflict(self, conflict: ConflictItem) -> None:
-        """由后台整理器调用，将冲突加入待确认队列。（线程安全）"""
-        with self._conflict_lock:
-            self._pending_conflicts.append(conflict)
+    def add_conflict(self, conflict: ConflictItem) -> ConflictItem:
+        """
+        由后台整理器调用，将冲突加入待确认队列。（线程安全）
+        对同一条已有记忆（old_id）已有待确认冲突时合并为一条，返回实际存储的冲突。
+        """
+        stored = self._conflicts.add(self._conflict_key, conflict)
+        self._bump_version("conflicts")
+        return stored
 
     def peek_conflicts(self) -> list[ConflictItem]:
-        """返回当前所有待确认冲突的副本（不消耗队列）。"""
-        with self._conflict_lock:
-            return list(self._pending_conflicts)
+        """返回当前所有待确认冲突（按创建时间排序，不消耗队列）。"""
+        return self._conflicts.list_pending(self._conflict_key)
 
-    def resolve_conflict(self, conflict: ConflictItem, accepted: bool) -> None:
+    def resolve_conflict(self, conflict: ConflictItem | str, accepted: bool) -> bool:
         """
-        用户确认或拒绝一条冲突。
+        用户确认或拒绝一条冲突（传入 ConflictItem 或其 cid）。
         accepted=True  → 执行记忆更新（新内容覆盖旧内容）
         accepted=False → 丢弃新内容，保留原记忆
+        返回 False 表示该冲突不存在或已被处理（如另一标签页已确认），此时不做任何写入。
         """
-        with self._conflict_lock:
-            if conflict in self._pending_conflicts:
-                self._pending_conflicts.remove(conflict)
+        cid = conflict if isinstance(conflict, str) else conflict.cid
+        return bool(self.resolve_conflicts({cid: accepted}))
 
-        if accepted:
+    def resolve_conflicts(self, decisions: dict[str, bool]) -> list[str]:
+        """
+        批量确认 / 拒绝冲突：decisions 为 {cid: accepted}。
+        一次取出全部冲突后依次写入，各记忆层的版本号只递增一次；返回实际处理的 cid 列表。
+        """
+        taken = self._conflicts.take_many(self._conflict_key, list(decisions))
+        if not taken:
+            return []
+        changed = {"conflicts"}
+        for conflict in taken:
+            if not decisions[conflict.cid]:
+                continue
             if conflict.memory_type == "static":
                 self.static_memory.update(conflict.old_id, conflict.new_content)
             else:
@@ -172,35 +269,199 @@ class AgentMemory:
                     conflict.new_content,
                     metadata={"source": "conflict_resolved"},
                 )
+            changed.add("static" if conflict.memory_type == "static" else "dynamic")
+        self._bump_version(*changed)
+        return [conflict.cid for conflict in taken]
+
+    # ================================================================
+    # 变更版本号（Change Versions）
+    # ================================================================
+
+    def _bump_version(self, *layers: str) -> None:
+        """
+        递增指定层的版本号并唤醒 wait_for_change 的等待方。
+        所有写入路径（含后台整理器与 resolve_conflict）都必须调用。
+        """
+        with self._version_cond:
+            for layer in layers:
+                self._versions[layer] += 1
+            self._version_cond.notify_all()
+
+    def versions(self) -> dict[str, int]:
+        """
+        返回各层当前版本号，O(1)：
+          {"short_term", "static", "dynamic", "conflicts", "knowledge", "total"}
+        total 为各层之和，同样单调递增，可作为单一的变更游标。
+        只反映经由本进程（本对象）的写入；其他进程的写入需由 sync_external_changes() 发现。
+        """
+        with self._version_cond:
+            result = dict(self._versions)
+        result["knowledge"] = self.knowledge_store.version
+        result["total"] = sum(result.values())
+        return result
+
+    def storage_fingerprint(self) -> dict:
+        """
+        各层存储的廉价指纹（每层一次计数 / 时间戳查询）：
+          {"static": (条数, 最近写入时间), "dynamic": 条数, "conflicts": 待确认条数}
+        """
+        return {
+            "static": (len(self.static_memory), self.static_memory.last_modified()),
+            "dynamic": len(self.long_term_memory),
+            "conflicts": self._conflicts.count(self._conflict_key),
+        }
+
+    def sync_external_changes(self) -> list[str]:
+        """
+        对照存储指纹发现其他进程（其他标签页 / REST API / CLI）的写入，递增对应层的版本号，
+        返回被递增的层。需要访问存储，调用方应按较慢的间隔调用（versions() 本身不访问存储）。
+        局限：动态记忆只比较条数，条数不变的替换（如冲突确认的删一写一）无法发现。
+        """
+        with self._version_cond:
+            seen_versions = dict(self._versions)
+        fingerprint = self.storage_fingerprint()
+        with self._version_cond:
+            prev, self._synced = self._synced, (fingerprint, seen_versions)
+        if prev is None:
+            return []
+        prev_fingerprint, prev_versions = prev
+        # 期间本进程已写过的层版本号已递增，缓存本就会失效，无需重复递增
+        changed = [
+            layer for layer, value in fingerprint.items()
+            if value != prev_fingerprint[layer] and seen_versions[layer] == prev_versions[layer]
+        ]
+        if changed:
+            self._bump_version(*changed)
+        return changed
+
+    def wait_for_change(self, since: int, timeout: float = 30.0) -> dict[str, int]:
+        """
+        阻塞直到 versions()["total"] > since 或超时，返回最新版本号。
+        知识库由 KnowledgeLoader 直接写入，不经过本对象，因此分段等待以兼顾其变化。
+        """
+        deadline = time.monotonic() + timeout
+        with self._version_cond:
+            while True:
+                current = self.versions()
+                remaining = deadline - time.monotonic()
+                if current["total"] > since or remaining <= 0:
+                    return current
+                self._version_cond.wait(min(remaining, 0.5))
 
     # ================================================================
     # 检索（Retrieve）
     # ================================================================
 
-    def retrieve(self, query: str, top_k: int = 3) -> list[dict]:
-        """从动态长期记忆中语义检索最相关的 top_k 条事实。"""
-        return self.long_term_memory.retrieve(query, top_k)
+    def retrieve(self, query: str, top_k: int = 3, query_embedding=None) -> list[dict]:
+        """从动态长期记忆中语义检索最相关的 top_k 条事实（开启重排时先多取候选）。"""
+        if self._reranker is None:
+            return self.long_term_memory.retrieve(query, top_k, query_embedding=query_embedding)
+        candidates = self.long_term_memory.retrieve(
+            query, top_k * Config.RERANK_CANDIDATES, query_embedding=query_embedding
+        )
+        return self._reranker.rerank(query, candidates, "fact", top_k)
+
+    def retrieve_knowledge(
+        self, query: str, top_k: int | None = None, query_embedding=None
+    ) -> list[dict]:
+        """
+        从只读知识库中检索最相关的知识片段（开启重排时先多取候选）。
+        KB_MERGE_ADJACENT 开启时，相邻块合并去重并扩展强命中的上下文。
+        """
+        if self._reranker is None:
+            hits = self.knowledge_store.retrieve(query, top_k, query_embedding=query_embedding)
+        else:
+            top_k = top_k or Config.KB_TOP_K
+            candidates = self.knowledge_store.retrieve(
+                query, top_k * Config.RERANK_CANDIDATES, query_embedding=query_embedding
+            )
+            hits = self._reranker.rerank(query, candidates, "text", top_k)
+
+        if Config.KB_MERGE_ADJACENT:
+            hits = merge_adjacent_hits(
+                hits,
+                self.knowledge_store,
+                expand_top=Config.KB_EXPAND_TOP,
+                window=Config.KB_EXPAND_WINDOW,
+                max_overlap=Config.KB_CHUNK_OVERLAP * 2,
+            )
+        return hits
 
-    def retrieve_knowledge(self, query: str, top_k: int | None = None) -> list[dict]:
-        """从只读知识库中语义检索最相关的知识片段。"""
-        return self.knowledge_store.retrieve(query, top_k)
+    def retrieve_all(self, query: str, query_embedding=None) -> dict[str, list]:
+        """
+        并发检索三层记忆，返回 {"static": [...], "dynamic": [...], "knowledge": [...]}。
+
+        · 查询向量只计算一次，由动态记忆与知识库检索共享
+        · 每层独立超时（RETRIEVE_TIMEOUT_*_MS，从扇出开始计时），超时或异常时该层返回空列表
+        · 各层耗时写入 metrics（retrieve.static / retrieve.dynamic / retrieve.knowledge），
+          超时的检索在后台完成后仍会记录耗时，便于观察 p99 由哪一层主导
+        """
+        if query_embedding is None:
+            t0 = time.perf_counter()
+            try:
+                query_embedding = self.long_term_memory.embed_query(query)
+            except Exception:
+                traceback.print_exc()   # 各层退回自行 embedding
+            metrics.observe("retrieve.embed", (time.perf_counter() - t0) * 1000)
+
+        layers = {
+            "static": (
+                self.static_memory.get_all_text,
+                Config.RETRIEVE_TIMEOUT_STATIC_MS,
+            ),
+            "dynamic": (
+                lambda: self.retrieve(query, query_embedding=query_embedding),
+                Config.RETRIEVE_TIMEOUT_DYNAMIC_MS,
+            ),
+            "knowledge": (
+                lambda: self.retrieve_knowledge(query, query_embedding=query_embedding),
+                Config.RETRIEVE_TIMEOUT_KNOWLEDGE_MS,
+            ),
+        }
+        start = time.perf_counter()
+        timings: dict[str, float | None] = {}
+        futures = {
+            layer: _RETRIEVE_POOL.submit(_timed_layer, layer, fn, timings)
+            for layer, (fn, _) in layers.items()
+        }
+
+        results: dict[str, list] = {}
+        for layer, future in futures.items():
+            remaining = layers[layer][1] / 1000 - (time.perf_counter() - start)
+            try:
+                results[layer] = future.result(timeout=max(0.0, remaining))
+            except FutureTimeout:
+                metrics.incr(f"retrieve.{layer}.timeout")
+                print(f"[AgentMemory] {layer} 检索超时（>{layers[layer][1]}ms），本轮以空内容降级")
+                results[layer] = []
+            except Exception:
+                metrics.incr(f"retrieve.{layer}.error")
+                traceback.print_exc()
+                results[layer] = []
+
+        self.last_retrieval_timings = {layer: timings.get(layer) for layer in layers}
+        return results
 
     # ================================================================
     # 合成（Synthesize）
     # ================================================================
 
-    def build_messages(self, query: str, system_prompt: str = "") -> list[dict]:
+    def build_messages(
+        self, query: str, system_prompt: str = "", query_embedding=None
+    ) -> list[dict]:
         """
         组装发给 LLM 的 messages 列表（快速路径，只做只读检索）：
           [system（静态记忆 + 相关动态记忆 + 知识库参考）]
           + [短期对话历史]
           + [当前用户提问]
+        三层检索由 retrieve_all 并发执行。
         """
         messages: list[dict] = []
 
-        static_facts       = self.static_memory.get_all_text()
-        relevant_dynamic   = self.retrieve(query)
-        relevant_knowledge = self.retrieve_knowledge(query)
+        retrieved          = self.retrieve_all(query, query_embedding=query_embedding)
+        static_facts       = retrieved["static"]
+        relevant_dynamic   = retrieved["dynamic"]
+        relevant_knowledge = retrieved["knowledge"]
 
         context_sections: list[str] = []
         if static_facts:
@@ -239,6 +500,7 @@ class AgentMemory:
         """清空短期记忆（开始新对话时调用）。"""
         self.short_term_memory.clear()
         self._clear_short_term_cache()
+        self._bump_version("short_term")
 
     def __repr__(self) -> str:
         return (
@@ -246,5 +508,16 @@ class AgentMemory:
             f"short={len(self.short_term_memory)}/{self.short_term_memory.limit}, "
             f"static={len(self.static_memory)}, "
             f"dynamic={len(self.long_term_memory)}, "
-            f"conflicts={len(self._pending_conflicts)})"
+            f"conflicts={self._conflicts.count(self._conflict_key)})"
         )
+
+
+def _timed_layer(layer: str, fn, timings: dict) -> list:
+    """在检索线程池中执行单层检索并记录耗时。"""
+    t0 = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        elapsed = (time.perf_counter() - t0) * 1000
+        timings[layer] = elapsed
+        metrics.observe(f"retrieve.{layer}", elapsed)
@@ -0,0 +1,157 @@
+"""
+memory/scheduler.py — 进程级整理调度器
+========================================
+所有用户的 MemoryConsolidator 共用一个固定大小的工作线程池（CONSOLIDATE_WORKERS），
+取代“每个 AgentMemory 一个常驻线程、每 3 秒轮询一次队列”的模型：
+
+  · 公平：有待处理提交的整理器按轮转（round-robin）顺序排队，每次调度只处理该用户一批，
+    处理完仍有积压则重新排到队尾，单个高频用户不会饿死其他用户
+  · 顺序：同一整理器任一时刻最多被一个工作线程处理，同一用户的整理严格按提交顺序进行
+  · 空闲零开销：工作线程阻塞在条件变量上，无任务时不唤醒；线程在首次调度时才启动
+  · 批窗口：被调度对象通过 due_at() 给出最早可处理时间（见 consolidator.py 的自适应批窗口），
+    未到期的整理器放入定时堆，工作线程按最近到期时间阻塞等待，到期后才进入就绪队列
+  · LLM 全局限流在 utils/llm.py（CONSOLIDATE_LLM_CONCURRENCY / CONSOLIDATE_LLM_RPM），
+    同步整理（consolidate_now）同样受限
+
+被调度对象只需实现 due_at()、run_once() 与 queue_stats()（MemoryConsolidator）。
+"""
+
+import heapq
+import itertools
+import threading
+import traceback
+import time
+from collections import deque
+
+from config import Config
+from src.utils.metrics import metrics
+
+
+class ConsolidationScheduler:
+    """固定工作线程池 + 按用户轮转的就绪队列。"""
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._ready: deque = deque()      # 等待调度的整理器（轮转顺序）
+        self._queued: set = set()         # 已在 _ready 中的整理器，避免重复排队
+        self._running: set = set()        # 正在被某个工作线程处理的整理器
+        self._timers: list = []           # 定时堆 [(到期时间, 序号, 整理器)]，可能含已过时条目
+        self._due: dict = {}              # 整理器 → 当前有效的到期时间（与 _timers 中的条目对应）
+        self._seq = itertools.count()
+        self._threads: list[threading.Thread] = []
+
+    def schedule(self, job) -> None:
+        """
+        通知调度器 job 的待处理提交有变化（新提交 / 请求立即整理）：按 job.due_at() 重新安排。
+        正在处理或已排队时无需重复安排，处理结束后会重新计算。
+        """
+        with self._cond:
+            if not self._threads:
+                self._start()
+            self._admit_locked(job)
+
+    def _admit_locked(self, job) -> None:
+        """按到期时间把 job 放入就绪队列或定时堆（调用方持有 _cond）。"""
+        if job in self._running or job in self._queued:
+            return
+        due = job.due_at()
+        if due is None:
+            self._due.pop(job, None)
+        elif due <= time.monotonic():
+            self._due.pop(job, None)
+            self._ready.append(job)
+            self._queued.add(job)
+            self._cond.notify()
+        elif self._due.get(job) != due:
+            # 到期时间变化（防抖推迟或达到批大小提前）：旧条目留在堆中，弹出时按 _due 识别为过时
+            self._due[job] = due
+            heapq.heappush(self._timers, (due, next(self._seq), job))
+            self._cond.notify()   # 让等待中的工作线程按新的最近到期时间重新计时
+
+    def _promote_due_locked(self) -> float | None:
+        """把已到期的整理器移入就绪队列，返回距下一个到期时间的秒数（无定时任务时为 None）。"""
+        now = time.monotonic()
+        while self._timers:
+            due, _, job = self._timers[0]
+            if self._due.get(job) != due:
+                heapq.heappop(self._timers)   # 过时条目
+                continue
+            if due > now:
+                return due - now
+            heapq.heappop(self._timers)
+            del self._due[job]
+            self._admit_locked(job)           # 重新询问 due_at()，窗口期间被 wait() 提前等情况都已反映
+        return None
+
+    def stats(self) -> dict:
+        """
+        工作线程数 / 批窗口中、排队与处理中的用户数，全部用户待处理提交的总数（queue_depth）
+        与其中最旧一条的等待秒数（oldest_age_s，无积压时为 0），
+        以及累计每次提交平均触发的提取调用数（extract_per_submit，批窗口的合并效果）。
+        """
+        with self._cond:
+            ready, running, waiting = len(self._ready), len(self._running), len(self._due)
+            jobs = list(self._ready) + list(self._running) + list(self._due)
+        depth, oldest = 0, None
+        for job in jobs:   # 有积压的整理器必然在批窗口中、排队或处理中
+            n, enqueued_at = job.queue_stats()
+            depth += n
+            if enqueued_at is not None and (oldest is None or enqueued_at < oldest):
+                oldest = enqueued_at
+        submits = metrics.counter("consolidate.submits")
+        extracts = metrics.counter("consolidate.extract_calls")
+        return {
+            "workers": self.workers,
+            "batching": waiting,
+            "ready": ready,
+            "running": running,
+            "queue_depth": depth,
+            "oldest_age_s": round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            "extract_per_submit": round(extracts / submits, 3) if submits else 0.0,
+        }
+
+    def _start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, daemon=True, name=f"ConsolidationWorker-{i}"
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    timeout = self._promote_due_locked()
+                    if self._ready:
+                        break
+                    self._cond.wait(timeout)
+                job = self._ready.popleft()
+                self._queued.discard(job)
+                self._running.add(job)
+
+            t0 = time.perf_counter()
+            try:
+                job.run_once()
+            except Exception:
+                traceback.print_exc()
+            metrics.observe("consolidate.batch", (time.perf_counter() - t0) * 1000)
+
+            with self._cond:
+                self._running.discard(job)
+                # 处理期间又有新提交：按其批窗口重新安排，已到期则排到队尾，让其他用户先轮到
+                self._admit_locked(job)
+
+
+_scheduler: ConsolidationScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ConsolidationScheduler:
+    """返回进程内共享的整理调度器（首次调用时创建，工作线程在首次调度时启动）。"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ConsolidationScheduler(Config.CONSOLIDATE_WORKERS)
+        return _scheduler
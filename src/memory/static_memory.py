@@ -5,6 +5,10 @@ memory/static_memory.py — 静态长期记忆
 
 主后端：MongoDB（pymongo）
 备用后端：本地 JSON 文件（MongoDB 不可用时自动降级，数据持久化）
+
+tenant_id 非空时为共享布局：所有用户写入同一 MongoDB 集合，每条文档带 user_id / gen 字段，
+查询均按 user_id 与当前代际过滤（(user_id, gen, _id) 复合索引，分页排序同样走索引）。
+JSON 降级后端始终按用户分文件。
 """
 
 import json
@@ -13,6 +17,8 @@ import uuid
 from datetime import datetime
 
 from config import Config
+from src.memory.tenancy import collect_in_background, get_generation_store, trash_name
+from src.utils.clients import get_mongo_client
 
 
 class StaticMemory:
@@ -23,10 +29,16 @@ class StaticMemory:
     在 build_messages 时全量注入到 System Prompt 的"用户固定信息"区块。
     """
 
-    def __init__(self, json_path: str | None = None, collection_name: str | None = None):
+    def __init__(
+        self,
+        json_path: str | None = None,
+        collection_name: str | None = None,
+        tenant_id: str | None = None,
+    ):
         self._backend: str = "json"
         self._collection = None
         self._collection_name = collection_name or Config.MONGO_STATIC_COLLECTION
+        self._tenant_id = tenant_id
         self._json_path = os.path.abspath(json_path or "./data/static_memory.json")
         self._init_backend()
 
@@ -38,8 +50,10 @@ class StaticMemory:
         """写入一条静态事实，返回新记录的 ID。"""
         now = datetime.utcnow().isoformat()
         if self._backend == "mongodb":
+            tag = {"user_id": self._tenant_id, "gen": self._gen} if self._tenant_id else {}
             result = self._collection.insert_one(
-                {"fact": fact, "metadata": metadata or {}, "created_at": now, "updated_at": now}
+                {**tag, "fact": fact, "metadata": metadata or {},
+                 "created_at": now, "updated_at": now}
             )
             return str(result.inserted_id)
         else:
@@ -58,7 +72,7 @@ class StaticMemory:
         if self._backend == "mongodb":
             from bson import ObjectId
             self._collection.update_one(
-                {"_id": ObjectId(fact_id)},
+                {"_id": ObjectId(fact_id), **self._filter},
                 {"$set": {"fact": new_fact, "updated_at": now}},
             )
         else:
@@ -74,40 +88,91 @@ class StaticMemory:
         """删除指定 ID 的事实。"""
         if self._backend == "mongodb":
             from bson import ObjectId
-            self._collection.delete_one({"_id": ObjectId(fact_id)})
+            self._collection.delete_one({"_id": ObjectId(fact_id), **self._filter})
         else:
             data = self._load()
             self._save([d for d in data if d["id"] != fact_id])
 
     def get_all(self) -> list[dict]:
         """返回所有静态记忆，格式：[{"id": ..., "fact": ..., "metadata": ...}]"""
+        return list(self.iter_all())
+
+    def list_page(
+        self,
+        offset: int = 0,
+        limit: int = 100,
+        fields: tuple[str, ...] = ("id", "fact", "metadata"),
+    ) -> dict:
+        """
+        分页读取静态记忆，只返回 fields 指定的字段（id / fact / metadata）。
+        返回 {"items": [...], "next_offset": 下一页起点，没有更多时为 None}
+        """
+        if self._backend == "mongodb":
+            cursor = (
+                self._collection.find(self._filter, _mongo_projection(fields))
+                .sort("_id", 1).skip(offset).limit(limit)
+            )
+            items = [_project(doc, fields, str(doc["_id"])) for doc in cursor]
+        else:
+            items = [_project(d, fields, d["id"]) for d in self._load()[offset : offset + limit]]
+        next_offset = offset + len(items) if len(items) == limit else None
+        return {"items": items, "next_offset": next_offset}
+
+    def iter_all(self, fields: tuple[str, ...] = ("id", "fact", "metadata")):
+        """流式迭代全部静态记忆（MongoDB 使用服务端游标分批拉取）。"""
         if self._backend == "mongodb":
-            return [
-                {"id": str(doc["_id"]), "fact": doc["fact"],
-                 "metadata": doc.get("metadata", {})}
-                for doc in self._collection.find()
-            ]
-        return [
-            {"id": d["id"], "fact": d["fact"], "metadata": d.get("metadata", {})}
-            for d in self._load()
-        ]
+            cursor = self._collection.find(self._filter, _mongo_projection(fields)).batch_size(500)
+            for doc in cursor:
+                yield _project(doc, fields, str(doc["_id"]))
+        else:
+            for d in self._load():
+                yield _project(d, fields, d["id"])
 
     def get_all_text(self) -> list[str]:
         """仅返回所有事实的文本，用于注入 System Prompt。"""
-        return [item["fact"] for item in self.get_all()]
+        return [item["fact"] for item in self.iter_all(fields=("fact",))]
 
     def clear_all(self) -> None:
-        """清空所有静态记忆（用于测试重置）"""
-        if self._backend == "mongodb":
-            self._collection.delete_many({})
-        else:
+        """
+        清空所有静态记忆（用于测试重置），耗时与数据量无关：
+          · 共享布局：递增代际号，旧记录立即不可见，后台删除
+          · 独立集合：改名为回收名（新写入会自动建新集合），后台 drop
+        """
+        if self._backend != "mongodb":
             self._save([])
+            return
+        if self._tenant_id:
+            gen = get_generation_store().bump(f"static:{self._tenant_id}")
+            collect_in_background(
+                self._collection.delete_many,
+                {"user_id": self._tenant_id, "gen": {"$ne": gen}},
+            )
+            return
+        from pymongo.errors import OperationFailure
+        trash = trash_name(self._collection_name)
+        try:
+            self._collection.rename(trash)
+        except OperationFailure:
+            return  # 集合尚未创建，无需清理
+        collect_in_background(self._collection.database.drop_collection, trash)
 
     def __len__(self) -> int:
         if self._backend == "mongodb":
-            return self._collection.count_documents({})
+            return self._collection.count_documents(self._filter)
         return len(self._load())
 
+    def last_modified(self) -> str:
+        """最近一次写入的时间戳（用于发现其他进程的修改；空库返回空串）。"""
+        if self._backend == "mongodb":
+            doc = self._collection.find_one(
+                self._filter, {"updated_at": 1}, sort=[("updated_at", -1)]
+            )
+            return doc.get("updated_at", "") if doc else ""
+        try:
+            return str(os.stat(self._json_path).st_mtime_ns)
+        except OSError:
+            return ""
+
     @property
     def backend(self) -> str:
         return self._backend
@@ -121,10 +186,11 @@ class StaticMemory:
 
     def _init_backend(self) -> None:
         try:
-            from pymongo import MongoClient
-            client = MongoClient(Config.MONGO_URI, serverSelectionTimeoutMS=3000)
-            client.server_info()  # 快速连通性测试
+            client = get_mongo_client()   # 进程内共享连接池，首次获取时做连通性测试
             self._collection = client[Config.MONGO_DB][self._collection_name]
+            if self._tenant_id:
+                # 幂等：索引已存在时 MongoDB 直接返回
+                self._collection.create_index([("user_id", 1), ("gen", 1), ("_id", 1)])
             self._backend = "mongodb"
         except Exception as exc:
             print(f"[StaticMemory] MongoDB 不可用，降级使用 JSON 文件：{exc}")
@@ -132,6 +198,19 @@ class StaticMemory:
             if not os.path.exists(self._json_path):
                 self._save([])
 
+    @property
+    def _gen(self) -> int:
+        """当前代际号：每次读取都查代际表（一次 stat），其他实例 / 进程 reset 后立即切换到新代际。"""
+        return get_generation_store().get(f"static:{self._tenant_id}") if self._tenant_id else 0
+
+    @property
+    def _filter(self) -> dict:
+        """共享布局的查询条件；代际 0 不加 gen 条件，兼容迁移进来、不带 gen 字段的旧记录。"""
+        if not self._tenant_id:
+            return {}
+        gen = self._gen
+        return {"user_id": self._tenant_id, "gen": gen} if gen else {"user_id": self._tenant_id}
+
     def _load(self) -> list[dict]:
         with open(self._json_path, "r", encoding="utf-8") as f:
             return json.load(f)
@@ -139,3 +218,19 @@ class StaticMemory:
     def _save(self, data: list[dict]) -> None:
         with open(self._json_path, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _mongo_projection(fields: tuple[str, ...]) -> dict:
+    projection = {name: 1 for name in ("fact", "metadata") if name in fields}
+    return projection or {"_id": 1}
+
+
+def _project(doc: dict, fields: tuple[str, ...], doc_id: str) -> dict:
+    item = {}
+    if "id" in fields:
+        item["id"] = doc_id
+    if "fact" in fields:
+        item["fact"] = doc["fact"]
+    if "metadata" in fields:
+        item["metadata"] = doc.get("metadata", {})
+    return item
@@ -0,0 +1,98 @@
+"""
+memory/tenancy.py — 用户数据代际（generation）与后台回收
+==========================================================
+AgentMemory.reset 需要 O(1) 完成，不能随历史数据量增长：
+
+  · 每用户独立布局：把旧 collection 改名为回收名并新建空 collection（改名为 O(1)），
+    旧数据交给后台线程删除
+  · 共享布局（MEMORY_TENANCY=shared）：递增该用户的代际号，读写只认当前代际，
+    旧代际记录立即不可见，由后台线程按 user_id 分批删除
+
+代际号持久化于 VECTOR_DB_PATH/tenant_generations.json（原子写入），重启后仍然有效。
+多个进程共用该文件：读取前比较文件 stat，被其他进程更新过即重新加载；
+bump 在文件锁内读-改-写，不会发出重复的代际号或覆盖其他进程的递增。
+LongTermMemory / StaticMemory 每次读写都向代际表取当前代际，其他实例的 reset 立即生效。
+"""
+
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from src.utils.filesync import file_lock, file_stamp
+
+
+class GenerationStore:
+    """按 key（如 "dynamic:{uid}"）记录代际号的小型持久化表，未记录的 key 为 0。"""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data: dict[str, int] = {}
+        self._stamp: tuple | None = None   # 已加载文件的 file_stamp，用于发现其他进程的递增
+        self._load()
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            if file_stamp(self._path) != self._stamp:
+                self._load()
+            return self._data.get(key, 0)
+
+    def bump(self, key: str) -> int:
+        """代际号 +1 并落盘，返回新代际号（跨进程互斥：在文件锁内基于磁盘上的最新版本递增）。"""
+        with file_lock(self._path + ".lock"), self._lock:
+            self._load()
+            gen = self._data.get(key, 0) + 1
+            self._data[key] = gen
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            tmp_path = f"{self._path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f)
+            os.replace(tmp_path, self._path)
+            self._stamp = file_stamp(self._path)
+            return gen
+
+    def _load(self) -> None:
+        self._data, self._stamp = {}, None
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                self._stamp = file_stamp(f.fileno())
+                self._data = {k: int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            pass
+
+
+_generations: GenerationStore | None = None
+_generations_lock = threading.Lock()
+
+# 单线程回收器：回收任务串行执行，不与前台请求争抢数据库
+_gc_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="MemoryGC")
+
+
+def get_generation_store() -> GenerationStore:
+    """返回进程内共享的代际表。"""
+    global _generations
+    with _generations_lock:
+        if _generations is None:
+            path = os.path.join(os.path.abspath(Config.VECTOR_DB_PATH), "tenant_generations.json")
+            _generations = GenerationStore(path)
+        return _generations
+
+
+def trash_name(name: str) -> str:
+    """reset 时旧 collection 的回收名。"""
+    return f"{name}__gc_{uuid.uuid4().hex[:8]}"
+
+
+def collect_in_background(fn, *args, **kwargs) -> None:
+    """把旧数据的删除交给后台回收线程；失败只打印，不影响前台。"""
+
+    def _run():
+        try:
+            fn(*args, **kwargs)
+        except Exception as exc:
+            print(f"[MemoryGC] 回收失败（{getattr(fn, '__name__', fn)}）：{exc}")
+
+    _gc_executor.submit(_run)
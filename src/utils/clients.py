@@ -0,0 +1,71 @@
+"""
+utils/clients.py — 进程级共享的数据库客户端
+=============================================
+ChromaDB PersistentClient 与 MongoClient 都是线程安全、带连接池的重量级对象，
+每个 AgentMemory / 每个浏览器标签页各建一份既浪费内存又拖慢页面加载。
+此处按路径 / URI 缓存，整个进程共用同一实例。
+
+两类客户端各用一把锁；MongoDB 的连通性测试（最长 3 秒）在锁外进行，
+失败结果缓存 Config.MONGO_RETRY_SECONDS 秒，避免 MongoDB 宕机时每个请求都卡在超时上。
+"""
+
+import os
+import threading
+import time
+
+from config import Config
+
+_chroma_lock = threading.Lock()
+_chroma_clients: dict[str, object] = {}
+_mongo_lock = threading.Lock()
+_mongo_clients: dict[str, object] = {}
+_mongo_failures: dict[str, tuple[float, Exception]] = {}   # uri -> (冷却截止时间, 上次的异常)
+
+
+def get_chroma_client(path: str | None = None):
+    """返回指定持久化目录的共享 chromadb.PersistentClient（目录不存在时自动创建）。"""
+    import chromadb
+
+    # 将相对路径转为绝对路径，避免 Windows 下 Streamlit 热重载时工作目录漂移
+    # 导致 ChromaDB Rust 后端触发 ERROR_ALREADY_EXISTS (os error 183)
+    db_path = os.path.abspath(path or Config.VECTOR_DB_PATH)
+    with _chroma_lock:
+        client = _chroma_clients.get(db_path)
+        if client is None:
+            os.makedirs(db_path, exist_ok=True)
+            client = _chroma_clients[db_path] = chromadb.PersistentClient(path=db_path)
+        return client
+
+
+def get_mongo_client(uri: str | None = None):
+    """
+    返回共享的 MongoClient；首次调用时做一次连通性测试。
+    MongoDB 不可用时抛出异常；失败在 Config.MONGO_RETRY_SECONDS 秒内直接重抛，之后再重新尝试连接。
+    """
+    from pymongo import MongoClient
+
+    uri = uri or Config.MONGO_URI
+    with _mongo_lock:
+        client = _mongo_clients.get(uri)
+        if client is not None:
+            return client
+        failure = _mongo_failures.get(uri)
+        if failure is not None and time.monotonic() < failure[0]:
+            raise failure[1]
+
+    # 连通性测试在锁外进行：不阻塞其他 URI 及已缓存客户端的获取
+    client = MongoClient(uri, serverSelectionTimeoutMS=3000)
+    try:
+        client.server_info()  # 快速连通性测试
+    except Exception as exc:
+        client.close()
+        with _mongo_lock:
+            _mongo_failures[uri] = (time.monotonic() + Config.MONGO_RETRY_SECONDS, exc)
+        raise
+
+    with _mongo_lock:
+        _mongo_failures.pop(uri, None)
+        cached = _mongo_clients.setdefault(uri, client)
+    if cached is not client:
+        client.close()   # 并发的首次调用已先建好连接
+    return cached
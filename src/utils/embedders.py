@@ -0,0 +1,101 @@
+"""
+utils/embedders.py — EmbeddingFunction 实现
+=============================================
+依赖 chromadb（基类），只由 utils/embedding.py 在首次使用时导入，
+使 `import api` / Streamlit 热重载不必加载 chromadb 与 sentence-transformers。
+"""
+
+import os
+import threading
+from typing import Callable
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+from src.utils.quantize import truncate
+
+
+class LazyEmbeddingFunction(EmbeddingFunction):
+    """
+    延迟加载的 EmbeddingFunction：构造时不加载模型，首次调用（或显式 load()）时才构建。
+    AgentMemory / KnowledgeStore 初始化因此不再等待模型加载，加载时机由首次检索或启动预热决定。
+    """
+
+    def __init__(self, factory: Callable[[], EmbeddingFunction]):
+        self._factory = factory
+        self._fn: EmbeddingFunction | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._fn is not None
+
+    def load(self) -> EmbeddingFunction:
+        """构建并返回实际的 EmbeddingFunction（线程安全，只构建一次）。"""
+        if self._fn is None:
+            with self._lock:
+                if self._fn is None:
+                    self._fn = self._factory()
+        return self._fn
+
+    def __call__(self, input):
+        return self.load()(input)
+
+
+class TruncatedEmbeddingFunction(EmbeddingFunction):
+    """
+    包装任意 EmbeddingFunction：截取前 dim 维并重新归一化（Matryoshka 截断）。
+    修改 EMBED_DIM 后已有 collection 的维度不再匹配，需要重新导入。
+    """
+
+    def __init__(self, base, dim: int):
+        self._base = base
+        self.dim = dim
+
+    def __call__(self, input):
+        return list(truncate(np.asarray(self._base(input), dtype=np.float32), self.dim))
+
+
+class OnnxEmbeddingFunction(EmbeddingFunction):
+    """
+    ONNX Runtime 推理的本地 embedding（sentence-transformers 的 onnx 后端）。
+
+    池化 / 归一化等模块与 local 模式完全相同，输出与 PyTorch 路径一致（量化后有微小误差）。
+    首次使用时导出 ONNX（可选 int8 动态量化）并保存到 cache_dir/<模型名>/，
+    之后直接加载，不再依赖 PyTorch 推理。
+    """
+
+    def __init__(self, model_name: str, cache_dir: str, quantize: str = "", threads: int = 0):
+        from sentence_transformers import SentenceTransformer
+
+        local_dir = os.path.abspath(os.path.join(cache_dir, model_name.replace("/", "__")))
+        file_name = f"onnx/model_qint8_{quantize}.onnx" if quantize else "onnx/model.onnx"
+        if not os.path.exists(os.path.join(local_dir, file_name)):
+            _export_onnx(model_name, local_dir, quantize)
+
+        model_kwargs: dict = {"file_name": file_name, "provider": "CPUExecutionProvider"}
+        if threads > 0:
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            model_kwargs["session_options"] = options
+        self.model_name = model_name
+        self._model = SentenceTransformer(
+            local_dir, device="cpu", backend="onnx", model_kwargs=model_kwargs
+        )
+
+    def __call__(self, input):
+        return list(self._model.encode(list(input), convert_to_numpy=True, show_progress_bar=False))
+
+
+def _export_onnx(model_name: str, local_dir: str, quantize: str) -> None:
+    """导出 ONNX 模型（及可选的 int8 量化版本）到 local_dir。"""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    print(f"[Embedding] 首次使用 onnx 模式，正在导出 {model_name} → {local_dir}")
+    if not os.path.exists(os.path.join(local_dir, "onnx", "model.onnx")):
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+        model.save_pretrained(local_dir)
+    if quantize:
+        model = SentenceTransformer(local_dir, device="cpu", backend="onnx")
+        export_dynamic_quantized_onnx_model(model, quantize, local_dir)
@@ -2,29 +2,72 @@
 utils/embedding.py — 统一的 Embedding 构建工厂
 ================================================
 LongTermMemory 与 KnowledgeStore 共用，保证两者使用相同的向量化策略。
+运行期通过 get_embedding() 取进程级单例，避免每个实例重复加载模型。
+EMBED_DIM > 0 时在外层包装 Matryoshka 截断（见 utils/quantize.py）。
+
+本模块不在导入时加载 chromadb / sentence-transformers：EmbeddingFunction 实现位于
+utils/embedders.py，首次调用 get_embedding() / build_embedding() 时才导入；
+get_embedding() 返回的对象在首次 embedding（或显式 load()）时才加载模型。
 """
 
-from chromadb.utils import embedding_functions
+import threading
+
 from config import Config
 
+_shared_embedding = None
+_shared_lock = threading.Lock()
+
+
+def get_embedding():
+    """
+    返回进程内共享的 EmbeddingFunction（LazyEmbeddingFunction，首次调用时构建模型）。
+    local 模式下模型只加载一次，所有 LongTermMemory / KnowledgeStore 实例共用。
+    """
+    global _shared_embedding
+    with _shared_lock:
+        if _shared_embedding is None:
+            from src.utils.embedders import LazyEmbeddingFunction
+            _shared_embedding = LazyEmbeddingFunction(_build_shared)
+        return _shared_embedding
+
+
+def _build_shared():
+    embedding = build_embedding()
+    if Config.EMBED_DIM > 0:
+        from src.utils.embedders import TruncatedEmbeddingFunction
+        embedding = TruncatedEmbeddingFunction(embedding, Config.EMBED_DIM)
+    return embedding
+
 
 def build_embedding():
-    """根据 EMBED_TYPE 构建对应的 ChromaDB EmbeddingFunction。"""
+    """根据 EMBED_TYPE 构建对应的 ChromaDB EmbeddingFunction（立即加载模型）。"""
     embed_type = Config.EMBED_TYPE.lower()
 
     if embed_type == "local":
+        from chromadb.utils import embedding_functions
         return embedding_functions.SentenceTransformerEmbeddingFunction(
             model_name=Config.EMBED_LOCAL_MODEL,
             device=Config.EMBED_LOCAL_DEVICE,
         )
 
+    elif embed_type == "onnx":
+        from src.utils.embedders import OnnxEmbeddingFunction
+        return OnnxEmbeddingFunction(
+            model_name=Config.EMBED_LOCAL_MODEL,
+            cache_dir=Config.EMBED_ONNX_DIR,
+            quantize=Config.EMBED_ONNX_QUANTIZE,
+            threads=Config.EMBED_ONNX_THREADS,
+        )
+
     elif embed_type == "ollama":
+        from chromadb.utils import embedding_functions
         return embedding_functions.OllamaEmbeddingFunction(
             model_name=Config.EMBED_OLLAMA_MODEL,
             url=Config.EMBED_OLLAMA_URL,
         )
 
     elif embed_type == "api":
+        from chromadb.utils import embedding_functions
         return embedding_functions.OpenAIEmbeddingFunction(
             api_key=Config.EMBED_API_KEY,
             api_base=Config.EMBED_API_BASE,
@@ -34,5 +77,5 @@ def build_embedding():
     else:
         raise ValueError(
             f"不支持的 EMBED_TYPE='{Config.EMBED_TYPE}'，"
-            "请在 .env 中设置为 local / ollama / api"
+            "请在 .env 中设置为 local / onnx / ollama / api"
         )
@@ -0,0 +1,130 @@
+"""
+utils/encode_pool.py — 多进程 embedding 编码池（批量导入使用）
+================================================================
+单进程 sentence-transformers 受 GIL 与 Python 开销限制，批量导入知识库 / 事实时只能吃满
+约一个核。ENCODE_WORKERS > 1 时启用进程池：
+
+  · 每个工作进程启动时用 get_embedding() 构建一次模型（与主进程配置一致，含 EMBED_DIM 截断）
+  · 文本按连续分片分给各进程，每个进程把结果直接写入主进程分配的 SharedMemory，
+    主进程只收到分片行数，向量本身不经过 pickle
+  · 每个进程的推理线程数为 ENCODE_THREADS（0 时按 CPU 核数 / 进程数均分），避免线程过度订阅
+
+只有文本条数不少于 ENCODE_POOL_MIN_BATCH 时才走进程池（小批量时进程间开销得不偿失），
+此时 encode_bulk() 返回 None，调用方回退到进程内 embedding。
+"""
+
+import atexit
+import math
+import multiprocessing as mp
+import os
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import Config
+
+
+class EncodePool:
+    """固定大小的 embedding 进程池，结果经共享内存返回。"""
+
+    def __init__(self, workers: int, threads_per_worker: int = 0):
+        self.workers = workers
+        threads = threads_per_worker or max(1, (os.cpu_count() or workers) // workers)
+        # spawn：不继承父进程已加载的模型 / 线程状态，各平台行为一致
+        ctx = mp.get_context("spawn")
+        self._pool = ctx.Pool(workers, initializer=_init_worker, initargs=(threads,))
+        self._dim: int | None = None
+        self._lock = threading.Lock()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """返回 (len(texts), dim) 的 float32 矩阵，顺序与 texts 一致。"""
+        if not texts:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        with self._lock:   # 同一时刻只跑一个批量任务，分片才能均匀占满各进程
+            if self._dim is None:
+                self._dim = self._pool.apply(_worker_dim)
+            dim = self._dim
+            shm = shared_memory.SharedMemory(create=True, size=len(texts) * dim * 4)
+            try:
+                # 分片数取进程数的 4 倍，长短文本混杂时负载更均衡
+                shard = max(1, math.ceil(len(texts) / (self.workers * 4)))
+                tasks = [
+                    (shm.name, start, dim, len(texts), texts[start : start + shard])
+                    for start in range(0, len(texts), shard)
+                ]
+                written = sum(self._pool.starmap(_encode_shard, tasks))
+                if written != len(texts):
+                    raise RuntimeError(f"编码池返回 {written} 行，期望 {len(texts)} 行")
+                return np.array(np.ndarray((len(texts), dim), dtype=np.float32, buffer=shm.buf))
+            finally:
+                shm.close()
+                shm.unlink()
+
+    def close(self) -> None:
+        self._pool.terminate()
+        self._pool.join()
+
+
+_pool: EncodePool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_encode_pool() -> EncodePool | None:
+    """返回进程内共享的编码池；ENCODE_WORKERS <= 1 时返回 None。"""
+    global _pool
+    if Config.ENCODE_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = EncodePool(Config.ENCODE_WORKERS, Config.ENCODE_THREADS)
+            atexit.register(_pool.close)
+        return _pool
+
+
+def encode_bulk(texts: list[str]) -> list[np.ndarray] | None:
+    """
+    批量导入入口：条数达到 ENCODE_POOL_MIN_BATCH 且启用了编码池时并行编码并返回向量列表；
+    否则返回 None，由调用方（向量后端）在进程内 embedding。
+    """
+    if len(texts) < Config.ENCODE_POOL_MIN_BATCH:
+        return None
+    pool = get_encode_pool()
+    if pool is None:
+        return None
+    return list(pool.encode(texts))
+
+
+# ── 工作进程 ──────────────────────────────────────────────────────────
+
+_worker_embedding = None
+
+
+def _init_worker(threads: int) -> None:
+    global _worker_embedding
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if Config.EMBED_TYPE.lower() == "onnx" and not Config.EMBED_ONNX_THREADS:
+        Config.EMBED_ONNX_THREADS = threads
+    from src.utils.embedding import get_embedding
+    _worker_embedding = get_embedding()
+    _worker_embedding.load()   # 进程启动时即加载模型，而不是等到第一个分片
+
+
+def _worker_dim() -> int:
+    return len(_worker_embedding(["dim"])[0])
+
+
+def _encode_shard(shm_name: str, start: int, dim: int, total: int, texts: list[str]) -> int:
+    vectors = np.asarray(_worker_embedding(texts), dtype=np.float32)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((total, dim), dtype=np.float32, buffer=shm.buf)
+        out[start : start + len(texts)] = vectors
+        del out   # 释放对 buffer 的引用后才能 close
+    finally:
+        shm.close()
+    return len(texts)
@@ -0,0 +1,53 @@
+"""
+utils/filesync.py — 多进程共享 JSON 索引文件的同步工具
+========================================================
+知识库的 BM25 索引与来源清单以 JSON 文件存放，Streamlit / API 进程与
+demo/load_knowledge.py 等管理脚本会同时打开同一份文件。两条规则保证各进程一致：
+
+  · 读：file_stamp() 记录已加载文件的 (inode, mtime, size)，读取前比较一次 stat，
+    文件被其他进程替换过就重新加载（一次 stat 的开销，未变化时不读文件）
+  · 写：在 file_lock() 内先重新加载磁盘上的最新版本，再修改并原子替换写回，
+    不会覆盖其他进程在此期间写入的条目
+
+file_lock 为建议锁（POSIX flock / Windows msvcrt），只约束同样使用它的写方。
+"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+
+def file_stamp(path_or_fd: str | int) -> tuple | None:
+    """文件的 (inode, mtime_ns, size)，文件不存在时返回 None；传入 fd 时对已打开的文件取值。"""
+    try:
+        st = os.fstat(path_or_fd) if isinstance(path_or_fd, int) else os.stat(path_or_fd)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+@contextmanager
+def file_lock(path: str):
+    """跨进程排他锁（锁文件不存在时创建，阻塞直到取得锁）。"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
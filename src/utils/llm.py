@@ -1,7 +1,9 @@
 """
 utils/llm.py — 统一的 Consolidator LLM 构建工厂
 ================================================
-MemoryConsolidator 使用，与 embedding.py 的设计风格一致。
+MemoryConsolidator 通过 get_consolidate_llm() 取进程级单例，与 embedding.py 的设计风格一致；
+单例外层按后端做全局限流（CONSOLIDATE_LLM_CONCURRENCY 并发上限 + CONSOLIDATE_LLM_RPM 速率上限），
+所有用户的后台整理与同步整理共用同一配额。
 
 三种模式：
   api    — 兼容 OpenAI 接口的远程服务（默认），可配置独立于 CHATMODEL 的 key/url/model
@@ -10,10 +12,18 @@ MemoryConsolidator 使用，与 embedding.py 的设计风格一致。
 
 返回统一的 callable，签名：
     llm(messages: list[dict], temperature: float = 0) -> str
+
+另提供对话模型（CHATMODEL）的共享客户端与调用封装，供 app.py / api.py 使用：
+    complete_chat(messages)  — 一次性返回完整回复
+    stream_chat(messages)    — 逐个 token 增量产出，首 token 延迟（TTFT）记入 metrics
 """
 
-from typing import Callable
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
 from config import Config
+from src.utils.metrics import metrics
 
 
 def build_consolidate_llm() -> Callable[[list[dict], float], str]:
@@ -80,3 +90,128 @@ def build_consolidate_llm() -> Callable[[list[dict], float], str]:
             f"不支持的 CONSOLIDATE_TYPE='{Config.CONSOLIDATE_TYPE}'，"
             "请在 .env 中设置为 api / ollama / local"
         )
+
+
+_consolidate_llm: Callable[[list[dict], float], str] | None = None
+_consolidate_llm_lock = threading.Lock()
+
+
+def get_consolidate_llm() -> Callable[[list[dict], float], str]:
+    """
+    返回进程内共享的整理 LLM（首次调用时构建，外层包装该后端的全局限流）。
+    所有用户的 MemoryConsolidator 共用，local 模式下模型只加载一次；启动预热可提前调用。
+    """
+    global _consolidate_llm
+    with _consolidate_llm_lock:
+        if _consolidate_llm is None:
+            llm = build_consolidate_llm()
+            limiter = get_llm_limiter(Config.CONSOLIDATE_TYPE.lower())
+
+            def call_limited(messages: list[dict], temperature: float = 0) -> str:
+                with limiter.slot():
+                    return llm(messages, temperature)
+
+            _consolidate_llm = call_limited
+        return _consolidate_llm
+
+
+class LLMLimiter:
+    """
+    单个 LLM 后端的全局限流：并发上限（信号量）+ 速率上限（按 RPM 均匀间隔放行，不允许突发）。
+    concurrency / rpm 为 0 表示不限制。等待耗时记为 consolidate.llm_wait。
+    """
+
+    def __init__(self, concurrency: int = 0, rpm: int = 0):
+        self._sem = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+        self._interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        t0 = time.perf_counter()
+        if self._interval:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_at)
+                self._next_at = start + self._interval
+            if start > now:
+                time.sleep(start - now)
+        if self._sem is not None:
+            self._sem.acquire()
+        metrics.observe("consolidate.llm_wait", (time.perf_counter() - t0) * 1000)
+        try:
+            yield
+        finally:
+            if self._sem is not None:
+                self._sem.release()
+
+
+_limiters: dict[str, LLMLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_llm_limiter(backend: str) -> LLMLimiter:
+    """返回指定后端（api / ollama / local）的进程级限流器。"""
+    with _limiters_lock:
+        limiter = _limiters.get(backend)
+        if limiter is None:
+            limiter = _limiters[backend] = LLMLimiter(
+                Config.CONSOLIDATE_LLM_CONCURRENCY, Config.CONSOLIDATE_LLM_RPM
+            )
+        return limiter
+
+
+# ── 对话模型（Chat LLM）──────────────────────────────────────────────
+
+_chat_client = None
+_chat_client_lock = threading.Lock()
+
+
+def get_chat_client():
+    """返回进程内共享的 OpenAI 兼容客户端（连接池复用，避免每轮对话重建）。"""
+    global _chat_client
+    with _chat_client_lock:
+        if _chat_client is None:
+            from openai import OpenAI
+            _chat_client = OpenAI(api_key=Config.CHAT_API_KEY, base_url=Config.CHAT_BASE_URL)
+        return _chat_client
+
+
+def complete_chat(messages: list[dict], model: str | None = None) -> str:
+    """非流式调用对话模型，返回完整回复；总耗时记为 chat.total。"""
+    t0 = time.perf_counter()
+    response = get_chat_client().chat.completions.create(
+        model=model or Config.CHATMODEL,
+        messages=messages,
+    )
+    metrics.observe("chat.total", (time.perf_counter() - t0) * 1000)
+    return response.choices[0].message.content
+
+
+def stream_chat(
+    messages: list[dict], model: str | None = None, started_at: float | None = None
+) -> Iterator[str]:
+    """
+    流式调用对话模型，逐段产出文本增量。
+    首个非空增量到达时记录 chat.ttft（首 token 延迟），结束时记录 chat.stream_total。
+    started_at 为调用方收到请求时的 time.perf_counter()，传入后两项指标都从该时刻起算，
+    包含记忆检索与 prompt 组装；None 时从发起模型调用时起算。
+    """
+    t0 = time.perf_counter() if started_at is None else started_at
+    stream = get_chat_client().chat.completions.create(
+        model=model or Config.CHATMODEL,
+        messages=messages,
+        stream=True,
+    )
+    first = True
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if first:
+                metrics.observe("chat.ttft", (time.perf_counter() - t0) * 1000)
+                first = False
+            yield delta
+    metrics.observe("chat.stream_total", (time.perf_counter() - t0) * 1000)
@@ -0,0 +1,76 @@
+"""
+utils/metrics.py — 进程内轻量指标
+==================================
+记录各阶段耗时（滚动窗口）与计数，供 api.py 的 /metrics 接口与调试面板读取。
+不依赖外部监控组件；需要接入 Prometheus 等系统时可直接导出 snapshot()。
+
+用法：
+    from src.utils.metrics import metrics
+    metrics.observe("retrieve.dynamic", 12.3)     # 毫秒
+    metrics.incr("retrieve.dynamic.timeout")
+    metrics.snapshot()
+"""
+
+import threading
+from collections import deque
+
+
+class Metrics:
+    """线程安全的耗时直方图（滚动窗口）+ 计数器。"""
+
+    def __init__(self, window: int = 2048):
+        self._window = window
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque[float]] = {}
+        self._counters: dict[str, int] = {}
+
+    def observe(self, name: str, value_ms: float) -> None:
+        """记录一次耗时（毫秒）。"""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self._window)
+            samples.append(value_ms)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def counter(self, name: str) -> int:
+        """读取单个计数（不存在时为 0）。"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        """
+        返回 {"latency_ms": {name: {count, p50, p95, p99, max}}, "counters": {...}}。
+        """
+        with self._lock:
+            samples = {name: sorted(s) for name, s in self._samples.items()}
+            counters = dict(self._counters)
+        latency = {
+            name: {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "p99": _percentile(values, 99),
+                "max": values[-1],
+            }
+            for name, values in samples.items()
+            if values
+        }
+        return {"latency_ms": latency, "counters": counters}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._counters.clear()
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[idx], 2)
+
+
+# 全局单例
+metrics = Metrics()
@@ -0,0 +1,77 @@
+"""
+utils/quantize.py — 向量压缩：Matryoshka 截断与存储量化
+==========================================================
+  · 截断（EMBED_DIM）：只保留前 EMBED_DIM 维并重新归一化。
+    仅适用于以 Matryoshka 方式训练的模型（Qwen3-Embedding、text-embedding-3 等），
+    由 get_embedding() 包装生效（utils/embedders.py 的 TruncatedEmbeddingFunction），Chroma 与 numpy 后端都存储截断后的向量
+  · 量化（VECTOR_STORAGE_DTYPE）：numpy 后端以 float16 / int8 存储向量矩阵；
+    int8 为逐行对称量化（每行一个 float32 缩放系数）
+  · 重排（VECTOR_RESCORE_FACTOR）：量化存储时先按量化向量取 top_k × 因子 个候选，
+    再用磁盘上 mmap 的 float32 副本精确打分，只有候选行会被读入内存
+
+压缩效果与召回率的权衡见 bench/embed_compress.py。
+"""
+
+import numpy as np
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+_BLOCK = 4096   # 分块打分，避免一次性把整个量化矩阵转换成 float32
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """逐行 L2 归一化，返回连续的 float32 矩阵（一维输入视为单行）。"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.ascontiguousarray(matrix / np.maximum(norms, 1e-12), dtype=np.float32)
+
+
+def truncate(matrix: np.ndarray, dim: int) -> np.ndarray:
+    """截取前 dim 维并重新归一化；dim 不小于原维度时只做归一化。"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    return normalize(matrix[:, :dim] if 0 < dim < matrix.shape[1] else matrix)
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    将归一化后的 float32 矩阵编码为存储格式，返回 (codes, scales)。
+    scales 仅 int8 时非空：每行 max|x| / 127。
+    """
+    if dtype == "float32":
+        return np.ascontiguousarray(matrix, dtype=np.float32), None
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"不支持的存储类型 '{dtype}'，可选：{' / '.join(STORAGE_DTYPES)}")
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+    """还原为 float32（int8 乘回逐行缩放系数）。"""
+    matrix = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        matrix = matrix * np.asarray(scales, dtype=np.float32)[:, None]
+    return matrix
+
+
+def scores(codes: np.ndarray, scales: np.ndarray | None, query: np.ndarray) -> np.ndarray:
+    """量化矩阵与 float32 查询向量的内积（分块转换，临时内存与 _BLOCK 成正比）。"""
+    if codes.dtype == np.float32:
+        return codes @ query
+    out = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], _BLOCK):
+        block = codes[start : start + _BLOCK].astype(np.float32) @ query
+        if scales is not None:
+            block *= scales[start : start + _BLOCK]
+        out[start : start + _BLOCK] = block
+    return out
+
+
+def bytes_per_vector(dim: int, dtype: str) -> int:
+    """单条向量的存储字节数（int8 含 4 字节缩放系数）。"""
+    return dim * np.dtype(dtype).itemsize + (4 if dtype == "int8" else 0)
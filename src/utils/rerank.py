@@ -0,0 +1,126 @@
+"""
+utils/rerank.py — 可选的本地 Cross-Encoder 重排阶段
+=====================================================
+AgentMemory.retrieve / retrieve_knowledge 使用：先按 ANN 顺序多取候选，
+再用小型 Cross-Encoder（CPU）对 (query, 候选) 逐对打分重排，截取前 top_k。
+
+  · 每次查询的未缓存候选合并为一个批次推理
+  · LRU 缓存 (query, 文本) → 得分，重复查询无需重算
+  · 硬性延迟预算：超时立即回退到 ANN 原顺序；
+    超时的推理仍在后台完成并写入缓存，下次同一查询可直接命中
+
+RERANK_ENABLED=false（默认）时 get_reranker() 返回 None，检索路径完全不变。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from config import Config
+
+
+class CrossEncoderReranker:
+    """带 LRU 缓存与延迟预算的 Cross-Encoder 重排器。"""
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str = "cpu",
+        cache_size: int = 4096,
+        budget_ms: int = 300,
+        batch_size: int = 32,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.cache_size = cache_size
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # 单线程执行器：推理串行进行，超时后仍可在后台跑完并回填缓存
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Reranker")
+
+    def rerank(self, query: str, hits: list[dict], text_key: str, top_k: int) -> list[dict]:
+        """
+        对候选重排并返回前 top_k 条（每条附带 "rerank_score"）。
+        超出延迟预算时原样返回 hits[:top_k]（ANN 顺序）。
+        """
+        if len(hits) <= 1:
+            return hits[:top_k]
+
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        texts = [h[text_key] for h in hits]
+        scores = self._cached_scores(query, texts)
+        missing = [t for t, s in zip(texts, scores) if s is None]
+
+        if missing:
+            future = self._executor.submit(self._score_and_cache, query, missing)
+            try:
+                future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except FutureTimeout:
+                return hits[:top_k]
+            except Exception as exc:
+                print(f"[Reranker] 重排失败，回退 ANN 顺序：{exc}")
+                return hits[:top_k]
+            scores = self._cached_scores(query, texts)
+            if any(s is None for s in scores):   # 缓存过小被立即淘汰时回退
+                return hits[:top_k]
+
+        ranked = sorted(zip(hits, scores), key=lambda hs: hs[1], reverse=True)
+        return [{**h, "rerank_score": s} for h, s in ranked[:top_k]]
+
+    # ── 内部方法 ────────────────────────────────────────────────────
+
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, device=self.device)
+            return self._model
+
+    def _score_and_cache(self, query: str, texts: list[str]) -> None:
+        unique = list(dict.fromkeys(texts))
+        scores = self._get_model().predict(
+            [(query, t) for t in unique],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        with self._cache_lock:
+            for text, score in zip(unique, scores):
+                self._cache[(query, text)] = float(score)
+                self._cache.move_to_end((query, text))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cached_scores(self, query: str, texts: list[str]) -> list[float | None]:
+        with self._cache_lock:
+            scores: list[float | None] = []
+            for text in texts:
+                score = self._cache.get((query, text))
+                if score is not None:
+                    self._cache.move_to_end((query, text))
+                scores.append(score)
+            return scores
+
+
+_reranker: CrossEncoderReranker | None = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker | None:
+    """返回进程内共享的重排器；RERANK_ENABLED 关闭时返回 None。"""
+    global _reranker
+    if not Config.RERANK_ENABLED:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker(
+                model_name=Config.RERANK_MODEL,
+                device=Config.RERANK_DEVICE,
+                cache_size=Config.RERANK_CACHE_SIZE,
+                budget_ms=Config.RERANK_BUDGET_MS,
+            )
+        return _reranker
@@ -0,0 +1,791 @@
+"""
+utils/vector_backend.py — 可替换的向量存储后端
+================================================
+LongTermMemory 与 KnowledgeStore 通过 VectorBackend 读写向量，不直接依赖 Chroma。
+接口刻意与 chromadb Collection 的常用子集保持一致（add / upsert / get / query /
+delete / count，返回结构相同），调用方无需区分后端。
+
+三种实现（VECTOR_BACKEND 选择）：
+  chroma — Chroma 持久化 collection（HNSW + SQLite），默认
+  numpy  — 进程内暴力检索：归一化向量存放在连续矩阵中（float32，或按 VECTOR_STORAGE_DTYPE
+           量化为 float16 / int8，可选 float32 精确重排，见 utils/quantize.py），
+           磁盘上为 .npy 文件（启动时以 mmap 只读映射，首次写入时才载入内存），
+           文档与元数据为同名 .json，写入追加到 .journal 日志、累积到一定量才合并重写；
+           top-k 用 argpartition 向量化求取
+  auto   — 先用 numpy，条数超过 VECTOR_BACKEND_THRESHOLD 时自动迁移到 Chroma
+           （复制已有向量，不重新 embedding），此后一直使用 Chroma
+
+Chroma 的 truncate 为改名 + 新建，随后替换 VECTOR_DB_PATH/truncated/{name} 标记文件，
+同一集合的其他句柄（含其他进程）据此按名称重新解析 collection。
+
+numpy 后端的 distance 为 2 - 2·cos，向量已归一化时与 Chroma 默认的 l2（平方欧氏距离）一致，
+MEMORY_DEDUP_THRESHOLD 等阈值无需随后端调整。
+两种后端的交叉点见 bench/vector_backend.py。
+"""
+
+import base64
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Callable
+
+import numpy as np
+
+from config import Config
+from src.memory.tenancy import trash_name
+from src.utils.filesync import file_lock, file_stamp
+from src.utils.quantize import STORAGE_DTYPES, dequantize, normalize, quantize, scores
+
+_DEFAULT_INCLUDE = ("documents", "metadatas")
+_COMPACT_MIN_ROWS = 1024   # numpy 后端日志累计至少这么多行才合并重写快照
+
+# 进程级 NumpyBackend 注册表：(目录, 集合名) -> 实例，见 _numpy_backend
+_numpy_lock = threading.Lock()
+_numpy_backends: dict[tuple[str, str], "NumpyBackend"] = {}
+
+
+class VectorBackend:
+    """向量存储后端接口（chromadb Collection 子集）。"""
+
+    kind: str = ""
+    name: str = ""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def add(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        """写入新记录；已存在的 ID 保持不变（与 Chroma add 一致）。"""
+        raise NotImplementedError
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        """写入或覆盖记录。embeddings 为 None 时由后端对 documents 做 embedding。"""
+        raise NotImplementedError
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_INCLUDE) -> dict:
+        """返回 {"ids", "documents", "metadatas", "embeddings"}，未 include 的字段为 None。"""
+        raise NotImplementedError
+
+    def query(
+        self, query_embeddings=None, query_texts=None, n_results=10, where=None,
+        include=(*_DEFAULT_INCLUDE, "distances"),
+    ) -> dict:
+        """返回按查询分组的 {"ids", "documents", "metadatas", "distances"}（列表的列表）。"""
+        raise NotImplementedError
+
+    def delete(self, ids=None, where=None) -> None:
+        raise NotImplementedError
+
+    def truncate(self) -> Callable[[], None]:
+        """
+        立即清空（耗时与数据量无关），返回释放旧数据的回调；
+        调用方可同步执行，也可交给后台线程。
+        """
+        raise NotImplementedError
+
+    def drop(self) -> None:
+        """永久删除整个集合（迁移工具使用）。"""
+        raise NotImplementedError
+
+
+# ── Chroma ──────────────────────────────────────────────────────────
+
+class ChromaBackend(VectorBackend):
+    """
+    Chroma collection 的薄封装。
+
+    truncate 通过改名实现，其他句柄（其他会话 / AgentMemory 实例 / 其他进程）手中的
+    Collection 对象仍指向改名后的回收集合。因此 truncate 后替换 marker_dir/{name} 标记文件，
+    每次访问前比较一次其 stat，变化即按名称重新解析 collection。
+    改名与替换标记之间（毫秒级）其他句柄的写入仍会落入回收集合。
+    """
+
+    kind = "chroma"
+
+    def __init__(self, client, name: str, embedding_fn, marker_dir: str | None = None):
+        self.name = name
+        self._client = client
+        self._embedding_fn = embedding_fn
+        self._marker = os.path.join(marker_dir, name) if marker_dir else None
+        self._resolve()
+
+    def count(self) -> int:
+        return self._current().count()
+
+    def add(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        self._current().add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        self._current().upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_INCLUDE) -> dict:
+        return self._current().get(
+            ids=ids, where=where, limit=limit, offset=offset, include=list(include)
+        )
+
+    def query(
+        self, query_embeddings=None, query_texts=None, n_results=10, where=None,
+        include=(*_DEFAULT_INCLUDE, "distances"),
+    ) -> dict:
+        return self._current().query(
+            query_embeddings=query_embeddings, query_texts=query_texts,
+            n_results=n_results, where=where, include=list(include),
+        )
+
+    def delete(self, ids=None, where=None) -> None:
+        self._current().delete(ids=ids, where=where)
+
+    def truncate(self) -> Callable[[], None]:
+        # 改名为 O(1)，旧 collection 由回调删除
+        trash = trash_name(self.name)
+        if self._marker is None:
+            self._current().modify(name=trash)
+            self._resolve()
+        else:
+            with file_lock(self._marker + ".lock"):   # 并发 truncate 互斥，避免两次改名交错
+                self._current().modify(name=trash)
+                _replace_marker(self._marker)
+                self._resolve()
+        return lambda: self._client.delete_collection(trash)
+
+    def drop(self) -> None:
+        self._client.delete_collection(self.name)
+        if self._marker is not None:
+            _replace_marker(self._marker)
+
+    def _current(self):
+        """返回当前 collection；标记文件变化（其他句柄 truncate / drop 过）时先按名称重新解析。"""
+        if self._marker is not None and file_stamp(self._marker) != self._stamp:
+            self._resolve()
+        return self._collection
+
+    def _resolve(self) -> None:
+        # 先取标记再解析：解析期间发生的 truncate 会在下次访问时再次触发重新解析
+        self._stamp = file_stamp(self._marker) if self._marker else None
+        self._collection = self._client.get_or_create_collection(
+            name=self.name, embedding_function=self._embedding_fn
+        )
+
+
+# ── NumPy ───────────────────────────────────────────────────────────
+
+class NumpyBackend(VectorBackend):
+    """
+    小规模集合的暴力检索后端（线程安全，多进程可共享同一组文件）。
+
+    磁盘上为"快照 + 追加日志"：
+      {name}.npy        向量矩阵（dtype 为 VECTOR_STORAGE_DTYPE）
+      {name}.scale.npy  int8 存储时的逐行缩放系数
+      {name}.full.npy   开启重排且量化存储时的 float32 副本（只以 mmap 访问候选行）
+      {name}.json       ID / 文档 / 元数据
+      {name}.journal    快照之后的写入，每行一个 JSON 操作（向量为 base64 编码的 float32）
+      {name}.lock       写入锁（utils/filesync.file_lock）
+    写入只向日志追加本批记录；日志累计行数超过快照条数（至少 _COMPACT_MIN_ROWS）时
+    才合并重写快照，均摊开销与批大小成正比。每次访问前比较快照与日志的 stat：
+    快照被替换则整体重载，日志增长则只回放新增部分，其他实例 / 进程的写入不会丢失。
+    同一进程内应通过 open_vector_backend 获取（进程级注册表，每个集合只载入一份）。
+    """
+
+    kind = "numpy"
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        embedding_fn,
+        dtype: str | None = None,
+        rescore_factor: int | None = None,
+    ):
+        self.name = name
+        self._embedding_fn = embedding_fn
+        self.dtype = dtype or Config.VECTOR_STORAGE_DTYPE
+        if self.dtype not in STORAGE_DTYPES:
+            raise ValueError(f"不支持的 VECTOR_STORAGE_DTYPE='{self.dtype}'，可选：{' / '.join(STORAGE_DTYPES)}")
+        factor = Config.VECTOR_RESCORE_FACTOR if rescore_factor is None else rescore_factor
+        # float32 存储本身就是精确分数，无需重排
+        self.rescore_factor = factor if self.dtype != "float32" else 0
+        self._vec_path = os.path.join(directory, f"{name}.npy")
+        self._scale_path = os.path.join(directory, f"{name}.scale.npy")
+        self._full_path = os.path.join(directory, f"{name}.full.npy")
+        self._doc_path = os.path.join(directory, f"{name}.json")
+        self._journal_path = os.path.join(directory, f"{name}.journal")
+        self._lock_path = os.path.join(directory, f"{name}.lock")
+        self._lock = threading.RLock()
+        self._ids: list[str] = []
+        self._docs: list[str] = []
+        self._metas: list[dict] = []
+        self._pos: dict[str, int] = {}
+        self._matrix: np.ndarray | None = None     # (n, dim) 存储编码，启动时为只读 memmap
+        self._scales: np.ndarray | None = None     # (n,) 仅 int8
+        self._full: np.ndarray | None = None       # (n, dim) float32，仅重排
+        self._snap_stamp: tuple | None = None      # 已载入快照（.json）的 file_stamp
+        self._journal_ino: int | None = None       # 已回放日志的 inode 与字节偏移
+        self._journal_pos = 0
+        self._journal_rows = 0                     # 快照之后日志累计的记录行数
+        if os.path.exists(self._doc_path) or os.path.exists(self._journal_path):
+            with self._lock, file_lock(self._lock_path):
+                self._load()
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self._doc_path)
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._ids)
+
+    def add(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        with self._lock:
+            self._refresh()
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in self._pos]
+        if keep:
+            self.upsert(
+                [ids[i] for i in keep],
+                [documents[i] for i in keep],
+                [metadatas[i] for i in keep] if metadatas else None,
+                [embeddings[i] for i in keep] if embeddings is not None else None,
+            )
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        if not ids:
+            return
+        vectors = normalize(embeddings) if embeddings is not None else self._embed(documents)
+        metadatas = [dict(meta or {}) for meta in (metadatas or [None] * len(ids))]
+        with self._write():
+            self._apply_upsert(ids, documents, metadatas, vectors)
+            self._append(
+                {"op": "upsert", "ids": list(ids), "documents": list(documents),
+                 "metadatas": metadatas, "vectors": _encode_vectors(vectors)},
+                len(ids),
+            )
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_INCLUDE) -> dict:
+        with self._lock:
+            self._refresh()
+            rows = self._select(ids, where)
+            start = offset or 0
+            rows = rows[start : start + limit] if limit is not None else rows[start:]
+            return self._result(rows, include)
+
+    def query(
+        self, query_embeddings=None, query_texts=None, n_results=10, where=None,
+        include=(*_DEFAULT_INCLUDE, "distances"),
+    ) -> dict:
+        queries = normalize(query_embeddings) if query_embeddings is not None else self._embed(query_texts)
+        out: dict[str, list] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            self._refresh()
+            rows = np.asarray(self._select(None, where), dtype=np.int64) if where else None
+            for q in queries:
+                top, sims = self._top_k(q, n_results, rows)
+                res = self._result(top, include)
+                out["ids"].append(res["ids"])
+                out["documents"].append(res["documents"])
+                out["metadatas"].append(res["metadatas"])
+                out["distances"].append((2.0 - 2.0 * sims).tolist() if "distances" in include else None)
+        return out
+
+    def delete(self, ids=None, where=None) -> None:
+        with self._write():
+            doomed = [self._ids[r] for r in self._select(ids, where)]
+            if doomed:
+                self._apply_delete(doomed)
+                self._append({"op": "delete", "ids": doomed}, len(doomed))
+
+    def truncate(self) -> Callable[[], None]:
+        self.drop()
+        return lambda: None
+
+    def drop(self) -> None:
+        """删除磁盘文件与内存数据（auto 后端迁移到 Chroma 后同样调用）。"""
+        with self._lock, file_lock(self._lock_path):
+            self._reset_state()
+            for path in (
+                self._vec_path, self._scale_path, self._full_path, self._doc_path, self._journal_path,
+            ):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # ── 内部方法 ────────────────────────────────────────────────────
+
+    @contextmanager
+    def _write(self):
+        """写事务：持有进程内锁与文件锁，先追上其他实例的写入；结束时按需合并快照。"""
+        with self._lock, file_lock(self._lock_path):
+            self._refresh(locked=True)
+            yield
+            # 尚无快照（新集合 / 刚清空）时立即落盘，exists 与 list_vector_collections 据 .json 判断；
+            # 日志行数超过总条数的一半（纯追加时即超过快照条数）时合并，快照按几何级数增长
+            threshold = max(_COMPACT_MIN_ROWS, len(self._ids) // 2)
+            if not os.path.exists(self._doc_path) or self._journal_rows > threshold:
+                self._compact()
+
+    def _refresh(self, locked: bool = False) -> None:
+        """
+        追上其他实例 / 进程的写入（调用方持有 self._lock；locked 表示已持有文件锁）。
+        快照被替换或日志被截断 → 整体重载（需文件锁，保证读到同一版本的各个文件）；
+        日志变长 → 只回放新增部分。
+        """
+        reload = file_stamp(self._doc_path) != self._snap_stamp
+        if not reload:
+            journal = file_stamp(self._journal_path)
+            if journal is None:
+                reload = self._journal_pos > 0
+            elif journal[0] != self._journal_ino and self._journal_ino is not None:
+                reload = True
+            elif journal[2] < self._journal_pos:
+                reload = True
+            elif journal[2] > self._journal_pos:
+                self._replay()
+                return
+        if not reload:
+            return
+        if locked:
+            self._load()
+        else:
+            with file_lock(self._lock_path):
+                self._load()
+
+    def _top_k(self, q: np.ndarray, n_results: int, rows: np.ndarray | None) -> tuple[list[int], np.ndarray]:
+        """返回 (行号列表, 相似度)，按相似度降序；rows 为 where 过滤后的候选行。"""
+        if self._matrix is None or (rows is not None and rows.size == 0):
+            return [], np.empty(0, dtype=np.float32)
+        if rows is None:
+            sims = scores(self._matrix, self._scales, q)
+        else:
+            sims = scores(self._matrix[rows], None if self._scales is None else self._scales[rows], q)
+        k = min(n_results, sims.shape[0])
+        n_cand = min(sims.shape[0], k * self.rescore_factor) if self._full is not None else k
+        cand = np.argpartition(-sims, n_cand - 1)[:n_cand]
+        cand_rows = cand if rows is None else rows[cand]
+        if self._full is not None:
+            # 精确重排：只读取候选行的 float32 副本
+            sims_cand = np.asarray(self._full[np.sort(cand_rows)], dtype=np.float32) @ q
+            order = np.argsort(cand_rows)
+            exact = np.empty_like(sims_cand)
+            exact[order] = sims_cand
+            best = np.argsort(-exact)[:k]
+            return cand_rows[best].tolist(), exact[best]
+        best = np.argsort(-sims[cand])
+        return cand_rows[best].tolist(), sims[cand][best]
+
+    def _reset_state(self) -> None:
+        self._ids, self._docs, self._metas, self._pos = [], [], [], {}
+        self._matrix = self._scales = self._full = None
+        self._snap_stamp, self._journal_ino, self._journal_pos, self._journal_rows = None, None, 0, 0
+
+    def _load(self) -> None:
+        """载入快照并回放日志（调用方持有文件锁）。"""
+        self._reset_state()
+        self._snap_stamp = file_stamp(self._doc_path)
+        reencoded = self._load_snapshot()
+        self._replay()
+        if reencoded:
+            self._compact()
+
+    def _load_snapshot(self) -> bool:
+        """载入快照文件；返回快照是否按当前存储配置重新编码过（需要重写）。"""
+        try:
+            with open(self._doc_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            matrix = np.load(self._vec_path, mmap_mode="r")
+            scales = np.load(self._scale_path, mmap_mode="r") if os.path.exists(self._scale_path) else None
+            full = np.load(self._full_path, mmap_mode="r") if os.path.exists(self._full_path) else None
+        except (OSError, ValueError):
+            return False
+        n = min(len(data["ids"]), matrix.shape[0])   # 多个文件写入之间崩溃时以较短者为准
+        self._ids = data["ids"][:n]
+        self._docs = data["documents"][:n]
+        self._metas = data["metadatas"][:n]
+        self._pos = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        if not n:
+            return False
+        stored = "int8" if matrix.dtype == np.int8 else str(matrix.dtype)
+        wants_full = bool(self.rescore_factor)
+        if stored == self.dtype and (full is not None or not wants_full) and (scales is not None or stored != "int8"):
+            self._matrix = matrix[:n]
+            self._scales = None if scales is None else scales[:n]
+            self._full = full[:n] if wants_full else None
+            return False
+        # 存储配置变化：以最精确的可用副本重新编码
+        source = full[:n] if full is not None else dequantize(matrix[:n], None if scales is None else scales[:n])
+        vectors = normalize(source)
+        self._matrix, self._scales = quantize(vectors, self.dtype)
+        self._full = vectors if wants_full else None
+        return True
+
+    def _replay(self) -> None:
+        """回放日志中 _journal_pos 之后的完整行（其他进程尚未写完的末行留待下次）。"""
+        try:
+            with open(self._journal_path, "rb") as f:
+                ino = file_stamp(f.fileno())[0]
+                f.seek(self._journal_pos)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            if entry["op"] == "upsert":
+                self._apply_upsert(
+                    entry["ids"], entry["documents"], entry["metadatas"],
+                    _decode_vectors(entry["vectors"]),
+                )
+            else:
+                self._apply_delete(entry["ids"])
+            self._journal_rows += len(entry["ids"])
+        self._journal_ino = ino
+        self._journal_pos += end
+
+    def _append(self, entry: dict, rows: int) -> None:
+        """追加一条日志（调用方持有文件锁，且已回放到日志末尾）。"""
+        os.makedirs(os.path.dirname(self._journal_path), exist_ok=True)
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self._journal_path, "ab") as f:
+            f.write(line)
+            f.flush()
+            stamp = file_stamp(f.fileno())
+        self._journal_ino, self._journal_pos = stamp[0], stamp[2]
+        self._journal_rows += rows
+
+    def _compact(self) -> None:
+        """把内存状态写成新快照并删除日志（调用方持有文件锁）。"""
+        self._save()
+        self._snap_stamp = file_stamp(self._doc_path)
+        if os.path.exists(self._journal_path):
+            os.remove(self._journal_path)
+        self._journal_ino, self._journal_pos, self._journal_rows = None, 0, 0
+
+    def _apply_upsert(self, ids, documents, metadatas, vectors: np.ndarray) -> None:
+        codes, scales = quantize(vectors, self.dtype)
+        matrix, row_scales, full = self._writable(vectors.shape[1])
+        base = matrix.shape[0]
+        appended: list[int] = []          # 新增行对应的输入下标
+        for i, (doc_id, doc, meta) in enumerate(zip(ids, documents, metadatas)):
+            row = self._pos.get(doc_id)
+            if row is None:
+                self._pos[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+                self._docs.append(doc)
+                self._metas.append(dict(meta or {}))
+                appended.append(i)
+                continue
+            self._docs[row] = doc
+            self._metas[row] = dict(meta or {})
+            if row >= base:               # 同一批内重复的新 ID
+                appended[row - base] = i
+                continue
+            matrix[row] = codes[i]
+            if row_scales is not None:
+                row_scales[row] = scales[i]
+            if full is not None:
+                full[row] = vectors[i]
+        if appended:
+            matrix = np.concatenate([matrix, codes[appended]])
+            if row_scales is not None:
+                row_scales = np.concatenate([row_scales, scales[appended]])
+            if full is not None:
+                full = np.concatenate([full, vectors[appended]])
+        self._matrix, self._scales, self._full = matrix, row_scales, full
+
+    def _apply_delete(self, ids) -> None:
+        doomed = {self._pos[doc_id] for doc_id in ids if doc_id in self._pos}
+        if not doomed:
+            return
+        keep = [i for i in range(len(self._ids)) if i not in doomed]
+        self._ids = [self._ids[i] for i in keep]
+        self._docs = [self._docs[i] for i in keep]
+        self._metas = [self._metas[i] for i in keep]
+        self._pos = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        if keep:
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+            self._scales = None if self._scales is None else np.ascontiguousarray(self._scales[keep])
+            self._full = None if self._full is None else np.ascontiguousarray(self._full[keep])
+        else:
+            self._matrix = self._scales = self._full = None
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self._doc_path), exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        for path, array in (
+            (self._vec_path, self._matrix),
+            (self._scale_path, self._scales),
+            (self._full_path, self._full),
+        ):
+            if array is None:
+                if path != self._vec_path and os.path.exists(path):
+                    os.remove(path)
+                continue
+            with open(path + suffix, "wb") as f:
+                np.save(f, array)
+            os.replace(path + suffix, path)
+        with open(self._doc_path + suffix, "w", encoding="utf-8") as f:
+            json.dump(
+                {"ids": self._ids, "documents": self._docs, "metadatas": self._metas},
+                f, ensure_ascii=False,
+            )
+        os.replace(self._doc_path + suffix, self._doc_path)
+
+    def _writable(self, dim: int) -> tuple[np.ndarray, np.ndarray | None, np.ndarray | None]:
+        """返回可写的内存副本（mmap 只读映射在首次写入时复制到内存）。"""
+        if self._matrix is None:
+            empty_codes, empty_scales = quantize(np.empty((0, dim), dtype=np.float32), self.dtype)
+            full = np.empty((0, dim), dtype=np.float32) if self.rescore_factor else None
+            return empty_codes, empty_scales, full
+        return (
+            _owned(self._matrix),
+            None if self._scales is None else _owned(self._scales),
+            None if self._full is None else _owned(self._full),
+        )
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        return normalize(self._embedding_fn(list(texts)))
+
+    def _select(self, ids, where) -> list[int]:
+        if ids is not None:
+            rows = [self._pos[i] for i in ids if i in self._pos]
+        else:
+            rows = list(range(len(self._ids)))
+        if where:
+            rows = [r for r in rows if _match(self._metas[r], where)]
+        return rows
+
+    def _result(self, rows: list[int], include) -> dict:
+        embeddings = None
+        if "embeddings" in include:
+            if self._full is not None:
+                embeddings = [np.array(self._full[r]) for r in rows]
+            else:
+                embeddings = list(dequantize(
+                    self._matrix[rows], None if self._scales is None else self._scales[rows]
+                )) if rows else []
+        return {
+            "ids": [self._ids[r] for r in rows],
+            "documents": [self._docs[r] for r in rows] if "documents" in include else None,
+            "metadatas": [self._metas[r] for r in rows] if "metadatas" in include else None,
+            "embeddings": embeddings,
+        }
+
+
+# ── auto：小集合用 numpy，超过阈值迁移到 Chroma ─────────────────────
+
+class AutoBackend(VectorBackend):
+    """
+    按集合大小自动选择后端；只会从 numpy 升级到 Chroma，清空后回到 numpy。
+    升级与清空都会替换 marker_dir/{name} 标记文件（与 ChromaBackend 共用），
+    其他句柄访问前发现标记变化即重新选择当前后端。
+    """
+
+    def __init__(
+        self, client, directory: str, name: str, embedding_fn, threshold: int,
+        marker_dir: str | None = None,
+    ):
+        self.name = name
+        self._client = client
+        self._marker_dir = marker_dir
+        self._marker = os.path.join(marker_dir, name) if marker_dir else None
+        self._embedding_fn = embedding_fn
+        self._threshold = threshold
+        self._lock = threading.RLock()
+        self._small = _numpy_backend(directory, name, embedding_fn)
+        self._active: VectorBackend = self._small
+        self._select()
+
+    @property
+    def kind(self) -> str:
+        return self._current().kind
+
+    def count(self) -> int:
+        return self._current().count()
+
+    def add(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        with self._lock:
+            self._current().add(ids, documents, metadatas, embeddings)
+            self._maybe_promote()
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        with self._lock:
+            self._current().upsert(ids, documents, metadatas, embeddings)
+            self._maybe_promote()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_INCLUDE) -> dict:
+        return self._current().get(ids=ids, where=where, limit=limit, offset=offset, include=include)
+
+    def query(
+        self, query_embeddings=None, query_texts=None, n_results=10, where=None,
+        include=(*_DEFAULT_INCLUDE, "distances"),
+    ) -> dict:
+        return self._current().query(
+            query_embeddings=query_embeddings, query_texts=query_texts,
+            n_results=n_results, where=where, include=include,
+        )
+
+    def delete(self, ids=None, where=None) -> None:
+        self._current().delete(ids=ids, where=where)
+
+    def truncate(self) -> Callable[[], None]:
+        with self._lock:
+            if self._current() is self._small:
+                return self._small.truncate()
+            # 已升级到 Chroma：改名后的旧 collection 交给回调删除，清空后回到 numpy
+            cleanup = self._active.truncate()   # 同时替换标记文件
+            self._select()
+            return cleanup
+
+    def drop(self) -> None:
+        with self._lock:
+            if self._current() is not self._small:
+                self._active.drop()
+            self._small.drop()
+            self._select()
+
+    def _current(self) -> VectorBackend:
+        """当前后端；标记文件变化（其他句柄升级 / 清空过）时重新选择。"""
+        if self._marker is not None and file_stamp(self._marker) != self._stamp:
+            with self._lock:
+                self._select()
+        return self._active
+
+    def _select(self) -> None:
+        self._stamp = file_stamp(self._marker) if self._marker else None
+        if not self._small.exists and _chroma_has_data(self._client, self.name):
+            if self._active is self._small:
+                self._active = self._chroma()   # 已有 Chroma 数据的集合
+        else:
+            self._active = self._small
+
+    def _maybe_promote(self) -> None:
+        if self._active is not self._small or self._small.count() <= self._threshold:
+            return
+        chroma = self._chroma()
+        offset = 0
+        while True:
+            page = self._small.get(
+                limit=1000, offset=offset, include=("documents", "metadatas", "embeddings")
+            )
+            if not page["ids"]:
+                break
+            chroma.upsert(page["ids"], page["documents"], page["metadatas"], page["embeddings"])
+            offset += len(page["ids"])
+        self._active = chroma
+        self._small.drop()
+        if self._marker is not None:
+            _replace_marker(self._marker)
+            self._stamp = file_stamp(self._marker)
+        print(f"[VectorBackend] {self.name} 超过 {self._threshold} 条，已迁移到 Chroma")
+
+    def _chroma(self) -> ChromaBackend:
+        return ChromaBackend(self._client, self.name, self._embedding_fn, self._marker_dir)
+
+
+# ── 工厂 ────────────────────────────────────────────────────────────
+
+def open_vector_backend(
+    name: str,
+    embedding_fn,
+    client=None,
+    kind: str | None = None,
+    db_path: str | None = None,
+) -> VectorBackend:
+    """按 VECTOR_BACKEND（或 kind）打开名为 name 的向量集合。"""
+    from src.utils.clients import get_chroma_client
+
+    kind = (kind or Config.VECTOR_BACKEND).lower()
+    db_path = os.path.abspath(db_path or Config.VECTOR_DB_PATH)
+    directory = os.path.join(db_path, "numpy")
+    marker_dir = os.path.join(db_path, "truncated")   # Chroma truncate 标记，见 ChromaBackend
+    if kind == "numpy":
+        return _numpy_backend(directory, name, embedding_fn)
+    client = client or get_chroma_client(db_path)
+    if kind == "auto":
+        return AutoBackend(
+            client, directory, name, embedding_fn, Config.VECTOR_BACKEND_THRESHOLD, marker_dir
+        )
+    return ChromaBackend(client, name, embedding_fn, marker_dir)
+
+
+def _numpy_backend(directory: str, name: str, embedding_fn) -> NumpyBackend:
+    """进程内每个 (目录, 集合名) 只保留一个 NumpyBackend，所有句柄共享同一份内存数据。"""
+    key = (os.path.abspath(directory), name)
+    with _numpy_lock:
+        backend = _numpy_backends.get(key)
+        if backend is None:
+            backend = _numpy_backends[key] = NumpyBackend(directory, name, embedding_fn)
+        return backend
+
+
+def list_vector_collections(client=None, db_path: str | None = None) -> list[str]:
+    """列出所有后端中的集合名（Chroma collection ∪ numpy 文件），不含待回收的集合。"""
+    db_path = os.path.abspath(db_path or Config.VECTOR_DB_PATH)
+    names: set[str] = set()
+    if client is not None:
+        # Chroma < 0.6 返回 Collection 对象，>= 0.6 返回名称
+        names.update(getattr(c, "name", c) for c in client.list_collections())
+    directory = os.path.join(db_path, "numpy")
+    if os.path.isdir(directory):
+        names.update(f[: -len(".json")] for f in os.listdir(directory) if f.endswith(".json"))
+    return sorted(n for n in names if "__gc_" not in n)
+
+
+def _chroma_has_data(client, name: str) -> bool:
+    try:
+        return client.get_collection(name).count() > 0
+    except Exception:
+        return False
+
+
+def _replace_marker(path: str) -> None:
+    """原子替换标记文件（新 inode），使其他句柄的 file_stamp 比较必然失配。"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+
+def _encode_vectors(vectors: np.ndarray) -> dict:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return {"shape": list(vectors.shape), "data": base64.b64encode(vectors.tobytes()).decode("ascii")}
+
+
+def _decode_vectors(encoded: dict) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded["data"]), dtype=np.float32).reshape(encoded["shape"])
+
+
+def _owned(array: np.ndarray) -> np.ndarray:
+    """mmap / 只读数组复制为可写的内存数组，普通数组原样返回。"""
+    if isinstance(array, np.memmap) or not array.flags.writeable:
+        return np.array(array)
+    return array
+
+
+_OPS = {
+    "$eq":  lambda v, a: v == a,
+    "$ne":  lambda v, a: v != a,
+    "$gt":  lambda v, a: v is not None and v > a,
+    "$gte": lambda v, a: v is not None and v >= a,
+    "$lt":  lambda v, a: v is not None and v < a,
+    "$lte": lambda v, a: v is not None and v <= a,
+    "$in":  lambda v, a: v in a,
+    "$nin": lambda v, a: v not in a,
+}
+
+
+def _match(meta: dict, where: dict) -> bool:
+    """Chroma where 语法子集：字段等值 / $eq $ne $gt $gte $lt $lte $in $nin / $and $or。"""
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_match(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(_match(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = meta.get(key)
+            if not all(_OPS[op](value, arg) for op, arg in cond.items()):
+                return False
+        elif meta.get(key) != cond:
+            return False
+    return True
@@ -0,0 +1,148 @@
+"""
+utils/warmup.py — 启动预热与就绪状态
+======================================
+首个请求若要承担模型下载 / 加载、Chroma 段加载、MongoDB 探测与整理 LLM 构建，
+很容易超时。api.py 启动后在后台线程按 WARMUP_STEPS 依次执行预热步骤：
+
+  embedding   — 加载共享 embedding 模型并做一次 dummy encode
+  collections — 打开知识库（BM25 索引 + 向量集合，非空时做一次检索）、共享布局的记忆集合，探测 MongoDB
+  llm         — 构建进程共享的整理 LLM（local 模式即加载 transformers 模型）
+  prefetch    — 预先构建最近活跃的 WARMUP_PREFETCH_USERS 个用户的 AgentMemory（RecentUsers 记录）
+
+每步单独计时，出错只记录不中断后续步骤；全部完成后 status() 为 ready（有步骤失败则为 error），
+/ready 据此返回 200 / 503，编排系统只在预热完成后导流。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+from config import Config
+
+
+class Warmup:
+    """按顺序执行预热步骤，记录每步耗时与错误。"""
+
+    def __init__(self, steps: dict[str, Callable[[], object]]):
+        self._steps = steps
+        self._results: dict[str, dict] = {name: {"state": "pending"} for name in steps}
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """在后台线程中执行；没有步骤时立即就绪。"""
+        if not self._steps:
+            self._done.set()
+            return
+        threading.Thread(target=self.run, name="Warmup", daemon=True).start()
+
+    def run(self) -> None:
+        t_all = time.perf_counter()
+        for name, step in self._steps.items():
+            with self._lock:
+                self._results[name] = {"state": "running"}
+            t0 = time.perf_counter()
+            try:
+                step()
+                result = {"state": "ok"}
+            except Exception as exc:
+                result = {"state": "error", "error": f"{type(exc).__name__}: {exc}"}
+                print(f"[Warmup] {name} 失败：{result['error']}")
+            result["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            with self._lock:
+                self._results[name] = result
+        print(f"[Warmup] 预热完成，用时 {time.perf_counter() - t_all:.1f}s")
+        self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def status(self) -> dict:
+        """{"status": warming_up | ready | error, "steps": {步骤名: {state, ms, error?}}}"""
+        with self._lock:
+            steps = {name: dict(r) for name, r in self._results.items()}
+        if not self.done:
+            status = "warming_up"
+        elif any(r["state"] == "error" for r in steps.values()):
+            status = "error"
+        else:
+            status = "ready"
+        return {"status": status, "steps": steps}
+
+
+def configured_steps() -> list[str]:
+    """WARMUP_STEPS 中的步骤名（保持顺序）；WARMUP_PREFETCH_USERS > 0 时末尾追加 prefetch。"""
+    steps = [s.strip().lower() for s in Config.WARMUP_STEPS.split(",") if s.strip()]
+    if Config.WARMUP_PREFETCH_USERS > 0 and "prefetch" not in steps:
+        steps.append("prefetch")
+    return steps
+
+
+# ── 通用预热步骤 ──────────────────────────────────────────────────────
+
+def warm_embedding() -> None:
+    """加载共享 embedding 模型并做一次 dummy encode（触发分词器与推理内核的首次初始化）。"""
+    from src.utils.embedding import get_embedding
+    embedding = get_embedding()
+    embedding.load()
+    embedding(["warmup"])
+
+
+def warm_collections(knowledge_store) -> None:
+    """打开知识库与共享记忆集合，并探测 MongoDB（不可用时 StaticMemory 会降级 JSON，不视为错误）。"""
+    if knowledge_store.count() > 0:
+        knowledge_store.retrieve_vector("warmup", top_k=1)   # 触发向量段加载
+    if Config.MEMORY_TENANCY == "shared":
+        from src.utils.embedding import get_embedding
+        from src.utils.vector_backend import open_vector_backend
+        open_vector_backend(Config.SHARED_MEMORY_COLLECTION, get_embedding()).count()
+    try:
+        from src.utils.clients import get_mongo_client
+        get_mongo_client()
+    except Exception as exc:
+        print(f"[Warmup] MongoDB 不可用，静态记忆将使用 JSON 后端：{exc}")
+
+
+def warm_llm() -> None:
+    from src.utils.llm import get_consolidate_llm
+    get_consolidate_llm()
+
+
+# ── 最近活跃用户 ──────────────────────────────────────────────────────
+
+class RecentUsers:
+    """
+    最近创建过 AgentMemory 的用户（最新在前，最多 limit 个），持久化为 JSON，供 prefetch 步骤使用。
+    只在新建用户实例时写入，不随每次请求落盘。
+    """
+
+    def __init__(self, path: str, limit: int = 100):
+        self._path = os.path.abspath(path)
+        self._limit = limit
+        self._lock = threading.Lock()
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                self._users: list[str] = json.load(f)[:limit]
+        except (OSError, ValueError):
+            self._users = []
+
+    def touch(self, user_id: str) -> None:
+        with self._lock:
+            if self._users and self._users[0] == user_id:
+                return
+            self._users = [user_id] + [u for u in self._users if u != user_id][: self._limit - 1]
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            tmp = f"{self._path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._users, f, ensure_ascii=False)
+            os.replace(tmp, self._path)
+
+    def recent(self, n: int) -> list[str]:
+        with self._lock:
+            return self._users[:n]
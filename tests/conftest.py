@@ -0,0 +1,14 @@
+"""
+tests/conftest.py — 测试公共设置
+=================================
+在导入 config 之前把持久化路径指向进程内 / 关闭状态，测试不读写 ./data；
+各用例需要真实文件时使用 tmp_path。依赖 chromadb / 模型 / LLM 的路径不在单元测试范围内。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ["CONFLICT_DB_PATH"] = ":memory:"
+os.environ["CONSOLIDATE_DURABLE_PATH"] = ""
@@ -0,0 +1,78 @@
+"""BM25Index：CJK 分词、检索排序、RRF 融合、多进程共享索引文件与批量写回。"""
+
+import json
+
+from src.knowledge.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_cjk_bigrams_without_unigram_postings():
+    tokens = tokenize("我喜欢海鲜")
+    assert {"我喜", "喜欢", "欢海", "海鲜"} == set(tokens)   # 不为每个汉字建单字倒排
+    assert tokenize("猫 和 狗") == ["猫", "和", "狗"]         # 孤立单字仍可检索
+
+
+def test_tokenize_identifiers_keep_whole_word_and_subwords():
+    tokens = tokenize("推荐 GPT-4o-mini 模型")
+    assert {"gpt-4o-mini", "gpt", "4o", "mini"} <= set(tokens)
+    assert {"推荐", "模型"} <= set(tokens)
+
+
+def test_search_ranks_keyword_match_first(tmp_path):
+    index = BM25Index(str(tmp_path / "kb.bm25.json"))
+    index.add("a", "用户对海鲜严重过敏", {"source": "a.md", "chunk_index": 0})
+    index.add("b", "用户喜欢爬山和跑步", {"source": "b.md", "chunk_index": 0})
+    index.add("c", "今天天气不错", {"source": "c.md", "chunk_index": 0})
+
+    ranked = index.search("海鲜过敏", top_k=3)
+
+    assert ranked[0][0] == "a"
+    assert all(doc_id != "c" for doc_id, _ in ranked)
+
+
+def test_rrf_prefers_documents_ranked_by_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]], k=60)
+    # b：1/62 + 1/61，a：1/61 + 1/63，只出现在一路中的 d（1/62）与 c（1/63）排在后面
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "d", "c"]
+
+
+def test_rrf_single_ranking_keeps_order():
+    assert [d for d, _ in reciprocal_rank_fusion([["x", "y", "z"]])] == ["x", "y", "z"]
+
+
+def test_other_process_writes_are_seen_and_not_overwritten(tmp_path):
+    path = str(tmp_path / "kb.bm25.json")
+    app = BM25Index(path)          # 例如 API 进程
+    loader = BM25Index(path)       # 例如 demo/load_knowledge.py
+
+    with loader.transaction():
+        loader.add("d1", "马拉松训练计划", {"source": "run.md", "chunk_index": 0})
+    assert [d for d, _ in app.search("马拉松", 5)] == ["d1"]
+    assert app.ids_at("run.md", [0]) == {0: "d1"}
+
+    with app.transaction():
+        app.add("d2", "海鲜过敏注意事项", {"source": "food.md", "chunk_index": 0})
+    with loader.transaction():     # loader 的内存副本中没有 d2，写入前须先合并
+        loader.add("d3", "爬山装备清单", {"source": "hike.md", "chunk_index": 0})
+
+    assert len(BM25Index(path)) == 3
+    assert len(app) == 3
+
+
+def test_nested_transactions_save_once_at_the_outermost(tmp_path):
+    path = str(tmp_path / "kb.bm25.json")
+    index = BM25Index(path)
+    with index.transaction():
+        for i in range(3):
+            with index.transaction():          # 如 load_directory 中每个来源一次 _add_chunks
+                index.add(f"d{i}", "马拉松训练计划", {"source": f"{i}.md", "chunk_index": 0})
+        assert len(BM25Index(path)) == 0       # 批次结束前不落盘
+
+    assert len(BM25Index(path)) == 3
+
+
+def test_index_from_old_tokenizer_loads_empty(tmp_path):
+    path = tmp_path / "kb.bm25.json"
+    path.write_text(json.dumps({"postings": {"海": {"d1": 1}}, "doc_len": {"d1": 1},
+                                "doc_terms": {"d1": ["海"]}, "doc_meta": {}}), encoding="utf-8")
+
+    assert len(BM25Index(str(path))) == 0      # KnowledgeStore 据此从 collection 重建
@@ -0,0 +1,48 @@
+"""ConflictStore：同一旧记忆的冲突去重（upsert）、按用户隔离、取出即删除。"""
+
+from src.memory.conflict_store import ConflictStore
+from src.memory.consolidator import ConflictItem
+
+
+def _conflict(new: str, old_id: str = "m1", memory_type: str = "static", reason: str = "更新") -> ConflictItem:
+    return ConflictItem(
+        memory_type=memory_type, new_content=new, old_content="住在北京", old_id=old_id, reason=reason,
+    )
+
+
+def test_same_old_id_is_upserted_into_one_conflict(tmp_path):
+    store = ConflictStore(str(tmp_path / "conflicts.db"))
+    first = store.add("u1", _conflict("住在上海"))
+
+    second = store.add("u1", _conflict("住在杭州", reason="再次搬家"))
+
+    assert second.cid == first.cid
+    pending = store.list_pending("u1")
+    assert [(c.cid, c.new_content, c.reason) for c in pending] == [(first.cid, "住在杭州", "再次搬家")]
+
+
+def test_dedupe_is_scoped_by_user_layer_and_old_id(tmp_path):
+    store = ConflictStore(str(tmp_path / "conflicts.db"))
+    store.add("u1", _conflict("甲"))
+    store.add("u2", _conflict("乙"))                            # 其他用户
+    store.add("u1", _conflict("丙", memory_type="dynamic"))     # 其他记忆层
+    store.add("u1", _conflict("丁", old_id="m2"))               # 其他旧记忆
+    store.add("u1", _conflict("戊", old_id=""))                 # 无 old_id 不参与去重
+    store.add("u1", _conflict("己", old_id=""))
+
+    assert [c.new_content for c in store.list_pending("u1")] == ["甲", "丙", "丁", "戊", "己"]
+    assert store.count("u2") == 1
+
+
+def test_take_many_removes_once_and_persists(tmp_path):
+    path = str(tmp_path / "conflicts.db")
+    store = ConflictStore(path)
+    a = store.add("u1", _conflict("甲"))
+    b = store.add("u1", _conflict("乙", old_id="m2"))
+
+    taken = store.take_many("u1", [b.cid, "missing", b.cid])
+
+    assert [c.cid for c in taken] == [b.cid]
+    assert store.take("u2", a.cid) is None                     # 不能取出其他用户的冲突
+    assert store.take_many("u1", [b.cid]) == []                # 已被取出（另一标签页已确认）
+    assert [c.cid for c in ConflictStore(path).list_pending("u1")] == [a.cid]
@@ -0,0 +1,213 @@
+"""MemoryConsolidator：写入路径与版本号、队列满载策略（LLM、存储与调度器均为桩对象）。"""
+
+import threading
+import time
+
+import pytest
+
+from config import Config
+from src.memory.consolidator import MemoryConsolidator
+from src.memory import consolidator as consolidator_module, durable_queue
+from src.memory.durable_queue import DurableQueue
+from src.memory.manager import AgentMemory
+
+
+class _Store:
+    def __init__(self):
+        self.writes = []
+
+    def add(self, content, metadata=None):
+        self.writes.append(("add", content))
+
+    def add_memory(self, content, metadata=None):
+        self.writes.append(("add", content))
+
+    def update(self, existing_id, content):
+        self.writes.append(("update", existing_id, content))
+
+    def delete_by_id(self, existing_id):
+        self.writes.append(("delete", existing_id))
+
+    def retrieve(self, query, top_k=5):
+        return []
+
+    def list_page(self, offset=0, limit=100, fields=None):
+        return {"items": [], "next_offset": None}
+
+
+def _manager() -> AgentMemory:
+    """只带版本号与两层桩存储的 AgentMemory（不创建 Chroma / MongoDB 客户端）。"""
+    manager = object.__new__(AgentMemory)
+    manager.user_id = "u1"
+    manager.static_memory = _Store()
+    manager.long_term_memory = _Store()
+    manager._versions = {"short_term": 0, "static": 0, "dynamic": 0, "conflicts": 0}
+    manager._version_cond = threading.Condition()
+    return manager
+
+
+@pytest.mark.parametrize("mem_type, layer", [("static", "static"), ("dynamic", "dynamic"),
+                                             ("preference", "dynamic"), ("", "dynamic")])
+def test_unexpected_type_is_written_to_dynamic_and_bumps_version(mem_type, layer):
+    manager = _manager()
+    consolidator = MemoryConsolidator(manager)
+
+    consolidator._process_one(mem_type, "用户喜欢爬山", consolidator._epoch)
+
+    store = manager.static_memory if layer == "static" else manager.long_term_memory
+    assert store.writes == [("add", "用户喜欢爬山")]
+    assert manager._versions[layer] == 1
+
+
+def test_update_with_unexpected_type_bumps_dynamic():
+    manager = _manager()
+    consolidator = MemoryConsolidator(manager)
+
+    consolidator._do_update("habit", "old-id", "合并后的记忆")
+
+    assert manager.long_term_memory.writes == [("delete", "old-id"), ("add", "合并后的记忆")]
+    assert manager._versions["dynamic"] == 1
+
+
+def test_unexpected_type_is_marked_applied_and_skipped_on_replay(tmp_path):
+    manager = _manager()
+    consolidator = MemoryConsolidator(manager)
+    consolidator._journal = DurableQueue(str(tmp_path / "journal.db"))
+    batch_id = consolidator._journal.append("u1", [{"role": "user", "content": "我喜欢爬山"}])
+
+    consolidator._process_one("preference", "用户喜欢爬山", consolidator._epoch, [batch_id])
+    consolidator._process_one("preference", "用户喜欢爬山", consolidator._epoch, [batch_id])
+
+    assert manager.long_term_memory.writes == [("add", "用户喜欢爬山")]
+    assert manager._versions["dynamic"] == 1
+
+
+def test_pending_journal_batches_are_requeued_on_start(tmp_path, monkeypatch):
+    journal = DurableQueue(str(tmp_path / "journal.db"))
+    batch_id = journal.append("u1", [{"role": "user", "content": "我住在杭州"}])
+    monkeypatch.setattr(durable_queue, "_queue", DurableQueue(journal.path))   # 模拟重启后的新进程
+    monkeypatch.setattr(Config, "CONSOLIDATE_DURABLE_PATH", journal.path)
+    monkeypatch.setattr(consolidator_module, "get_scheduler", _Scheduler)   # 重新入队的批次不实际整理
+
+    consolidator = MemoryConsolidator(_manager())
+
+    assert [(item[2], item[4]) for item in consolidator._pending] == [
+        ([{"role": "user", "content": "我住在杭州"}], [batch_id])
+    ]
+
+
+class _FlakyStore(_Store):
+    """第一次写入失败（模拟 Chroma / MongoDB 短暂不可用），之后正常。"""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    def add_memory(self, content, metadata=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("向量库不可用")
+        super().add_memory(content, metadata)
+
+
+def test_item_failure_keeps_batch_pending_and_replay_skips_applied(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CONSOLIDATE_TYPE", "local")
+    monkeypatch.setattr(consolidator_module, "get_scheduler", _Scheduler)
+    journal = DurableQueue(str(tmp_path / "journal.db"))
+    monkeypatch.setattr(durable_queue, "_queue", journal)
+    monkeypatch.setattr(Config, "CONSOLIDATE_DURABLE_PATH", journal.path)
+    manager = _manager()
+    manager.long_term_memory = _FlakyStore()
+    extracted = [{"type": "static", "content": "用户叫小明"}, {"type": "dynamic", "content": "用户喜欢爬山"}]
+    monkeypatch.setattr(MemoryConsolidator, "_extract", lambda self, text: extracted)
+
+    consolidator = MemoryConsolidator(manager)
+    consolidator.submit([{"role": "user", "content": "我叫小明，喜欢爬山"}])
+    with pytest.raises(RuntimeError):
+        consolidator.run_once()
+
+    assert manager.static_memory.writes == [("add", "用户叫小明")]
+    assert journal.stats() == {"pending": 1, "failed": 0}      # 批次未被删除
+
+    monkeypatch.setattr(durable_queue, "_queue", DurableQueue(journal.path))   # 模拟重启后重放
+    replay = MemoryConsolidator(manager)
+    replay.run_once()
+
+    assert manager.static_memory.writes == [("add", "用户叫小明")]   # 已执行的条目不重复写入
+    assert manager.long_term_memory.writes == [("add", "用户喜欢爬山")]
+    assert DurableQueue(journal.path).stats() == {"pending": 0, "failed": 0}
+
+
+# ── 队列满载策略 ─────────────────────────────────────────────────────
+
+class _Scheduler:
+    def schedule(self, consolidator):
+        pass
+
+
+def _queued(monkeypatch, policy: str, queue_max: int = 2, **config) -> MemoryConsolidator:
+    """按指定策略创建整理器；调度器为空操作，积压留在队列中由测试检查。"""
+    monkeypatch.setattr(Config, "CONSOLIDATE_QUEUE_POLICY", policy)
+    monkeypatch.setattr(Config, "CONSOLIDATE_QUEUE_MAX", queue_max)
+    for name, value in config.items():
+        monkeypatch.setattr(Config, name, value)
+    consolidator = MemoryConsolidator(_manager())
+    consolidator._scheduler = _Scheduler()
+    return consolidator
+
+
+def _msg(content: str) -> dict:
+    return {"role": "user", "content": content}
+
+
+def _pending_messages(consolidator: MemoryConsolidator) -> list[list[str]]:
+    return [[m["content"] for m in item[2]] for item in consolidator._pending]
+
+
+def test_coalesce_merges_backlog_dedupes_and_keeps_newest(monkeypatch):
+    consolidator = _queued(monkeypatch, "coalesce", CONSOLIDATE_COALESCE_MAX_MESSAGES=3)
+    consolidator.submit([_msg("一"), _msg("二")])
+    consolidator.submit([_msg("二"), _msg("三")])
+
+    ticket = consolidator.submit([_msg("三"), _msg("四")])
+
+    assert _pending_messages(consolidator) == [["二", "三", "四"]]
+    assert consolidator._pending[0][0] == ticket
+
+
+def test_drop_oldest_discards_first_submission(monkeypatch):
+    consolidator = _queued(monkeypatch, "drop_oldest")
+    consolidator.submit([_msg("一")])
+    consolidator.submit([_msg("二")])
+
+    consolidator.submit([_msg("三")])
+
+    assert _pending_messages(consolidator) == [["二"], ["三"]]
+
+
+def test_block_waits_for_space(monkeypatch):
+    consolidator = _queued(monkeypatch, "block", queue_max=1, CONSOLIDATE_QUEUE_BLOCK_TIMEOUT=5.0)
+    processed: list[list[str]] = []
+    consolidator._process = lambda batch, epoch, batch_ids: processed.append([m["content"] for m in batch])
+    consolidator.submit([_msg("一")])
+
+    submitter = threading.Thread(target=consolidator.submit, args=([_msg("二")],))
+    submitter.start()
+    time.sleep(0.05)
+    assert submitter.is_alive()          # 队列已满，提交方阻塞
+
+    consolidator.run_once()
+    submitter.join(timeout=2)
+
+    assert not submitter.is_alive()
+    assert processed == [["一"]]
+    assert _pending_messages(consolidator) == [["二"]]
+
+
+def test_block_falls_back_to_coalesce_after_timeout(monkeypatch):
+    consolidator = _queued(monkeypatch, "block", queue_max=1, CONSOLIDATE_QUEUE_BLOCK_TIMEOUT=0.05)
+    consolidator.submit([_msg("一")])
+
+    consolidator.submit([_msg("二")])
+
+    assert _pending_messages(consolidator) == [["一", "二"]]
@@ -0,0 +1,66 @@
+"""DurableQueue：批次重放、幂等登记、失败重试与 reset 丢弃。"""
+
+from src.memory.durable_queue import DurableQueue
+
+
+def _msgs(*contents: str) -> list[dict]:
+    return [{"role": "user", "content": c} for c in contents]
+
+
+def test_pending_batches_are_replayed_in_order_after_restart(tmp_path):
+    path = str(tmp_path / "journal.db")
+    queue = DurableQueue(path)
+    first = queue.append("u1", _msgs("一"))
+    queue.append("u2", _msgs("其他用户"))
+    second = queue.append("u1", _msgs("二"))
+    queue.complete([first])
+
+    restarted = DurableQueue(path)
+
+    assert restarted.claim_pending("u1") == [(second, _msgs("二"))]
+    assert restarted.claim_pending("u1") == []            # 同一进程不重复认领
+    assert restarted.pending_users() == ["u2", "u1"]
+
+
+def test_mark_applied_is_scoped_to_batch_and_cleared_on_complete(tmp_path):
+    queue = DurableQueue(str(tmp_path / "journal.db"))
+    a = queue.append("u1", _msgs("一"))
+    b = queue.append("u1", _msgs("二"))
+
+    queue.mark_applied([a], "add:static:用户叫小明")
+
+    assert queue.is_applied([a], "add:static:用户叫小明")
+    assert queue.is_applied([b, a], "add:static:用户叫小明")
+    assert not queue.is_applied([b], "add:static:用户叫小明")
+    assert not queue.is_applied([a], "add:dynamic:用户叫小明")
+
+    queue.complete([a])
+    assert not queue.is_applied([a], "add:static:用户叫小明")
+
+
+def test_failed_batches_retry_until_max_attempts(tmp_path):
+    path = str(tmp_path / "journal.db")
+    queue = DurableQueue(path, max_attempts=2)
+    batch = queue.append("u1", _msgs("一"))
+
+    queue.fail([batch])
+    assert DurableQueue(path).claim_pending("u1") == [(batch, _msgs("一"))]
+
+    queue.fail([batch])
+    assert DurableQueue(path).claim_pending("u1") == []
+    assert queue.stats() == {"pending": 0, "failed": 1}
+
+
+def test_discard_user_drops_batches_and_marks(tmp_path):
+    path = str(tmp_path / "journal.db")
+    queue = DurableQueue(path)
+    batch = queue.append("u1", _msgs("一"))
+    queue.mark_applied([batch], "op")
+    kept = queue.append("u2", _msgs("二"))
+
+    queue.discard_user("u1")
+
+    restarted = DurableQueue(path)
+    assert restarted.claim_pending("u1") == []
+    assert not restarted.is_applied([batch], "op")
+    assert restarted.claim_pending("u2") == [(kept, _msgs("二"))]
@@ -0,0 +1,104 @@
+"""KnowledgeLoader.load_directory / load_text：旧数据在写入前一刻才删除，embedding 失败只跳过对应来源，追加后 reload 不被误跳过（KnowledgeStore 为桩对象）。"""
+
+from contextlib import nullcontext
+
+from src.knowledge import loader as loader_module
+from src.knowledge.loader import KnowledgeLoader
+from src.knowledge.manifest import SourceManifest
+
+
+class _Store:
+    def __init__(self, bad_text: str = ""):
+        self.sources: dict[str, list[str]] = {"a.md": ["旧甲"], "b.md": ["旧乙"]}
+        self.bad_text = bad_text
+
+    def source_info(self, source):
+        chunks = self.sources.get(source)
+        return {"chunks": len(chunks), "hash": ""} if chunks else None
+
+    def _batch(self):
+        return nullcontext()
+
+    def _embed_chunks(self, texts):
+        if any(self.bad_text and self.bad_text in t for t in texts):
+            raise ValueError("无法 embedding")
+        return [[0.0] for _ in texts]
+
+    def _delete_source(self, source):
+        self.sources.pop(source, None)
+
+    def _add_chunks(self, texts, metadatas, content_hash=None, embeddings=None):
+        assert embeddings is not None and len(embeddings) == len(texts)
+        for text, meta in zip(texts, metadatas):
+            self.sources.setdefault(meta["source"], []).append(text)
+
+
+def _write_docs(tmp_path):
+    (tmp_path / "a.md").write_text("新甲", encoding="utf-8")
+    (tmp_path / "b.md").write_text("坏乙", encoding="utf-8")
+
+
+def test_bulk_encode_failure_falls_back_per_source(tmp_path, monkeypatch, capsys):
+    _write_docs(tmp_path)
+
+    def _broken_pool(texts):
+        raise MemoryError("编码池崩溃")
+
+    monkeypatch.setattr(loader_module, "encode_bulk", _broken_pool)
+    store = _Store(bad_text="坏")
+
+    results = KnowledgeLoader(store).load_directory(str(tmp_path))
+
+    assert results == {"a.md": 1, "b.md": -1}
+    assert store.sources == {"a.md": ["新甲"], "b.md": ["旧乙"]}   # 失败的来源保留旧数据
+    assert "[KnowledgeLoader] 跳过 b.md" in capsys.readouterr().out
+
+
+def test_old_source_is_replaced_only_at_write_time(tmp_path, monkeypatch):
+    _write_docs(tmp_path)
+    store = _Store()
+    snapshots = []
+
+    def _encode(texts):
+        snapshots.append(dict(store.sources))   # 整体 embedding 期间旧数据仍可检索
+        return [[0.0] for _ in texts]
+
+    monkeypatch.setattr(loader_module, "encode_bulk", _encode)
+
+    results = KnowledgeLoader(store).load_directory(str(tmp_path))
+
+    assert snapshots == [{"a.md": ["旧甲"], "b.md": ["旧乙"]}]
+    assert results == {"a.md": 1, "b.md": 1}
+    assert store.sources == {"a.md": ["新甲"], "b.md": ["坏乙"]}
+
+
+class _ManifestStore(_Store):
+    """来源清单用真实的 SourceManifest，验证追加后再 reload 同一文本不会被跳过。"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.sources = {}
+        self.manifest = SourceManifest(path)
+
+    def source_info(self, source):
+        return self.manifest.get(source)
+
+    def _delete_source(self, source):
+        super()._delete_source(source)
+        self.manifest.remove(source)
+
+    def _add_chunks(self, texts, metadatas, content_hash=None, embeddings=None):
+        super()._add_chunks(texts, metadatas, content_hash, embeddings)
+        self.manifest.add_chunks(metadatas[0]["source"], len(texts), content_hash)
+
+
+def test_reload_after_append_replaces_source(tmp_path):
+    store = _ManifestStore(str(tmp_path / "kb.manifest.json"))
+    loader = KnowledgeLoader(store)
+    loader.load_text("原文", source="a.md")
+    loader.load_text("追加", source="a.md")                 # reload=False：追加
+
+    assert loader.load_text("追加", source="a.md", reload=True) == 1
+
+    assert store.sources == {"a.md": ["追加"]}
+    assert store.manifest.get("a.md")["chunks"] == 1
@@ -0,0 +1,53 @@
+"""SourceManifest：多个进程共用同一清单文件。"""
+
+from src.knowledge.manifest import SourceManifest
+
+
+def test_reads_see_other_process_writes(tmp_path):
+    path = str(tmp_path / "kb.manifest.json")
+    app, loader = SourceManifest(path), SourceManifest(path)
+    assert not app.exists
+
+    with loader.transaction():
+        loader.add_chunks("a.md", 3, "h1")
+
+    assert app.total_chunks() == 3
+    assert app.sources() == ["a.md"]
+    assert app.get("a.md")["hash"] == "h1"
+
+
+def test_concurrent_writers_do_not_clobber_each_other(tmp_path):
+    path = str(tmp_path / "kb.manifest.json")
+    first, second = SourceManifest(path), SourceManifest(path)
+
+    with first.transaction():
+        first.add_chunks("a.md", 2)
+    with second.transaction():           # second 的内存副本中还没有 a.md
+        second.add_chunks("b.md", 5)
+    with first.transaction():            # first 的内存副本中还没有 b.md
+        first.remove("a.md")
+        first.add_chunks("c.md", 1)
+
+    assert SourceManifest(path).stats().keys() == {"b.md", "c.md"}
+    assert second.total_chunks() == 6
+
+
+def test_corrupt_file_reports_missing(tmp_path):
+    path = tmp_path / "kb.manifest.json"
+    path.write_text("{not json", encoding="utf-8")
+    manifest = SourceManifest(str(path))
+    assert not manifest.exists
+    assert manifest.total_chunks() == 0
+
+
+def test_append_clears_hash_so_reload_is_not_skipped(tmp_path):
+    manifest = SourceManifest(str(tmp_path / "kb.manifest.json"))
+    manifest.add_chunks("a.md", 2, "h-old")
+    assert manifest.get("a.md")["hash"] == "h-old"       # 首次导入：哈希描述全部内容
+
+    manifest.add_chunks("a.md", 1, "h-new")              # 追加：哈希只描述新增文本
+    assert manifest.get("a.md") == {**manifest.get("a.md"), "chunks": 3, "hash": ""}
+
+    manifest.remove("a.md")                              # reload：整体替换后重新记录
+    manifest.add_chunks("a.md", 1, "h-new")
+    assert manifest.get("a.md")["hash"] == "h-new"
@@ -0,0 +1,64 @@
+"""merge_adjacent_hits：相邻块合并、overlap 剥离与强命中邻居扩展（KnowledgeStore 为桩对象）。"""
+
+from src.knowledge.postprocess import merge_adjacent_hits
+
+_OVERLAP = "重叠部分的十个字符呀"
+
+
+class _Store:
+    """按 (source, chunk_index) 返回预置块的 KnowledgeStore 桩。"""
+
+    def __init__(self, chunks: dict[tuple[str, int], str]):
+        self._chunks = chunks
+        self.requests: list[tuple[str, list[int]]] = []
+
+    def get_chunks(self, source, chunk_indices):
+        self.requests.append((source, list(chunk_indices)))
+        return [
+            _hit(source, i, self._chunks[(source, i)], None)
+            for i in chunk_indices if (source, i) in self._chunks
+        ]
+
+
+def _hit(source: str, idx: int, text: str, distance: float | None = 0.5) -> dict:
+    return {"text": text, "source": source, "chunk_index": idx, "distance": distance}
+
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    hits = [
+        _hit("a.md", 1, _OVERLAP + "第二块正文", 0.2),
+        _hit("a.md", 0, "第一块正文" + _OVERLAP, 0.4),
+    ]
+
+    merged = merge_adjacent_hits(hits, _Store({}), expand_top=0)
+
+    assert len(merged) == 1
+    assert merged[0]["text"] == "第一块正文" + _OVERLAP + "第二块正文"
+    assert merged[0]["chunk_indices"] == [0, 1]
+    assert merged[0]["chunk_index"] == 0
+    assert merged[0]["distance"] == 0.2
+
+
+def test_gaps_and_sources_stay_separate_in_rank_order():
+    hits = [
+        _hit("b.md", 5, "乙五"),
+        _hit("a.md", 0, "甲零"),
+        _hit("a.md", 2, "甲二"),
+        {"text": "无位置信息", "source": "", "chunk_index": None, "distance": 0.9},
+    ]
+
+    merged = merge_adjacent_hits(hits, _Store({}), expand_top=0)
+
+    assert [h["text"] for h in merged] == ["乙五", "甲零", "甲二", "无位置信息"]
+
+
+def test_strong_hit_is_expanded_with_neighbors():
+    store = _Store({("a.md", 2): "前一块" + _OVERLAP, ("a.md", 4): "后一块"})
+    hits = [_hit("a.md", 3, _OVERLAP + "命中块"), _hit("b.md", 0, "次要命中")]
+
+    merged = merge_adjacent_hits(hits, store, expand_top=1, window=1)
+
+    assert store.requests == [("a.md", [2, 4])]
+    assert merged[0]["chunk_indices"] == [2, 3, 4]
+    assert merged[0]["text"] == "前一块" + _OVERLAP + "命中块\n后一块"
+    assert merged[1]["text"] == "次要命中"
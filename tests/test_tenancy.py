@@ -0,0 +1,37 @@
+"""共享布局的代际号：多个 GenerationStore / 记忆实例之间 reset 立即可见。"""
+
+from src.memory import long_term, static_memory
+from src.memory.long_term import LongTermMemory
+from src.memory.static_memory import StaticMemory
+from src.memory.tenancy import GenerationStore
+
+
+def test_bump_is_seen_by_other_stores_and_never_reused(tmp_path):
+    path = str(tmp_path / "tenant_generations.json")
+    first, second = GenerationStore(path), GenerationStore(path)
+    assert second.get("dynamic:u1") == 0
+
+    assert first.bump("dynamic:u1") == 1
+    assert second.get("dynamic:u1") == 1
+    assert second.bump("dynamic:u1") == 2          # 基于磁盘上的最新值递增，不会重复发出 1
+    assert first.bump("static:u1") == 1            # 不覆盖另一实例写入的 key
+
+    assert GenerationStore(path).get("dynamic:u1") == 2
+    assert first.get("dynamic:u1") == 2
+
+
+def test_memory_instances_follow_reset_made_elsewhere(tmp_path, monkeypatch):
+    store = GenerationStore(str(tmp_path / "tenant_generations.json"))
+    monkeypatch.setattr(long_term, "get_generation_store", lambda: store)
+    monkeypatch.setattr(static_memory, "get_generation_store", lambda: store)
+    dynamic = object.__new__(LongTermMemory)
+    dynamic.tenant_id = "u1"
+    static = object.__new__(StaticMemory)
+    static._tenant_id = "u1"
+    assert dynamic._where == {"user_id": "u1"}
+
+    GenerationStore(store._path).bump("dynamic:u1")   # 另一进程 reset
+    GenerationStore(store._path).bump("static:u1")
+
+    assert dynamic._where == {"$and": [{"user_id": "u1"}, {"gen": 1}]}
+    assert static._filter == {"user_id": "u1", "gen": 1}
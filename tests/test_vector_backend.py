@@ -0,0 +1,123 @@
+"""向量存储后端：numpy 后端的存取与多实例同步；Chroma 句柄在 truncate 后的重新解析（client 为内存桩）。"""
+
+import numpy as np
+import pytest
+
+from src.utils import vector_backend
+from src.utils.vector_backend import ChromaBackend, NumpyBackend, open_vector_backend
+
+
+def _vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype, rescore", [("float32", 0), ("float16", 0), ("int8", 0), ("int8", 4)])
+def test_numpy_round_trip_per_dtype(tmp_path, dtype, rescore):
+    vectors = _vectors(20)
+    ids = [f"m{i}" for i in range(20)]
+    backend = NumpyBackend(str(tmp_path), "mem", None, dtype, rescore)
+    backend.add(ids, [f"记忆{i}" for i in range(20)], [{"i": i} for i in range(20)], vectors)
+
+    reopened = NumpyBackend(str(tmp_path), "mem", None, dtype, rescore)
+    hits = reopened.query(query_embeddings=vectors[3:4], n_results=1)
+    page = reopened.get(ids=["m5"], include=("documents", "metadatas", "embeddings"))
+
+    assert reopened.count() == 20
+    assert hits["ids"] == [["m3"]]
+    assert hits["distances"][0][0] == pytest.approx(0.0, abs=0.02)
+    assert page["documents"] == ["记忆5"] and page["metadatas"] == [{"i": 5}]
+    unit = vectors[5] / np.linalg.norm(vectors[5])
+    assert float(np.dot(page["embeddings"][0], unit)) == pytest.approx(1.0, abs=0.01)
+
+
+def test_numpy_instances_see_each_other_writes(tmp_path):
+    vectors = _vectors(4)
+    first = NumpyBackend(str(tmp_path), "mem", None, "float32")
+    second = NumpyBackend(str(tmp_path), "mem", None, "float32")
+
+    first.upsert(["a", "b"], ["甲", "乙"], None, vectors[:2])
+    second.upsert(["c"], ["丙"], None, vectors[2:3])
+    first.delete(ids=["b"])
+    second.upsert(["d"], ["丁"], None, vectors[3:4])
+
+    for backend in (first, second, NumpyBackend(str(tmp_path), "mem", None, "float32")):
+        assert sorted(backend.get()["ids"]) == ["a", "c", "d"]
+
+
+def test_numpy_writes_append_to_journal_until_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_backend, "_COMPACT_MIN_ROWS", 4)
+    vectors = _vectors(10)
+    backend = NumpyBackend(str(tmp_path), "mem", None, "float32")
+    journal = tmp_path / "mem.journal"
+
+    backend.upsert(["a"], ["甲"], None, vectors[:1])        # 首次写入直接生成快照
+    assert not journal.exists()
+    for i in range(1, 4):
+        backend.upsert([f"m{i}"], [str(i)], None, vectors[i : i + 1])
+    assert len(journal.read_text(encoding="utf-8").splitlines()) == 3
+
+    backend.upsert(["m4", "m5"], ["4", "5"], None, vectors[4:6])   # 日志行数超过阈值 → 合并
+    assert not journal.exists()
+    assert NumpyBackend(str(tmp_path), "mem", None, "float32").count() == 6
+
+
+def test_numpy_truncate_is_seen_by_other_instances(tmp_path):
+    first = NumpyBackend(str(tmp_path), "mem", None, "float32")
+    second = NumpyBackend(str(tmp_path), "mem", None, "float32")
+    first.upsert(["a"], ["甲"], None, _vectors(1))
+    assert second.count() == 1
+
+    first.truncate()()
+
+    assert second.count() == 0
+    second.upsert(["b"], ["乙"], None, _vectors(1))
+    assert first.get()["ids"] == ["b"]
+
+
+def test_open_vector_backend_shares_numpy_instance(tmp_path):
+    first = open_vector_backend("mem", None, kind="numpy", db_path=str(tmp_path))
+    second = open_vector_backend("mem", None, kind="numpy", db_path=str(tmp_path))
+
+    assert first is second
+
+
+class _Collection:
+    def __init__(self, client, name):
+        self._client, self.name, self.ids = client, name, []
+
+    def add(self, ids, documents, metadatas=None, embeddings=None):
+        self.ids.extend(ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def modify(self, name):
+        del self._client.collections[self.name]
+        self.name = name
+        self._client.collections[name] = self
+
+
+class _Client:
+    def __init__(self):
+        self.collections: dict[str, _Collection] = {}
+
+    def get_or_create_collection(self, name, embedding_function=None):
+        return self.collections.setdefault(name, _Collection(self, name))
+
+    def delete_collection(self, name):
+        self.collections.pop(name, None)
+
+
+def test_truncate_is_seen_by_other_handles(tmp_path):
+    client = _Client()
+    writer = ChromaBackend(client, "mem", None, marker_dir=str(tmp_path))
+    other = ChromaBackend(client, "mem", None, marker_dir=str(tmp_path))
+    writer.add(["a"], ["旧记忆"])
+
+    cleanup = writer.truncate()
+    other.add(["b"], ["新记忆"])
+    cleanup()
+
+    assert writer.count() == 1
+    assert client.collections["mem"].ids == ["b"]
+    assert list(client.collections) == ["mem"]
@@ -0,0 +1,47 @@
+"""AgentMemory.sync_external_changes：由存储指纹发现其他进程的写入。"""
+
+import threading
+
+from src.memory.manager import AgentMemory
+
+
+def _manager(fingerprint: dict) -> AgentMemory:
+    """只带版本号的 AgentMemory；存储指纹由测试直接给出。"""
+    manager = object.__new__(AgentMemory)
+    manager._versions = {"short_term": 0, "static": 0, "dynamic": 0, "conflicts": 0}
+    manager._version_cond = threading.Condition()
+    manager._synced = None
+    manager.storage_fingerprint = lambda: dict(fingerprint)
+    return manager
+
+
+def test_first_sync_only_records_baseline():
+    manager = _manager({"static": (1, "t1"), "dynamic": 3, "conflicts": 0})
+
+    assert manager.sync_external_changes() == []
+    assert manager._versions["dynamic"] == 0
+
+
+def test_external_write_bumps_changed_layer():
+    fingerprint = {"static": (1, "t1"), "dynamic": 3, "conflicts": 0}
+    manager = _manager(fingerprint)
+    manager.sync_external_changes()
+
+    fingerprint["dynamic"] = 4
+    fingerprint["static"] = (1, "t2")
+
+    assert sorted(manager.sync_external_changes()) == ["dynamic", "static"]
+    assert manager._versions == {"short_term": 0, "static": 1, "dynamic": 1, "conflicts": 0}
+    assert manager.sync_external_changes() == []
+
+
+def test_in_process_write_is_not_counted_twice():
+    fingerprint = {"static": (1, "t1"), "dynamic": 3, "conflicts": 0}
+    manager = _manager(fingerprint)
+    manager.sync_external_changes()
+
+    manager._bump_version("dynamic")
+    fingerprint["dynamic"] = 4
+
+    assert manager.sync_external_changes() == []
+    assert manager._versions["dynamic"] == 1